@@ -7,12 +7,16 @@
 from .fake_input import get_fake_input
 from .inference import (async_inference_detector, inference_detector,
                         init_detector, show_result_pyplot)
-from .test import multi_gpu_test, single_gpu_test
+from .result_sink import (ListResultSink, ResultSink, ShardedResults,
+                          ShardedResultSink, dump_results)
+from .test import MaskEncodeStage, multi_gpu_test, single_gpu_test
 from .train import get_root_logger, set_random_seed, train_detector
 from .export import export_model
 
 __all__ = [
     'get_root_logger', 'set_random_seed', 'train_detector', 'init_detector',
     'async_inference_detector', 'inference_detector', 'show_result_pyplot',
-    'multi_gpu_test', 'single_gpu_test', 'get_fake_input', 'export_model'
+    'multi_gpu_test', 'single_gpu_test', 'get_fake_input', 'export_model',
+    'ResultSink', 'ListResultSink', 'ShardedResultSink', 'ShardedResults',
+    'MaskEncodeStage', 'dump_results'
 ]
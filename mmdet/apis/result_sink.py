@@ -0,0 +1,234 @@
+import os.path as osp
+import pickle  # nosec
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import mmcv
+import numpy as np
+from mmcv.runner import get_dist_info
+
+
+class ResultSink:
+    """Base class of the result sinks used by ``single_gpu_test`` and
+    ``multi_gpu_test``.
+
+    A sink receives the results of every image in the order they are
+    produced and gives back an indexable sequence of them once the test
+    loop is over.
+    """
+
+    def add(self, result):
+        """Store the result of one image."""
+        raise NotImplementedError
+
+    def extend(self, results):
+        """Store the results of a batch of images."""
+        for result in results:
+            self.add(result)
+
+    def close(self):
+        """Finish writing. Called once after the last result is added."""
+
+    def get_results(self):
+        """Return the stored results as a sequence."""
+        raise NotImplementedError
+
+
+class ListResultSink(ResultSink):
+    """Keep all the results in a Python list (the default behaviour)."""
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, result):
+        self.results.append(result)
+
+    def extend(self, results):
+        self.results.extend(results)
+
+    def get_results(self):
+        return self.results
+
+
+class ShardedResultSink(ResultSink):
+    """Write the results to pickle shards on disk as they are produced.
+
+    Every result is pickled separately and appended to the current shard
+    file, so only the offsets of the records are kept in memory. A new shard
+    is started every ``shard_size`` results. On :meth:`close` an index file
+    with the shard names and the (shard, offset, length) of every record is
+    written next to the shards. Each rank writes its own shards and index,
+    so ``out_dir`` may be shared by all ranks.
+
+    Args:
+        out_dir (str): Directory to write the shards to. It must be visible
+            to rank 0 when used with ``multi_gpu_test``.
+        shard_size (int): Number of results per shard file. Default: 1000.
+        rank (int, optional): Rank of the writer, used to name the files.
+            Defaults to the rank of the current process.
+    """
+
+    def __init__(self, out_dir, shard_size=1000, rank=None):
+        if rank is None:
+            rank, _ = get_dist_info()
+        mmcv.mkdir_or_exist(out_dir)
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.rank = rank
+        self.shard_files = []
+        self.records = []
+        self._file = None
+        self._closed = False
+
+    @property
+    def index_file(self):
+        return self.get_index_file(self.out_dir, self.rank)
+
+    @staticmethod
+    def get_index_file(out_dir, rank):
+        return osp.join(out_dir, f'rank{rank}.index.pkl')
+
+    def _new_shard(self):
+        if self._file is not None:
+            self._file.close()
+        shard_file = f'rank{self.rank}.{len(self.shard_files):05d}.pkl'
+        self.shard_files.append(shard_file)
+        self._file = open(osp.join(self.out_dir, shard_file), 'wb')
+
+    def add(self, result):
+        assert not self._closed, 'the sink is already closed'
+        if len(self.records) % self.shard_size == 0:
+            self._new_shard()
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        self.records.append(
+            (len(self.shard_files) - 1, self._file.tell(), len(data)))
+        self._file.write(data)
+
+    def close(self):
+        if self._closed:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        records = np.array(self.records, dtype=np.int64).reshape(-1, 3)
+        mmcv.dump(
+            dict(shard_files=self.shard_files, records=records),
+            self.index_file)
+        self._closed = True
+
+    def get_results(self):
+        self.close()
+        return ShardedResults([self.index_file])
+
+
+class ShardedResults(Sequence):
+    """Read-only sequence of the results written by
+    :class:`ShardedResultSink`.
+
+    Results are unpickled lazily on access. When several index files are
+    given, e.g. one per rank, the results are interleaved in the same way as
+    ``collect_results_cpu`` orders the parts of ``multi_gpu_test``. The
+    shard files are kept open, up to ``max_open_files`` of them, so that
+    iterating over the results does not reopen a file for every item.
+
+    Args:
+        index_files (list[str]): Index files written by the sinks, in rank
+            order.
+        size (int, optional): Number of results to keep, used to drop the
+            samples padded by the distributed sampler.
+        max_open_files (int): Maximum number of shard files kept open.
+            Default: 8.
+    """
+
+    def __init__(self, index_files, size=None, max_open_files=8):
+        self._files = OrderedDict()
+        assert max_open_files > 0
+        self.max_open_files = max_open_files
+        self.parts = []
+        for index_file in index_files:
+            index = mmcv.load(index_file)
+            shard_files = [
+                osp.join(osp.dirname(index_file), shard_file)
+                for shard_file in index['shard_files']
+            ]
+            self.parts.append((shard_files, index['records']))
+        num_parts = len(self.parts)
+        if num_parts == 1:
+            length = len(self.parts[0][1])
+        else:
+            length = min(len(records) for _, records in self.parts) * num_parts
+        self._len = length if size is None else min(length, size)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('result index out of range')
+        num_parts = len(self.parts)
+        shard_files, records = self.parts[idx % num_parts]
+        shard, offset, length = records[idx // num_parts]
+        f = self._get_file(shard_files[shard])
+        f.seek(offset)
+        return pickle.loads(f.read(length))  # nosec
+
+    def _get_file(self, shard_file):
+        f = self._files.get(shard_file)
+        if f is not None:
+            self._files.move_to_end(shard_file)
+            return f
+        if len(self._files) >= self.max_open_files:
+            self._files.popitem(last=False)[1].close()
+        f = open(shard_file, 'rb')
+        self._files[shard_file] = f
+        return f
+
+    def close(self):
+        """Close the shard files kept open. They are reopened on the next
+        access."""
+        while self._files:
+            self._files.popitem()[1].close()
+
+    def __del__(self):
+        self.close()
+
+    def __getstate__(self):
+        # file handles are not picklable, e.g. by dataloader workers
+        state = self.__dict__.copy()
+        state['_files'] = OrderedDict()
+        return state
+
+
+class _PickledAsList:
+    """Pickled as a list of the items of a sequence, read one at a time."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __reduce__(self):
+        return list, (), None, iter(self.results)
+
+
+def dump_results(results, out_file):
+    """Dump the results to a pickle file loaded as a list.
+
+    Lists are dumped with ``mmcv.dump``. Other sequences, such as
+    :obj:`ShardedResults`, are pickled one result at a time without the
+    memo of the pickler, so that they are never all in memory at once.
+
+    Args:
+        results (Sequence): Results of the images.
+        out_file (str): Path of the pickle file.
+    """
+    if isinstance(results, list):
+        mmcv.dump(results, out_file, file_format='pkl')
+        return
+    with open(out_file, 'wb') as f:
+        pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+        # the memo would keep every pickled result alive
+        pickler.fast = True
+        pickler.dump(_PickledAsList(results))
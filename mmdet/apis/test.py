@@ -9,6 +9,8 @@ import pickle  # nosec
 import shutil
 import tempfile
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import mmcv
 import torch
@@ -17,15 +19,98 @@ from mmcv.image import tensor2imgs
 from mmcv.runner import get_dist_info
 
 from mmdet.core import encode_mask_results
+from .result_sink import ListResultSink, ShardedResults, ShardedResultSink
+
+
+def encode_batch_results(result):
+    """Encode the mask results of a batch of images to RLE."""
+    if isinstance(result[0], tuple):
+        result = [(bbox_results, encode_mask_results(mask_results), *other)
+                  for bbox_results, mask_results, *other in result]
+    return result
+
+
+class MaskEncodeStage:
+    """Encode the mask results in a background pool and pass them to a
+    result sink in order.
+
+    While the masks of a batch are encoded by the pool, the test loop goes on
+    with the inference of the next batches. At most ``max_pending`` batches
+    are in flight, then :meth:`put` waits for the oldest one.
+
+    Args:
+        result_sink (ResultSink): Sink receiving the encoded results.
+        num_workers (int): Number of workers of the pool. If 0, the masks are
+            encoded synchronously in :meth:`put`. Default: 0.
+        pool (str): 'thread' or 'process'. Processes encode in parallel
+            but the masks have to be sent to them. Default: 'thread'.
+        max_pending (int, optional): Maximum number of batches in flight.
+            Defaults to twice the number of workers.
+    """
+
+    def __init__(self, result_sink, num_workers=0, pool='thread',
+                 max_pending=None):
+        assert pool in ('thread', 'process')
+        self.result_sink = result_sink
+        self.max_pending = max_pending or 2 * num_workers
+        self.pending = deque()
+        self.executor = None
+        if num_workers > 0:
+            executor_cls = (
+                ThreadPoolExecutor
+                if pool == 'thread' else ProcessPoolExecutor)
+            self.executor = executor_cls(max_workers=num_workers)
+
+    def put(self, result):
+        """Add the results of a batch of images."""
+        if self.executor is None:
+            self.result_sink.extend(encode_batch_results(result))
+            return
+        self.pending.append(self.executor.submit(encode_batch_results, result))
+        while self.pending and (self.pending[0].done()
+                                or len(self.pending) > self.max_pending):
+            self.result_sink.extend(self.pending.popleft().result())
+
+    def close(self):
+        """Wait for all the pending batches and release the pool."""
+        while self.pending:
+            self.result_sink.extend(self.pending.popleft().result())
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
 
 
 def single_gpu_test(model,
                     data_loader,
                     show=False,
                     out_dir=None,
-                    show_score_thr=0.3):
+                    show_score_thr=0.3,
+                    result_sink=None,
+                    encode_workers=0,
+                    encode_pool='thread'):
+    """Test model with a single gpu.
+
+    Args:
+        model (nn.Module): Model to be tested.
+        data_loader (nn.Dataloader): Pytorch data loader.
+        show (bool): Whether to show the results.
+        out_dir (str, optional): Directory to save the painted images to.
+        show_score_thr (float): Score threshold of the shown boxes.
+        result_sink (ResultSink, optional): Where to store the results as
+            they are produced, e.g. :obj:`ShardedResultSink` to write them to
+            disk. If None, the results are kept in a list.
+        encode_workers (int): Number of workers encoding the masks to RLE in
+            the background, see :class:`MaskEncodeStage`. If 0, the masks
+            are encoded synchronously in the loop. Default: 0.
+        encode_pool (str): 'thread' or 'process'. Default: 'thread'.
+
+    Returns:
+        Sequence: The prediction results.
+    """
     model.eval()
-    results = []
+    if result_sink is None:
+        result_sink = ListResultSink()
+    encode_stage = MaskEncodeStage(result_sink, encode_workers, encode_pool)
     dataset = data_loader.dataset
     prog_bar = mmcv.ProgressBar(len(dataset))
     for i, data in enumerate(data_loader):
@@ -62,17 +147,21 @@ def single_gpu_test(model,
                     score_thr=show_score_thr)
 
         # encode mask results
-        if isinstance(result[0], tuple):
-            result = [(bbox_results, encode_mask_results(mask_results), *other)
-                      for bbox_results, mask_results, *other in result]
-        results.extend(result)
+        encode_stage.put(result)
 
         for _ in range(batch_size):
             prog_bar.update()
-    return results
+    encode_stage.close()
+    return result_sink.get_results()
 
 
-def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
+def multi_gpu_test(model,
+                   data_loader,
+                   tmpdir=None,
+                   gpu_collect=False,
+                   result_sink=None,
+                   encode_workers=0,
+                   encode_pool='thread'):
     """Test model with multiple gpus.
 
     This method tests model with multiple gpus and collects the results
@@ -87,12 +176,23 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
         tmpdir (str): Path of directory to save the temporary results from
             different gpus under cpu mode.
         gpu_collect (bool): Option to use either gpu or cpu to collect results.
+        result_sink (ResultSink, optional): Where to store the results as
+            they are produced. With :obj:`ShardedResultSink` every rank writes
+            its own shards and rank 0 merges their indexes instead of
+            collecting the whole results, ``tmpdir`` and ``gpu_collect`` are
+            ignored then. If None, the results are kept in a list.
+        encode_workers (int): Number of workers encoding the masks to RLE in
+            the background, see :class:`MaskEncodeStage`. If 0, the masks
+            are encoded synchronously in the loop. Default: 0.
+        encode_pool (str): 'thread' or 'process'. Default: 'thread'.
 
     Returns:
-        list: The prediction results.
+        Sequence: The prediction results.
     """
     model.eval()
-    results = []
+    if result_sink is None:
+        result_sink = ListResultSink()
+    encode_stage = MaskEncodeStage(result_sink, encode_workers, encode_pool)
     dataset = data_loader.dataset
     rank, world_size = get_dist_info()
     if rank == 0:
@@ -101,18 +201,20 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
     for i, data in enumerate(data_loader):
         with torch.no_grad():
             result = model(return_loss=False, rescale=True, **data)
-            # encode mask results
-            if isinstance(result[0], tuple):
-                result = [(bbox_results, encode_mask_results(mask_results), *other)
-                          for bbox_results, mask_results, *other in result]
-        results.extend(result)
+        # encode mask results
+        encode_stage.put(result)
 
         if rank == 0:
             batch_size = len(result)
             for _ in range(batch_size * world_size):
                 prog_bar.update()
+    encode_stage.close()
+
+    if isinstance(result_sink, ShardedResultSink):
+        return collect_results_shards(result_sink, len(dataset))
 
     # collect results from all ranks
+    results = result_sink.get_results()
     if gpu_collect:
         results = collect_results_gpu(results, len(dataset))
     else:
@@ -120,6 +222,25 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
     return results
 
 
+def collect_results_shards(result_sink, size):
+    """Merge the shards written by every rank into a lazy sequence.
+
+    Only the small index files are read here, the results themselves stay in
+    the shard files until they are accessed.
+    """
+    rank, world_size = get_dist_info()
+    result_sink.close()
+    if world_size > 1:
+        dist.barrier()
+    if rank != 0:
+        return None
+    index_files = [
+        ShardedResultSink.get_index_file(result_sink.out_dir, i)
+        for i in range(world_size)
+    ]
+    return ShardedResults(index_files, size)
+
+
 def collect_results_cpu(result_part, size, tmpdir=None):
     rank, world_size = get_dist_info()
     # create a tmp dir if it is not specified
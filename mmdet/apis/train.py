@@ -27,6 +27,7 @@ from mmcv.utils import build_from_cfg
 
 from mmdet.datasets import (build_dataloader, build_dataset,
                             replace_ImageToTensor)
+from mmdet.datasets.pipelines import BatchAugment
 from mmdet.utils import get_root_logger
 from mmdet.utils import prepare_mmdet_model_for_execution
 from .fake_input import get_fake_input
@@ -114,7 +115,8 @@ def train_detector(model,
             # cfg.gpus will be ignored if distributed
             len(cfg.gpu_ids),
             dist=distributed,
-            seed=cfg.seed) for ds in dataset
+            seed=cfg.seed,
+            bucket_cfg=cfg.data.get('bucket_sampler')) for ds in dataset
     ]
 
     map_location = 'cuda'
@@ -124,6 +126,11 @@ def train_detector(model,
     if cfg.load_from:
         load_checkpoint(model=model, filename=cfg.load_from, map_location=map_location)
 
+    if cfg.data.get('batch_augment'):
+        # augment the training batches after the collation
+        model.batch_augment = BatchAugment(**cfg.data.batch_augment)
+        logger.info(f'Batch augmentation: {model.batch_augment}')
+
     # put model on gpus
     if torch.cuda.is_available():
         model = model.cuda()
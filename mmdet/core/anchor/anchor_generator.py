@@ -12,10 +12,11 @@ import torch
 from torch.nn.modules.utils import _pair
 
 from .builder import PRIOR_GENERATORS
+from .utils import CachedPriorsMixin
 
 
 @PRIOR_GENERATORS.register_module()
-class AnchorGenerator:
+class AnchorGenerator(CachedPriorsMixin):
     """Standard anchor generator for 2D anchor-based detectors.
 
     Args:
@@ -43,6 +44,9 @@ class AnchorGenerator:
             float is given, they will be used to shift the centers of anchors.
         center_offset (float): The offset of center in proportion to anchors'
             width and height. By default it is 0 in V2.0.
+        cache_size (int): Maximum number of grids of anchors and valid flags
+            cached by feature map sizes and padded shape, see
+            :obj:`CachedPriorsMixin`. 0 disables the cache. Default: 32.
 
     Examples:
         >>> from mmdet.core import AnchorGenerator
@@ -72,7 +76,8 @@ class AnchorGenerator:
                  octave_base_scale=None,
                  scales_per_octave=None,
                  centers=None,
-                 center_offset=0.):
+                 center_offset=0.,
+                 cache_size=32):
         # check center and center_offset
         if center_offset != 0:
             assert centers is None, 'center cannot be set when center_offset' \
@@ -115,6 +120,7 @@ class AnchorGenerator:
         self.scale_major = scale_major
         self.centers = centers
         self.center_offset = center_offset
+        self.cache_size = cache_size
         self.base_anchors = self.gen_base_anchors()
 
     @property
@@ -234,12 +240,14 @@ class AnchorGenerator:
                 num_base_anchors is the number of anchors for that level.
         """
         assert self.num_levels == len(featmap_sizes)
-        multi_level_anchors = []
-        for i in range(self.num_levels):
-            anchors = self.single_level_grid_priors(
-                featmap_sizes[i], level_idx=i, device=device)
-            multi_level_anchors.append(anchors)
-        return multi_level_anchors
+        key = self._cache_key('grid_priors', featmap_sizes, device,
+                              self.base_anchors[0].dtype)
+        return self._cached(
+            key, lambda: [
+                self.single_level_grid_priors(
+                    featmap_sizes[i], level_idx=i, device=device)
+                for i in range(self.num_levels)
+            ])
 
     def single_level_grid_priors(self, featmap_size, level_idx, device='cuda'):
         """Generate grid anchors of a single level.
@@ -330,15 +338,16 @@ class AnchorGenerator:
                       'Please use ``grid_priors`` ')
 
         assert self.num_levels == len(featmap_sizes)
-        multi_level_anchors = []
-        for i in range(self.num_levels):
-            anchors = self.single_level_grid_anchors(
-                self.base_anchors[i].to(device),
-                featmap_sizes[i],
-                self.strides[i],
-                device=device)
-            multi_level_anchors.append(anchors)
-        return multi_level_anchors
+        key = self._cache_key('grid_anchors', featmap_sizes, device,
+                              self.base_anchors[0].dtype)
+        return self._cached(
+            key, lambda: [
+                self.single_level_grid_anchors(
+                    self.base_anchors[i].to(device),
+                    featmap_sizes[i],
+                    self.strides[i],
+                    device=device) for i in range(self.num_levels)
+            ])
 
     def single_level_grid_anchors(self,
                                   base_anchors,
@@ -398,6 +407,12 @@ class AnchorGenerator:
             list(torch.Tensor): Valid flags of anchors in multiple levels.
         """
         assert self.num_levels == len(featmap_sizes)
+        key = self._cache_key('valid_flags', featmap_sizes, device,
+                              torch.bool, pad_shape[:2])
+        return self._cached(
+            key, lambda: self._valid_flags(featmap_sizes, pad_shape, device))
+
+    def _valid_flags(self, featmap_sizes, pad_shape, device):
         multi_level_flags = []
         for i in range(self.num_levels):
             anchor_stride = self.strides[i]
@@ -849,6 +864,54 @@ class YOLOAnchorGenerator(AnchorGenerator):
             multi_level_responsible_flags.append(flags)
         return multi_level_responsible_flags
 
+    def batch_responsible_flags(self,
+                                featmap_sizes,
+                                gt_bboxes_list,
+                                device='cuda'):
+        """Generate responsible anchor flags of grid cells in multiple scales
+        of a batch of images at once.
+
+        Args:
+            featmap_sizes (list(tuple)): List of feature map sizes in multiple
+                feature levels.
+            gt_bboxes_list (list[Tensor]): Ground truth boxes of every image,
+                of shape (n, 4).
+            device (str): Device where the anchors will be put on.
+
+        Return:
+            list[list(torch.Tensor)]: responsible flags of anchors in multiple
+                level of every image.
+        """
+        assert self.num_levels == len(featmap_sizes)
+        num_imgs = len(gt_bboxes_list)
+        gt_bboxes = torch.cat(gt_bboxes_list).to(device)
+        img_inds = torch.cat([
+            torch.full((len(bboxes), ), i, dtype=torch.long, device=device)
+            for i, bboxes in enumerate(gt_bboxes_list)
+        ])
+        multi_img_responsible_flags = [[] for _ in range(num_imgs)]
+        for i in range(self.num_levels):
+            feat_h, feat_w = featmap_sizes[i]
+            stride = self.strides[i]
+            gt_bboxes_cx = (gt_bboxes[:, 0] + gt_bboxes[:, 2]) * 0.5
+            gt_bboxes_cy = (gt_bboxes[:, 1] + gt_bboxes[:, 3]) * 0.5
+            gt_bboxes_grid_x = torch.floor(gt_bboxes_cx / stride[0]).long()
+            gt_bboxes_grid_y = torch.floor(gt_bboxes_cy / stride[1]).long()
+
+            # row major indexing in the grid of every image
+            gt_bboxes_grid_idx = torch.remainder(
+                gt_bboxes_grid_y * feat_w + gt_bboxes_grid_x, feat_h * feat_w)
+            responsible_grid = torch.zeros(
+                num_imgs, feat_h * feat_w, dtype=torch.uint8, device=device)
+            responsible_grid[img_inds, gt_bboxes_grid_idx] = 1
+
+            responsible_grid = responsible_grid[..., None].expand(
+                -1, -1, self.num_base_anchors[i]).reshape(num_imgs, -1)
+            for img_id in range(num_imgs):
+                multi_img_responsible_flags[img_id].append(
+                    responsible_grid[img_id])
+        return multi_img_responsible_flags
+
     def single_level_responsible_flags(self,
                                        featmap_size,
                                        gt_bboxes,
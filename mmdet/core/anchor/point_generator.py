@@ -3,6 +3,7 @@ import torch
 from torch.nn.modules.utils import _pair
 
 from .builder import PRIOR_GENERATORS
+from .utils import CachedPriorsMixin
 
 
 @PRIOR_GENERATORS.register_module()
@@ -40,7 +41,7 @@ class PointGenerator:
 
 
 @PRIOR_GENERATORS.register_module()
-class MlvlPointGenerator:
+class MlvlPointGenerator(CachedPriorsMixin):
     """Standard points generator for multi-level (Mlvl) feature maps in 2D
     points-based detectors.
 
@@ -49,11 +50,15 @@ class MlvlPointGenerator:
             in multiple feature levels in order (w, h).
         offset (float): The offset of points, the value is normalized with
             corresponding stride. Defaults to 0.5.
+        cache_size (int): Maximum number of grids of points and valid flags
+            cached by feature map sizes and padded shape, see
+            :obj:`CachedPriorsMixin`. 0 disables the cache. Default: 32.
     """
 
-    def __init__(self, strides, offset=0.5):
+    def __init__(self, strides, offset=0.5, cache_size=32):
         self.strides = [_pair(stride) for stride in strides]
         self.offset = offset
+        self.cache_size = cache_size
 
     @property
     def num_levels(self):
@@ -96,15 +101,16 @@ class MlvlPointGenerator:
             (coord_x, coord_y, stride_w, stride_h).
         """
         assert self.num_levels == len(featmap_sizes)
-        multi_level_priors = []
-        for i in range(self.num_levels):
-            priors = self.single_level_grid_priors(
-                featmap_sizes[i],
-                level_idx=i,
-                device=device,
-                with_stride=with_stride)
-            multi_level_priors.append(priors)
-        return multi_level_priors
+        key = self._cache_key(f'grid_priors_{with_stride}', featmap_sizes,
+                              device, torch.float32)
+        return self._cached(
+            key, lambda: [
+                self.single_level_grid_priors(
+                    featmap_sizes[i],
+                    level_idx=i,
+                    device=device,
+                    with_stride=with_stride) for i in range(self.num_levels)
+            ])
 
     def single_level_grid_priors(self,
                                  featmap_size,
@@ -167,6 +173,12 @@ class MlvlPointGenerator:
             list(torch.Tensor): Valid flags of points of multiple levels.
         """
         assert self.num_levels == len(featmap_sizes)
+        key = self._cache_key('valid_flags', featmap_sizes, device,
+                              torch.bool, pad_shape[:2])
+        return self._cached(
+            key, lambda: self._valid_flags(featmap_sizes, pad_shape, device))
+
+    def _valid_flags(self, featmap_sizes, pad_shape, device):
         multi_level_flags = []
         for i in range(self.num_levels):
             point_stride = self.strides[i]
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+import numpy as np
 import torch
 
 
@@ -5,8 +8,11 @@ def images_to_levels(target, num_levels):
     """Convert targets by image to targets by feature level.
 
     [target_img0, target_img1] -> [target_level0, target_level1, ...]
+
+    The targets can also be given already stacked, as a single tensor.
     """
-    target = torch.stack(target, 0)
+    if not isinstance(target, torch.Tensor):
+        target = torch.stack(target, 0)
     level_targets = []
     start = 0
     for n in num_levels:
@@ -69,3 +75,210 @@ def calc_region(bbox, ratio, featmap_size=None):
         x2 = x2.clamp(min=0, max=featmap_size[1])
         y2 = y2.clamp(min=0, max=featmap_size[0])
     return (x1, y1, x2, y2)
+
+
+class PriorCache:
+    """Bounded LRU cache of the priors and flags of a prior generator.
+
+    Args:
+        max_size (int): Maximum number of entries, the least recently used
+            ones being evicted first. 0 disables the cache. Default: 32.
+    """
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Get the value of a key, or None if it is not cached."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Cache the value of a key, evicting the least recently used
+        entries beyond ``max_size``."""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all the entries and reset the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """dict: The ``hits``, ``misses``, ``hit_rate``, ``size`` and
+        ``max_size`` of the cache."""
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else 0.,
+            size=len(self._entries),
+            max_size=self.max_size)
+
+
+class CachedPriorsMixin:
+    """Memoize the priors and valid flags of a prior generator.
+
+    The results are cached by kind, feature map sizes, padded shape of the
+    image for the valid flags, device and dtype, so that the generators do
+    not rebuild the same grids at every iteration when the inputs have a few
+    distinct sizes. Nothing is cached while tracing or exporting to ONNX,
+    where the sizes may be tensors.
+
+    The cached tensors are shared by all the callers, which must not modify
+    them in place.
+
+    Attributes:
+        cache_size (int): Maximum number of cached results. 0 disables the
+            cache. Default: 32.
+    """
+
+    cache_size = 32
+
+    @property
+    def prior_cache(self):
+        """:obj:`PriorCache`: The cache of the generator."""
+        # created lazily, since some generators do not call the __init__ of
+        # their base class
+        cache = self.__dict__.get('_prior_cache')
+        if cache is None:
+            cache = self._prior_cache = PriorCache(self.cache_size)
+        cache.max_size = self.cache_size
+        return cache
+
+    def cache_stats(self):
+        """Get the statistics of the cache, see :meth:`PriorCache.stats`."""
+        return self.prior_cache.stats()
+
+    def clear_cache(self):
+        """Clear the cache of the generator."""
+        self.prior_cache.clear()
+
+    def _cache_key(self, kind, featmap_sizes, device, dtype, shape=None):
+        """Get the key of a result, or None if it must not be cached.
+
+        Args:
+            kind (str): Kind of result.
+            featmap_sizes (list[tuple]): Sizes of the feature maps.
+            device (str | torch.device): Device of the result.
+            dtype (torch.dtype): Data type of the result.
+            shape (tuple, optional): Shape the result depends on, e.g. the
+                padded shape of the image.
+        """
+        if self.cache_size <= 0 or torch.jit.is_tracing() or \
+                torch.onnx.is_in_onnx_export():
+            return None
+        sizes = list(featmap_sizes)
+        if shape is not None:
+            sizes.append(shape)
+        for size in sizes:
+            if any(isinstance(s, torch.Tensor) for s in size):
+                return None
+        sizes = tuple(tuple(int(s) for s in size) for size in sizes)
+        return (kind, sizes, str(torch.device(device)), dtype)
+
+    def _cached(self, key, compute):
+        """Get the result of a key from the cache or compute it."""
+        if key is None:
+            return compute()
+        result = self.prior_cache.get(key)
+        if result is None:
+            result = compute()
+            self.prior_cache.put(key, result)
+        # the callers may modify the lists, but not the tensors
+        return list(result) if isinstance(result, list) else result
+
+    def batch_valid_flags(self, featmap_sizes, pad_shapes, device='cuda'):
+        """Generate the valid flags of the priors of a batch of images.
+
+        The flags of the padded shapes which are not cached are computed at
+        once for all the images, a level at a time.
+
+        Args:
+            featmap_sizes (list[tuple]): List of feature map sizes in
+                multiple feature levels, each arranged as (h, w).
+            pad_shapes (list[tuple]): The padded shapes of the images.
+            device (str): Device where the flags will be put on.
+
+        Return:
+            list[list[torch.Tensor]]: Valid flags of the priors of every image
+                in multiple levels.
+        """
+        assert self.num_levels == len(featmap_sizes)
+        keys = [
+            self._cache_key('valid_flags', featmap_sizes, device, torch.bool,
+                            pad_shape[:2]) for pad_shape in pad_shapes
+        ]
+        if any(key is None for key in keys):
+            return [
+                self.valid_flags(featmap_sizes, pad_shape, device)
+                for pad_shape in pad_shapes
+            ]
+
+        flags = {}
+        for key in dict.fromkeys(keys):
+            flags[key] = self.prior_cache.get(key)
+        missing = [key for key, value in flags.items() if value is None]
+        if missing:
+            # the padded (h, w) are the last sizes of the keys
+            pad_hw = np.array([key[1][-1] for key in missing], dtype=np.int64)
+            level_flags = []
+            for i in range(self.num_levels):
+                stride_w, stride_h = self.strides[i]
+                feat_h, feat_w = featmap_sizes[i]
+                valid_sizes = np.stack([
+                    np.minimum(np.ceil(pad_hw[:, 0] / stride_h), feat_h),
+                    np.minimum(np.ceil(pad_hw[:, 1] / stride_w), feat_w)
+                ], 1)
+                level_flags.append(
+                    self.single_level_batch_valid_flags(
+                        (feat_h, feat_w), valid_sizes,
+                        self.num_base_priors[i], device))
+            for j, key in enumerate(missing):
+                flags[key] = [level_flag[j] for level_flag in level_flags]
+                self.prior_cache.put(key, flags[key])
+        return [list(flags[key]) for key in keys]
+
+    def single_level_batch_valid_flags(self,
+                                       featmap_size,
+                                       valid_sizes,
+                                       num_base_priors,
+                                       device='cuda'):
+        """Generate the valid flags of the priors of a single feature map for
+        several valid sizes.
+
+        Args:
+            featmap_size (tuple[int]): The size of feature maps, arranged as
+                (h, w).
+            valid_sizes (np.ndarray): The valid (h, w) of the feature maps,
+                of shape (n, 2).
+            num_base_priors (int): The number of priors at a point of the
+                feature grid.
+            device (str, optional): Device where the flags will be put on.
+                Defaults to 'cuda'.
+
+        Returns:
+            torch.Tensor: The valid flags of each prior of every valid size,
+                of shape (n, h * w * num_base_priors).
+        """
+        feat_h, feat_w = featmap_size
+        valid_sizes = torch.as_tensor(
+            valid_sizes, dtype=torch.long, device=device)
+        valid_y = torch.arange(feat_h, device=device) < valid_sizes[:, :1]
+        valid_x = torch.arange(feat_w, device=device) < valid_sizes[:, 1:]
+        valid = valid_y[:, :, None] & valid_x[:, None, :]
+        return valid[..., None].expand(-1, -1, -1, num_base_priors).reshape(
+            len(valid_sizes), -1)
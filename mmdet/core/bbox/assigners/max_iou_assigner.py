@@ -35,6 +35,11 @@ class MaxIoUAssigner(BaseAssigner):
         gpu_assign_thr (int): The upper bound of the number of GT for GPU
             assign. When the number of gt is above this threshold, will assign
             on CPU device. Negative values mean not assign on CPU.
+        tile_elements (int): The upper bound of the number of overlaps
+            computed at once. When there are more gts x bboxes, the bboxes
+            are assigned by tiles, without holding all the overlaps in
+            memory, see :meth:`assign_by_tiles`. Negative values mean
+            computing all the overlaps at once. Default: -1.
     """
 
     def __init__(self,
@@ -46,7 +51,8 @@ class MaxIoUAssigner(BaseAssigner):
                  ignore_wrt_candidates=True,
                  match_low_quality=True,
                  gpu_assign_thr=-1,
-                 iou_calculator=dict(type='BboxOverlaps2D')):
+                 iou_calculator=dict(type='BboxOverlaps2D'),
+                 tile_elements=-1):
         self.pos_iou_thr = pos_iou_thr
         self.neg_iou_thr = neg_iou_thr
         self.min_pos_iou = min_pos_iou
@@ -56,6 +62,7 @@ class MaxIoUAssigner(BaseAssigner):
         self.gpu_assign_thr = gpu_assign_thr
         self.match_low_quality = match_low_quality
         self.iou_calculator = build_iou_calculator(iou_calculator)
+        self.tile_elements = tile_elements
 
     def assign(self, bboxes, gt_bboxes, gt_bboxes_ignore=None, gt_labels=None):
         """Assign gt to bboxes.
@@ -102,6 +109,33 @@ class MaxIoUAssigner(BaseAssigner):
             if gt_labels is not None:
                 gt_labels = gt_labels.cpu()
 
+        num_overlaps = gt_bboxes.shape[0] * bboxes.shape[0]
+        if 0 < self.tile_elements < num_overlaps:
+            assign_result = self.assign_by_tiles(bboxes, gt_bboxes,
+                                                 gt_bboxes_ignore, gt_labels)
+        else:
+            overlaps = self.get_overlaps(bboxes, gt_bboxes, gt_bboxes_ignore)
+            assign_result = self.assign_wrt_overlaps(overlaps, gt_labels)
+        if assign_on_cpu:
+            assign_result.gt_inds = assign_result.gt_inds.to(device)
+            assign_result.max_overlaps = assign_result.max_overlaps.to(device)
+            if assign_result.labels is not None:
+                assign_result.labels = assign_result.labels.to(device)
+        return assign_result
+
+    def get_overlaps(self, bboxes, gt_bboxes, gt_bboxes_ignore=None):
+        """Compute the overlaps of the gts with the bboxes, the overlaps of
+        the ignored bboxes being -1.
+
+        Args:
+            bboxes (Tensor): Bounding boxes to be assigned, shape(n, 4).
+            gt_bboxes (Tensor): Groundtruth boxes, shape (k, 4).
+            gt_bboxes_ignore (Tensor, optional): Ground truth bboxes that are
+                labelled as `ignored`, e.g., crowd boxes in COCO.
+
+        Returns:
+            Tensor: Overlaps of shape (k, n).
+        """
         overlaps = self.iou_calculator(gt_bboxes, bboxes)
 
         if (self.ignore_iof_thr > 0 and gt_bboxes_ignore is not None
@@ -115,14 +149,206 @@ class MaxIoUAssigner(BaseAssigner):
                     gt_bboxes_ignore, bboxes, mode='iof')
                 ignore_max_overlaps, _ = ignore_overlaps.max(dim=0)
             overlaps[:, ignore_max_overlaps > self.ignore_iof_thr] = -1
+        return overlaps
+
+    def assign_by_tiles(self,
+                        bboxes,
+                        gt_bboxes,
+                        gt_bboxes_ignore=None,
+                        gt_labels=None):
+        """Assign gt to bboxes by tiles of bboxes.
 
-        assign_result = self.assign_wrt_overlaps(overlaps, gt_labels)
+        The overlaps of at most ``tile_elements`` gts x bboxes are computed
+        at once. The max overlap of every bbox is reduced within its tile,
+        and the max overlap of every gt is kept across the tiles. The tiles
+        holding the max overlap of a gt are computed again for the low
+        quality matches. The result is the same as the one of
+        :meth:`assign_wrt_overlaps` with all the overlaps.
+
+        Args:
+            bboxes (Tensor): Bounding boxes to be assigned, shape(n, 4).
+            gt_bboxes (Tensor): Groundtruth boxes, shape (k, 4).
+            gt_bboxes_ignore (Tensor, optional): Ground truth bboxes that are
+                labelled as `ignored`, e.g., crowd boxes in COCO.
+            gt_labels (Tensor, optional): Label of gt_bboxes, shape (k, ).
+
+        Returns:
+            :obj:`AssignResult`: The assign result.
+        """
+        num_gts, num_bboxes = gt_bboxes.size(0), bboxes.size(0)
+        if num_gts == 0 or num_bboxes == 0:
+            overlaps = self.get_overlaps(bboxes, gt_bboxes, gt_bboxes_ignore)
+            return self.assign_wrt_overlaps(overlaps, gt_labels)
+
+        tile_size = max(1, self.tile_elements // num_gts)
+        tiles = [(start, min(start + tile_size, num_bboxes))
+                 for start in range(0, num_bboxes, tile_size)]
+        dtype = torch.promote_types(gt_bboxes.dtype, bboxes.dtype)
+        assigned_gt_inds = bboxes.new_full((num_bboxes, ),
+                                           -1,
+                                           dtype=torch.long)
+        max_overlaps = bboxes.new_empty((num_bboxes, ), dtype=dtype)
+        gt_max_overlaps = bboxes.new_full((num_gts, ),
+                                          float('-inf'),
+                                          dtype=dtype)
+        gt_argmax_overlaps = bboxes.new_zeros((num_gts, ), dtype=torch.long)
+        tile_gt_max_overlaps = []
+        for start, end in tiles:
+            overlaps = self.get_overlaps(bboxes[start:end], gt_bboxes,
+                                         gt_bboxes_ignore)
+            tile_max_overlaps, tile_argmax_overlaps = overlaps.max(dim=0)
+            max_overlaps[start:end] = tile_max_overlaps
+            self._assign_wrt_max_overlaps(assigned_gt_inds[start:end],
+                                          tile_max_overlaps,
+                                          tile_argmax_overlaps)
+            # the first bbox of highest overlap is kept, as with a single max
+            tile_gt_max, tile_gt_argmax = overlaps.max(dim=1)
+            updated = tile_gt_max > gt_max_overlaps
+            gt_max_overlaps = torch.where(updated, tile_gt_max,
+                                          gt_max_overlaps)
+            gt_argmax_overlaps = torch.where(updated, tile_gt_argmax + start,
+                                             gt_argmax_overlaps)
+            tile_gt_max_overlaps.append(tile_gt_max)
+
+        if self.match_low_quality:
+            matched_gts = gt_max_overlaps >= self.min_pos_iou
+            if self.gt_max_assign_all:
+                gt_ids = torch.arange(
+                    1, num_gts + 1, dtype=torch.int32, device=bboxes.device)
+                for (start, end), tile_gt_max in zip(tiles,
+                                                     tile_gt_max_overlaps):
+                    tile_gts = matched_gts & (tile_gt_max == gt_max_overlaps)
+                    if not tile_gts.any():
+                        continue
+                    overlaps = self.get_overlaps(bboxes[start:end], gt_bboxes,
+                                                 gt_bboxes_ignore)
+                    matches = (overlaps == gt_max_overlaps[:, None]) & \
+                        tile_gts[:, None]
+                    # the last gt matching a bbox wins, as in the loop of
+                    # assign_wrt_overlaps
+                    matched_gt_inds = (matches * gt_ids[:, None]).max(dim=0)[0]
+                    assigned_gt_inds[start:end] = torch.where(
+                        matched_gt_inds > 0, matched_gt_inds.long(),
+                        assigned_gt_inds[start:end])
+            else:
+                for i in range(num_gts):
+                    if matched_gts[i]:
+                        assigned_gt_inds[gt_argmax_overlaps[i]] = i + 1
+
+        return AssignResult(
+            num_gts,
+            assigned_gt_inds,
+            max_overlaps,
+            labels=self._get_assigned_labels(assigned_gt_inds, gt_labels))
+
+    def batch_assign(self,
+                     bboxes,
+                     gt_bboxes_list,
+                     gt_bboxes_ignore_list=None,
+                     bbox_flags=None):
+        """Assign gt to the bboxes of a batch of images at once.
+
+        The gts are padded to the largest number of gts of the batch, and the
+        overlaps and assignments of all the images are computed together. The
+        result of every image is the same as the one of :meth:`assign` with
+        its flagged bboxes only, the other bboxes being assigned -1.
+
+        Args:
+            bboxes (Tensor): Bounding boxes to be assigned of every image,
+                shape (num_imgs, n, 4).
+            gt_bboxes_list (list[Tensor]): Groundtruth boxes of every image,
+                of shape (k, 4).
+            gt_bboxes_ignore_list (list[Tensor], optional): Ground truth
+                bboxes that are labelled as `ignored` of every image.
+            bbox_flags (Tensor, optional): Whether the bboxes are to be
+                assigned, shape (num_imgs, n). Defaults to all of them.
+
+        Returns:
+            tuple[Tensor]: The assigned gt indices as in
+                :obj:`AssignResult` and the max overlaps of the bboxes, both
+                of shape (num_imgs, n).
+        """
+        num_imgs, num_bboxes = bboxes.shape[:2]
+        num_gts = [len(gt_bboxes) for gt_bboxes in gt_bboxes_list]
+        max_num_gts = max(max(num_gts), 1)
+        assign_on_cpu = True if (self.gpu_assign_thr > 0) and (
+            max(num_gts) > self.gpu_assign_thr) else False
+        device = bboxes.device
         if assign_on_cpu:
-            assign_result.gt_inds = assign_result.gt_inds.to(device)
-            assign_result.max_overlaps = assign_result.max_overlaps.to(device)
-            if assign_result.labels is not None:
-                assign_result.labels = assign_result.labels.to(device)
-        return assign_result
+            bboxes = bboxes.cpu()
+        if bbox_flags is None:
+            bbox_flags = bboxes.new_ones((num_imgs, num_bboxes),
+                                         dtype=torch.bool)
+        bbox_flags = bbox_flags.to(bboxes.device, torch.bool)
+
+        # pad the gts of every image
+        gt_bboxes = bboxes.new_zeros((num_imgs, max_num_gts, 4))
+        gt_flags = bboxes.new_zeros((num_imgs, max_num_gts), dtype=torch.bool)
+        for i, img_gt_bboxes in enumerate(gt_bboxes_list):
+            gt_bboxes[i, :num_gts[i]] = img_gt_bboxes[:, :4]
+            gt_flags[i, :num_gts[i]] = True
+        overlaps = self.iou_calculator(gt_bboxes, bboxes)
+
+        if self.ignore_iof_thr > 0 and gt_bboxes_ignore_list is not None:
+            num_ignores = [
+                0 if ignores is None else len(ignores)
+                for ignores in gt_bboxes_ignore_list
+            ]
+            if max(num_ignores) > 0:
+                # the padding boxes are empty, and do not overlap the bboxes
+                gt_bboxes_ignore = bboxes.new_zeros(
+                    (num_imgs, max(num_ignores), 4))
+                for i, ignores in enumerate(gt_bboxes_ignore_list):
+                    if num_ignores[i] > 0:
+                        gt_bboxes_ignore[i, :num_ignores[i]] = ignores[:, :4]
+                if self.ignore_wrt_candidates:
+                    ignore_overlaps = self.iou_calculator(
+                        bboxes, gt_bboxes_ignore, mode='iof')
+                    ignore_max_overlaps, _ = ignore_overlaps.max(dim=2)
+                else:
+                    ignore_overlaps = self.iou_calculator(
+                        gt_bboxes_ignore, bboxes, mode='iof')
+                    ignore_max_overlaps, _ = ignore_overlaps.max(dim=1)
+                overlaps.masked_fill_(
+                    (ignore_max_overlaps > self.ignore_iof_thr)[:, None], -1)
+        # the padding gts and the bboxes not to be assigned are below all the
+        # overlaps, and never match
+        overlaps.masked_fill_(
+            ~gt_flags[:, :, None] | ~bbox_flags[:, None, :], -2)
+
+        # 1. assign -1 by default
+        assigned_gt_inds = overlaps.new_full((num_imgs, num_bboxes),
+                                             -1,
+                                             dtype=torch.long)
+        max_overlaps, argmax_overlaps = overlaps.max(dim=1)
+        gt_max_overlaps, gt_argmax_overlaps = overlaps.max(dim=2)
+
+        # 2. and 3. assign negative and positive
+        self._assign_wrt_max_overlaps(assigned_gt_inds, max_overlaps,
+                                      argmax_overlaps)
+
+        if self.match_low_quality:
+            # 4. the nearest bboxes of every gt, the last gt matching a bbox
+            # winning as in the loop of ``assign_wrt_overlaps``
+            if self.gt_max_assign_all:
+                matches = overlaps == gt_max_overlaps[:, :, None]
+            else:
+                matches = torch.zeros_like(overlaps, dtype=torch.bool)
+                matches.scatter_(2, gt_argmax_overlaps[:, :, None], True)
+            matches &= ((gt_max_overlaps >= self.min_pos_iou)
+                        & gt_flags)[:, :, None]
+            gt_ids = torch.arange(
+                1, max_num_gts + 1, dtype=torch.int32, device=bboxes.device)
+            matched_gt_inds = (matches * gt_ids[:, None]).max(dim=1)[0]
+            assigned_gt_inds = torch.where(matched_gt_inds > 0,
+                                           matched_gt_inds.long(),
+                                           assigned_gt_inds)
+
+        # the images without gt are background
+        no_gt = gt_bboxes.new_tensor(num_gts, dtype=torch.long)[:, None] == 0
+        assigned_gt_inds[no_gt & bbox_flags] = 0
+        max_overlaps = max_overlaps.masked_fill(no_gt | ~bbox_flags, 0)
+        return assigned_gt_inds.to(device), max_overlaps.to(device)
 
     def assign_wrt_overlaps(self, overlaps, gt_labels=None):
         """Assign w.r.t. the overlaps of bboxes with gts.
@@ -167,19 +393,9 @@ class MaxIoUAssigner(BaseAssigner):
         # for each gt, the max iou of all proposals
         gt_max_overlaps, gt_argmax_overlaps = overlaps.max(dim=1)
 
-        # 2. assign negative: below
-        # the negative inds are set to be 0
-        if isinstance(self.neg_iou_thr, float):
-            assigned_gt_inds[(max_overlaps >= 0)
-                             & (max_overlaps < self.neg_iou_thr)] = 0
-        elif isinstance(self.neg_iou_thr, tuple):
-            assert len(self.neg_iou_thr) == 2
-            assigned_gt_inds[(max_overlaps >= self.neg_iou_thr[0])
-                             & (max_overlaps < self.neg_iou_thr[1])] = 0
-
-        # 3. assign positive: above positive IoU threshold
-        pos_inds = max_overlaps >= self.pos_iou_thr
-        assigned_gt_inds[pos_inds] = argmax_overlaps[pos_inds] + 1
+        # 2. and 3. assign negative and positive
+        self._assign_wrt_max_overlaps(assigned_gt_inds, max_overlaps,
+                                      argmax_overlaps)
 
         if self.match_low_quality:
             # Low-quality matching will overwirte the assigned_gt_inds assigned
@@ -198,15 +414,39 @@ class MaxIoUAssigner(BaseAssigner):
                     else:
                         assigned_gt_inds[gt_argmax_overlaps[i]] = i + 1
 
-        if gt_labels is not None:
-            assigned_labels = assigned_gt_inds.new_full((num_bboxes, ), -1)
-            pos_inds = torch.nonzero(
-                assigned_gt_inds > 0, as_tuple=False).squeeze()
-            if pos_inds.numel() > 0:
-                assigned_labels[pos_inds] = gt_labels[
-                    assigned_gt_inds[pos_inds] - 1]
-        else:
-            assigned_labels = None
-
         return AssignResult(
-            num_gts, assigned_gt_inds, max_overlaps, labels=assigned_labels)
+            num_gts,
+            assigned_gt_inds,
+            max_overlaps,
+            labels=self._get_assigned_labels(assigned_gt_inds, gt_labels))
+
+    def _assign_wrt_max_overlaps(self, assigned_gt_inds, max_overlaps,
+                                 argmax_overlaps):
+        """Assign the negative and positive bboxes in place, w.r.t. their
+        max overlap with the gts."""
+        # 2. assign negative: below
+        # the negative inds are set to be 0
+        if isinstance(self.neg_iou_thr, float):
+            assigned_gt_inds[(max_overlaps >= 0)
+                             & (max_overlaps < self.neg_iou_thr)] = 0
+        elif isinstance(self.neg_iou_thr, tuple):
+            assert len(self.neg_iou_thr) == 2
+            assigned_gt_inds[(max_overlaps >= self.neg_iou_thr[0])
+                             & (max_overlaps < self.neg_iou_thr[1])] = 0
+
+        # 3. assign positive: above positive IoU threshold
+        pos_inds = max_overlaps >= self.pos_iou_thr
+        assigned_gt_inds[pos_inds] = argmax_overlaps[pos_inds] + 1
+
+    def _get_assigned_labels(self, assigned_gt_inds, gt_labels=None):
+        """Get the labels of the gts assigned to the bboxes."""
+        if gt_labels is None:
+            return None
+        assigned_labels = assigned_gt_inds.new_full(assigned_gt_inds.shape,
+                                                    -1)
+        pos_inds = torch.nonzero(
+            assigned_gt_inds > 0, as_tuple=False).squeeze()
+        if pos_inds.numel() > 0:
+            assigned_labels[pos_inds] = gt_labels[
+                assigned_gt_inds[pos_inds] - 1]
+        return assigned_labels
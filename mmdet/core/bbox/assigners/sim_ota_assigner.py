@@ -225,24 +225,47 @@ class SimOTAAssigner(BaseAssigner):
         return is_in_gts_or_centers, is_in_boxes_and_centers
 
     def dynamic_k_matching(self, cost, pairwise_ious, num_gt, valid_mask):
-        matching_matrix = torch.zeros_like(cost)
+        """Match every gt with its ``dynamic_k`` priors of lowest cost.
+
+        The ``dynamic_k`` of a gt is the sum of its ``candidate_topk`` highest
+        ious, at most ``candidate_topk``, so a single top-k of the costs gives
+        the candidates of all the gts, masked by their rank. A prior matched
+        with several gts keeps the one of lowest cost. No Python loop nor host
+        synchronization is needed.
+
+        Args:
+            cost (Tensor): Cost of the valid priors and the gts, shape
+                (num_valid, num_gt).
+            pairwise_ious (Tensor): IoUs of the valid priors and the gts,
+                shape (num_valid, num_gt).
+            num_gt (int): Number of gts.
+            valid_mask (Tensor): Priors in the gts or their centers, updated
+                in place to the matched ones.
+
+        Returns:
+            tuple[Tensor]: The IoUs and the gt indices of the matched priors.
+        """
+        candidate_topk = min(self.candidate_topk, cost.size(0))
         # select candidate topk ious for dynamic-k calculation
-        topk_ious, _ = torch.topk(pairwise_ious, self.candidate_topk, dim=0)
+        topk_ious, _ = torch.topk(pairwise_ious, candidate_topk, dim=0)
         # calculate dynamic k for each gt
         dynamic_ks = torch.clamp(topk_ious.sum(0).int(), min=1)
-        for gt_idx in range(num_gt):
-            _, pos_idx = torch.topk(
-                cost[:, gt_idx], k=dynamic_ks[gt_idx].item(), largest=False)
-            matching_matrix[:, gt_idx][pos_idx] = 1.0
+        # the dynamic_ks lowest costs of every gt
+        _, topk_inds = torch.topk(
+            cost, candidate_topk, dim=0, largest=False, sorted=True)
+        ranks = torch.arange(candidate_topk, device=cost.device)[:, None]
+        matching_matrix = torch.zeros_like(cost)
+        matching_matrix.scatter_(0, topk_inds,
+                                 (ranks < dynamic_ks).to(cost.dtype))
 
-        del topk_ious, dynamic_ks, pos_idx
+        del topk_ious, dynamic_ks, topk_inds
 
+        # the priors matched with several gts keep the one of lowest cost
         prior_match_gt_mask = matching_matrix.sum(1) > 1
-        if prior_match_gt_mask.sum() > 0:
-            cost_min, cost_argmin = torch.min(
-                cost[prior_match_gt_mask, :], dim=1)
-            matching_matrix[prior_match_gt_mask, :] *= 0.0
-            matching_matrix[prior_match_gt_mask, cost_argmin] = 1.0
+        cost_argmin = cost.argmin(dim=1)
+        matching_matrix = torch.where(
+            prior_match_gt_mask[:, None],
+            F.one_hot(cost_argmin, num_gt).to(cost.dtype), matching_matrix)
         # get foreground mask inside box and center prior
         fg_mask_inboxes = matching_matrix.sum(1) > 0.0
         valid_mask[valid_mask.clone()] = fg_mask_inboxes
@@ -7,6 +7,7 @@
 from .class_names import (cityscapes_classes, coco_classes, dataset_aliases,
                           get_classes, imagenet_det_classes,
                           imagenet_vid_classes, voc_classes)
+from .coco_eval import ParallelCOCOeval
 from .eval_hooks import (DistEvalHook, DistEvalPlusBeforeRunHook, EvalHook,
                          EvalPlusBeforeRunHook)
 from .mean_ap import average_precision, eval_map, print_map_summary
@@ -21,5 +22,5 @@ __all__ = [
     'DistEvalHook', 'DistEvalPlusBeforeRunHook', 'EvalHook', 'EvalPlusBeforeRunHook',
     'average_precision', 'eval_map', 'print_map_summary', 'eval_recalls',
     'print_recall_summary', 'plot_num_recall', 'plot_iou_recall', 'text_eval',
-    'eval_segm'
+    'eval_segm', 'ParallelCOCOeval'
 ]
@@ -1,14 +1,26 @@
 import numpy as np
 
 
-def bbox_overlaps(bboxes1, bboxes2, mode='iou', eps=1e-6):
+def bbox_overlaps(bboxes1,
+                  bboxes2,
+                  mode='iou',
+                  eps=1e-6,
+                  max_elements=2**22):
     """Calculate the ious between each bbox of bboxes1 and bboxes2.
 
+    The overlaps are computed with broadcasting over a block of rows of
+    ``bboxes1`` at a time. The number of rows in a block is chosen so that
+    every temporary array holds at most ``max_elements`` values, which keeps
+    the peak memory bounded for huge proposal sets.
+
     Args:
         bboxes1(ndarray): shape (n, 4)
         bboxes2(ndarray): shape (k, 4)
         mode(str): iou (intersection over union) or iof (intersection
             over foreground)
+        eps(float): lower bound of the union to avoid division by zero.
+        max_elements(int): maximum number of elements of the temporary
+            arrays allocated per block. Default: 2**22 (16 MB of float32).
 
     Returns:
         ious(ndarray): shape (n, k)
@@ -23,26 +35,26 @@ def bbox_overlaps(bboxes1, bboxes2, mode='iou', eps=1e-6):
     ious = np.zeros((rows, cols), dtype=np.float32)
     if rows * cols == 0:
         return ious
-    exchange = False
-    if bboxes1.shape[0] > bboxes2.shape[0]:
-        bboxes1, bboxes2 = bboxes2, bboxes1
-        ious = np.zeros((cols, rows), dtype=np.float32)
-        exchange = True
     area1 = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
     area2 = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
-    for i in range(bboxes1.shape[0]):
-        x_start = np.maximum(bboxes1[i, 0], bboxes2[:, 0])
-        y_start = np.maximum(bboxes1[i, 1], bboxes2[:, 1])
-        x_end = np.minimum(bboxes1[i, 2], bboxes2[:, 2])
-        y_end = np.minimum(bboxes1[i, 3], bboxes2[:, 3])
-        overlap = np.maximum(x_end - x_start, 0) * np.maximum(
-            y_end - y_start, 0)
+    x1, y1, x2, y2 = (bboxes2[None, :, i] for i in range(4))
+
+    step = max(1, min(rows, max_elements // cols))
+    for start in range(0, rows, step):
+        end = min(start + step, rows)
+        block = bboxes1[start:end, :, None]
+        w = np.minimum(block[:, 2], x2)
+        w -= np.maximum(block[:, 0], x1)
+        np.maximum(w, 0, out=w)
+        h = np.minimum(block[:, 3], y2)
+        h -= np.maximum(block[:, 1], y1)
+        np.maximum(h, 0, out=h)
+        overlap = np.multiply(w, h, out=w)
         if mode == 'iou':
-            union = area1[i] + area2 - overlap
+            union = np.add(area1[start:end, None], area2[None, :], out=h)
+            union -= overlap
+            np.maximum(union, eps, out=union)
         else:
-            union = area1[i] if not exchange else area2
-        union = np.maximum(union, eps)
-        ious[i, :] = overlap / union
-    if exchange:
-        ious = ious.T
+            union = np.maximum(area1[start:end, None], eps)
+        np.divide(overlap, union, out=ious[start:end])
     return ious
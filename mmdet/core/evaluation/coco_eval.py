@@ -0,0 +1,157 @@
+import copy
+import time
+from collections import defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+from mmcv.utils import print_log
+from pycocotools.cocoeval import COCOeval
+
+
+def _evaluate_img_chunk(params, gts, dts):
+    """Run the per-image part of ``COCOeval.evaluate`` for a chunk of images.
+
+    Args:
+        params (Params): Evaluation params whose ``imgIds`` hold the images
+            of this chunk.
+        gts (dict): Prepared ground truths of the chunk keyed by
+            (img_id, cat_id).
+        dts (dict): Prepared detections of the chunk keyed by
+            (img_id, cat_id).
+
+    Returns:
+        list[list[list[dict]]]: Per-image evaluation results indexed by
+            [category][area range][image].
+    """
+    coco_eval = COCOeval(iouType=params.iouType)
+    coco_eval.params = params
+    coco_eval._gts = gts
+    coco_eval._dts = dts
+    cat_ids = params.catIds if params.useCats else [-1]
+    if params.iouType == 'keypoints':
+        compute_iou = coco_eval.computeOks
+    else:
+        compute_iou = coco_eval.computeIoU
+    coco_eval.ious = {(img_id, cat_id): compute_iou(img_id, cat_id)
+                      for img_id in params.imgIds for cat_id in cat_ids}
+    max_det = params.maxDets[-1]
+    return [[[
+        coco_eval.evaluateImg(img_id, cat_id, area_rng, max_det)
+        for img_id in params.imgIds
+    ] for area_rng in params.areaRng] for cat_id in cat_ids]
+
+
+class ParallelCOCOeval(COCOeval):
+    """COCOeval which keeps the ground truth index read-only and splits the
+    per-image matching across a process pool.
+
+    The original ``COCOeval._prepare`` writes the ``ignore`` flags and the RLE
+    masks into the annotations of ``cocoGt``, which forces callers to
+    deep-copy the whole index for every metric. Here the ground truths are
+    shallow-copied per annotation instead, so one ``COCO`` object can be
+    shared by bbox, segm and proposal evaluation. ``accumulate`` and
+    ``summarize`` are inherited unchanged, so the numbers are the same as
+    those of pycocotools.
+
+    Args:
+        cocoGt (COCO): Ground truth index. It is not modified.
+        cocoDt (COCO): Detection index.
+        iouType (str): One of 'segm', 'bbox' and 'keypoints'.
+        nproc (int): Processes used for the per-image evaluation. The
+            evaluation is done in the current process if it is not greater
+            than 1. Default: 1.
+        logger (logging.Logger | str, optional): Logger used for printing
+            the progress of the parallel evaluation. Default: None.
+    """
+
+    def __init__(self,
+                 cocoGt=None,
+                 cocoDt=None,
+                 iouType='segm',
+                 nproc=1,
+                 logger=None):
+        super().__init__(cocoGt, cocoDt, iouType)
+        self.nproc = nproc
+        self.logger = logger
+
+    def _prepare(self):
+        p = self.params
+        cat_ids = p.catIds if p.useCats else []
+        gts = self.cocoGt.loadAnns(
+            self.cocoGt.getAnnIds(imgIds=p.imgIds, catIds=cat_ids))
+        dts = self.cocoDt.loadAnns(
+            self.cocoDt.getAnnIds(imgIds=p.imgIds, catIds=cat_ids))
+        gts = [dict(gt) for gt in gts]
+        if p.iouType == 'segm':
+            for gt in gts:
+                gt['segmentation'] = self.cocoGt.annToRLE(gt)
+            for dt in dts:
+                dt['segmentation'] = self.cocoDt.annToRLE(dt)
+        for gt in gts:
+            gt['ignore'] = 'iscrowd' in gt and gt['iscrowd']
+            if p.iouType == 'keypoints':
+                gt['ignore'] = (gt['num_keypoints'] == 0) or gt['ignore']
+        self._gts = defaultdict(list)
+        self._dts = defaultdict(list)
+        for gt in gts:
+            self._gts[gt['image_id'], gt['category_id']].append(gt)
+        for dt in dts:
+            self._dts[dt['image_id'], dt['category_id']].append(dt)
+        self.evalImgs = defaultdict(list)
+        self.eval = {}
+
+    def evaluate(self):
+        if self.nproc <= 1 or len(self.params.imgIds) <= 1:
+            return super().evaluate()
+
+        tic = time.time()
+        p = self.params
+        print_log(
+            f'Running per image evaluation of *{p.iouType}* with '
+            f'{self.nproc} processes...',
+            logger=self.logger)
+        p.imgIds = list(np.unique(p.imgIds))
+        if p.useCats:
+            p.catIds = list(np.unique(p.catIds))
+        p.maxDets = sorted(p.maxDets)
+        self.params = p
+        self._prepare()
+
+        # several chunks per process to balance crowded and empty images
+        num_chunks = min(len(p.imgIds), self.nproc * 4)
+        chunk_size = int(np.ceil(len(p.imgIds) / num_chunks))
+        chunks = [
+            p.imgIds[i:i + chunk_size]
+            for i in range(0, len(p.imgIds), chunk_size)
+        ]
+        chunk_inds = {
+            img_id: i
+            for i, chunk in enumerate(chunks) for img_id in chunk
+        }
+        chunk_gts = [defaultdict(list) for _ in chunks]
+        chunk_dts = [defaultdict(list) for _ in chunks]
+        for key, anns in self._gts.items():
+            chunk_gts[chunk_inds[key[0]]][key] = anns
+        for key, anns in self._dts.items():
+            chunk_dts[chunk_inds[key[0]]][key] = anns
+        args = []
+        for chunk, gts, dts in zip(chunks, chunk_gts, chunk_dts):
+            params = copy.copy(p)
+            params.imgIds = chunk
+            args.append((params, gts, dts))
+
+        with Pool(self.nproc) as pool:
+            chunk_results = pool.starmap(_evaluate_img_chunk, args)
+
+        # restore the [category][area range][image] order of COCOeval
+        num_cats = len(p.catIds) if p.useCats else 1
+        self.evalImgs = [
+            eval_img for cat_ind in range(num_cats)
+            for area_ind in range(len(p.areaRng)) for result in chunk_results
+            for eval_img in result[cat_ind][area_ind]
+        ]
+        # IoUs stay in the workers, they are not needed by accumulate()
+        self.ious = {}
+        self._paramsEval = copy.deepcopy(self.params)
+        toc = time.time()
+        print_log(f'DONE (t={toc - tic:0.2f}s).', logger=self.logger)
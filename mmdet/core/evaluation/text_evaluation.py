@@ -13,6 +13,8 @@
 # and limitations under the License.
 """ This module contains evaluation procedure. """
 
+from multiprocessing import Pool
+
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
@@ -82,19 +84,6 @@ def draw_pr_polygons(image, pr_polygons,
     return image
 
 
-def get_union(polygon1, polygon2):
-    """ Returns area of union of two polygons. """
-
-    return polygon1.area + polygon2.area - get_intersection(polygon1, polygon2)
-
-
-def get_intersection_over_union(polygon1, polygon2):
-    """ Returns intersection over union of two polygons. """
-
-    union = get_union(polygon1, polygon2)
-    return get_intersection(polygon1, polygon2) / union if union else 0.0
-
-
 def get_intersection(polygon1, polygon2):
     """ Returns are of intersection of two polygons. """
 
@@ -226,17 +215,58 @@ def parse_pr_objects(pr_annotation, conf_thr, use_transcription):
     return pr_polygons_list, pr_confidences_list, pr_transcriptions
 
 
+def get_bounds(polygons):
+    """ Returns bounding boxes (x1, y1, x2, y2) of polygons as an array, empty
+        polygons get boxes that do not overlap anything. """
+
+    bounds = np.empty((len(polygons), 4))
+    for i, polygon in enumerate(polygons):
+        bounds[i] = (np.inf, np.inf, -np.inf, -np.inf) if polygon.is_empty else polygon.bounds
+    return bounds
+
+
+def get_overlapping_pairs(polygons1, polygons2):
+    """ Returns indices of the pairs of polygons whose bounding boxes overlap
+        with a positive area, polygons of other pairs do not intersect. """
+
+    bounds1 = get_bounds(polygons1)
+    bounds2 = get_bounds(polygons2)
+    width = np.minimum(bounds1[:, None, 2], bounds2[None, :, 2]) - \
+        np.maximum(bounds1[:, None, 0], bounds2[None, :, 0])
+    height = np.minimum(bounds1[:, None, 3], bounds2[None, :, 3]) - \
+        np.maximum(bounds1[:, None, 1], bounds2[None, :, 1])
+    return np.nonzero((width > 0) & (height > 0))
+
+
+def get_iou_matrix(gt_polygons_list, pr_polygons_list):
+    """ Returns matrix of intersection over union of groundtruth and predicted
+        polygons. Only polygons with overlapping bounding boxes are
+        intersected, and only once per pair. """
+
+    iou_mat = np.zeros((len(gt_polygons_list), len(pr_polygons_list)))
+    for gt_idx, pr_idx in zip(*get_overlapping_pairs(gt_polygons_list, pr_polygons_list)):
+        gt_polygon = gt_polygons_list[gt_idx]
+        pr_polygon = pr_polygons_list[pr_idx]
+        intersection = get_intersection(gt_polygon, pr_polygon)
+        union = gt_polygon.area + pr_polygon.area - intersection
+        iou_mat[gt_idx, pr_idx] = intersection / union if union else 0.0
+    return iou_mat
+
+
 def match_dont_care_objects(gt_polygons_list, gt_dont_care_polygon_nums,
                             pr_polygons_list):
     """ Matches ignored objects. """
 
     pr_dont_care_polygon_nums = []
 
-    if gt_dont_care_polygon_nums:
+    if gt_dont_care_polygon_nums and pr_polygons_list:
+        dont_care_polygons = [gt_polygons_list[num] for num in gt_dont_care_polygon_nums]
+        overlapping = np.zeros((len(pr_polygons_list), len(dont_care_polygons)), dtype=bool)
+        overlapping[get_overlapping_pairs(pr_polygons_list, dont_care_polygons)] = True
         for pr_polygon_idx, pr_polygon in enumerate(pr_polygons_list):
-            for dont_care_polygon_num in gt_dont_care_polygon_nums:
+            for dont_care_idx in np.nonzero(overlapping[pr_polygon_idx])[0]:
                 intersected_area = get_intersection(
-                    gt_polygons_list[dont_care_polygon_num], pr_polygon)
+                    dont_care_polygons[dont_care_idx], pr_polygon)
                 pd_dimensions = pr_polygon.area
                 precision = 0 if pd_dimensions == 0 else intersected_area / pd_dimensions
                 if precision > AREA_PRECISION_CONSTRAINT:
@@ -270,40 +300,96 @@ def match(gt_polygons_list, gt_transcriptions, gt_dont_care_polygon_nums,
     gt_matched_nums = []
     pr_matched_but_not_recognized = []
 
-    output_shape = [len(gt_polygons_list), len(pr_polygons_list)]
-    iou_mat = np.empty(output_shape)
+    iou_mat = get_iou_matrix(gt_polygons_list, pr_polygons_list)
+    gt_dont_care = set(gt_dont_care_polygon_nums)
+    pr_dont_care = set(pr_dont_care_polygon_nums)
     gt_rect_mat = np.zeros(len(gt_polygons_list), np.int8)
     pr_rect_mat = np.zeros(len(pr_polygons_list), np.int8)
-    for gt_idx, gt_polygon in enumerate(gt_polygons_list):
-        for pr_idx, pr_polygon in enumerate(pr_polygons_list):
-            iou_mat[gt_idx, pr_idx] = get_intersection_over_union(
-                gt_polygon, pr_polygon)
-
-    for gt_idx, _ in enumerate(gt_polygons_list):
-        for pr_idx, _ in enumerate(pr_polygons_list):
-            if gt_rect_mat[gt_idx] == 0 and pr_rect_mat[pr_idx] == 0 \
-                    and gt_idx not in gt_dont_care_polygon_nums \
-                    and pr_idx not in pr_dont_care_polygon_nums:
-                if iou_mat[gt_idx, pr_idx] > IOU_CONSTRAINT:
-                    gt_rect_mat[gt_idx] = 1
-                    pr_rect_mat[pr_idx] = 1
-                    if gt_transcriptions is not None and pr_transcriptions is not None:
-                        if  match_transcriptions(gt_transcriptions[gt_idx].lower(), pr_transcriptions[pr_idx].lower(), word_spotting):
-                            pr_matched_nums.append(pr_idx)
-                        else:
-                            pr_matched_but_not_recognized.append(pr_idx)
-                    else:
-                        pr_matched_nums.append(pr_idx)
-                        gt_matched_nums.append(gt_idx)
+
+    # pairs are visited in the same order as in a loop over all of them
+    for gt_idx, pr_idx in zip(*np.nonzero(iou_mat > IOU_CONSTRAINT)):
+        gt_idx, pr_idx = int(gt_idx), int(pr_idx)
+        if gt_rect_mat[gt_idx] == 0 and pr_rect_mat[pr_idx] == 0 \
+                and gt_idx not in gt_dont_care \
+                and pr_idx not in pr_dont_care:
+            gt_rect_mat[gt_idx] = 1
+            pr_rect_mat[pr_idx] = 1
+            if gt_transcriptions is not None and pr_transcriptions is not None:
+                if match_transcriptions(gt_transcriptions[gt_idx].lower(), pr_transcriptions[pr_idx].lower(), word_spotting):
+                    pr_matched_nums.append(pr_idx)
+                else:
+                    pr_matched_but_not_recognized.append(pr_idx)
+            else:
+                pr_matched_nums.append(pr_idx)
+                gt_matched_nums.append(gt_idx)
 
     return pr_matched_nums, pr_matched_but_not_recognized, gt_matched_nums
 
 
+def evaluate_frame(gt_annotation, pr_annotation, conf_thr, use_transcriptions,
+                   word_spotting):
+    """ Parses and matches the objects of a single frame. """
+
+    gt_polygons_list, gt_dont_care_polygon_nums, gt_transcriptions = parse_gt_objects(
+        gt_annotation, use_transcriptions, word_spotting)
+    pr_polygons_list, pr_confidences_list, pr_transcriptions = parse_pr_objects(
+        pr_annotation, conf_thr, use_transcriptions)
+
+    pr_dont_care_polygon_nums = match_dont_care_objects(
+        gt_polygons_list, gt_dont_care_polygon_nums, pr_polygons_list)
+
+    pr_matched_nums = []
+    pr_matched_but_not_recognized = []
+    gt_matched_nums = []
+    if gt_polygons_list and pr_polygons_list:
+        pr_matched_nums, pr_matched_but_not_recognized, gt_matched_nums = match(
+            gt_polygons_list, gt_transcriptions, gt_dont_care_polygon_nums,
+            pr_polygons_list, pr_transcriptions, pr_dont_care_polygon_nums,
+            word_spotting)
+
+    return dict(
+        gt_polygons_list=gt_polygons_list,
+        gt_dont_care_polygon_nums=gt_dont_care_polygon_nums,
+        pr_polygons_list=pr_polygons_list,
+        pr_confidences_list=pr_confidences_list,
+        pr_transcriptions=pr_transcriptions,
+        pr_dont_care_polygon_nums=pr_dont_care_polygon_nums,
+        pr_matched_nums=pr_matched_nums,
+        pr_matched_but_not_recognized=pr_matched_but_not_recognized,
+        gt_matched_nums=gt_matched_nums)
+
+
+def get_frame_stats(frame):
+    """ Returns number of matches, confidences and matches of the cared
+        detections, numbers of cared groundtruth and predicted objects. """
+
+    confidences = []
+    matches = []
+    if frame['gt_polygons_list'] and frame['pr_polygons_list']:
+        pr_dont_care_polygon_nums = set(frame['pr_dont_care_polygon_nums'])
+        pr_matched_nums = set(frame['pr_matched_nums'])
+        for pr_num in range(len(frame['pr_polygons_list'])):
+            if pr_num not in pr_dont_care_polygon_nums:
+                # we exclude the don't care detections
+                confidences.append(frame['pr_confidences_list'][pr_num])
+                matches.append(pr_num in pr_matched_nums)
+
+    num_care_gt = len(frame['gt_polygons_list']) - len(frame['gt_dont_care_polygon_nums'])
+    num_care_pr = len(frame['pr_polygons_list']) - len(frame['pr_dont_care_polygon_nums'])
+    return len(frame['pr_matched_nums']), confidences, matches, num_care_gt, num_care_pr
+
+
+def _evaluate_frame_stats(*args):
+    return get_frame_stats(evaluate_frame(*args))
+
+
 def text_eval(pr_annotations, gt_annotations, conf_thr,
               images=None, show_recall_graph=False,
               imshow_delay=1,
               use_transcriptions=False,
-              word_spotting=True):
+              word_spotting=True,
+              nproc=1,
+              pool=None):
     """ Annotation format:
         {"image_path": [
                             {"points": [x1,y1,x2,y2,x3,y3,x4,y4],
@@ -314,6 +400,9 @@ def text_eval(pr_annotations, gt_annotations, conf_thr,
 
          ### - is a transcription of non-valid word.
 
+        Frames are spread across nproc processes unless images are shown or
+        the recall graph is drawn. A pool of nproc processes may be given to
+        be reused by several calls, otherwise one is created per call.
     """
 
     matched_sum = 0
@@ -327,34 +416,41 @@ def text_eval(pr_annotations, gt_annotations, conf_thr,
     all_width, detected_width = [], []
 
     gt_annotations = [v for k, v in sorted(gt_annotations.items(), key=lambda x:x[0])]
-
-    for frame_id, _ in enumerate(gt_annotations):
-        gt_polygons_list, gt_dont_care_polygon_nums, gt_transcriptions = parse_gt_objects(
-            gt_annotations[frame_id], use_transcriptions, word_spotting)
-        pr_polygons_list, pr_confidences_list, pr_transcriptions = parse_pr_objects(
-            pr_annotations[frame_id], conf_thr, use_transcriptions)
-
-        pr_dont_care_polygon_nums = match_dont_care_objects(
-            gt_polygons_list, gt_dont_care_polygon_nums, pr_polygons_list)
-
-        pr_matched_nums = []
-        pr_matched_but_not_recognized = []
-        if gt_polygons_list and pr_polygons_list:
-            pr_matched_nums, pr_matched_but_not_recognized, gt_matched_nums = match(
-                gt_polygons_list, gt_transcriptions, gt_dont_care_polygon_nums,
-                pr_polygons_list, pr_transcriptions, pr_dont_care_polygon_nums,
-                word_spotting)
-            matched_sum += len(pr_matched_nums)
-
-            for pr_num in range(len(pr_polygons_list)):
-                if pr_num not in pr_dont_care_polygon_nums:
-                    # we exclude the don't care detections
-                    matched = pr_num in pr_matched_nums
-                    arr_global_confidences.append(pr_confidences_list[pr_num])
-                    arr_global_matches.append(matched)
-
-        num_global_care_gt += len(gt_polygons_list) - len(gt_dont_care_polygon_nums)
-        num_global_care_pr += len(pr_polygons_list) - len(pr_dont_care_polygon_nums)
+    frame_args = [(gt_annotations[frame_id], pr_annotations[frame_id], conf_thr,
+                   use_transcriptions, word_spotting)
+                  for frame_id, _ in enumerate(gt_annotations)]
+
+    if nproc > 1 and images is None and not show_recall_graph:
+        chunksize = max(1, len(frame_args) // (nproc * 4))
+        if pool is not None:
+            frame_stats = pool.starmap(_evaluate_frame_stats, frame_args, chunksize)
+        else:
+            with Pool(nproc) as pool:
+                frame_stats = pool.starmap(_evaluate_frame_stats, frame_args, chunksize)
+        frames = [None] * len(frame_args)
+    else:
+        frames = (evaluate_frame(*args) for args in frame_args)
+        frame_stats = None
+
+    for frame_id, frame in enumerate(frames):
+        stats = get_frame_stats(frame) if frame_stats is None else frame_stats[frame_id]
+        matched, confidences, matches, num_care_gt, num_care_pr = stats
+        matched_sum += matched
+        arr_global_confidences.extend(confidences)
+        arr_global_matches.extend(matches)
+        num_global_care_gt += num_care_gt
+        num_global_care_pr += num_care_pr
+        if frame is None:
+            continue
+
+        gt_polygons_list = frame['gt_polygons_list']
+        gt_dont_care_polygon_nums = frame['gt_dont_care_polygon_nums']
+        pr_polygons_list = frame['pr_polygons_list']
+        pr_transcriptions = frame['pr_transcriptions']
+        pr_dont_care_polygon_nums = frame['pr_dont_care_polygon_nums']
+        pr_matched_nums = frame['pr_matched_nums']
+        pr_matched_but_not_recognized = frame['pr_matched_but_not_recognized']
+        gt_matched_nums = frame['gt_matched_nums']
 
         if images is not None:
             image = images[frame_id]
@@ -12,21 +12,227 @@
 # See the License for the specific language governing permissions
 # and limitations under the License.
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pycocotools.mask as mask_util
 
-from ..utils.misc import to_numpy
-
 import torch
 import torch.nn.functional as F
 
 
+BYTES_PER_FLOAT = 4
+# Limit of the memory taken by the sampling grid and the output of one chunk
+# of masks pasted together by mask2result.
+MASK_PASTE_MEM_LIMIT = 256 * 1024**2
+
+
+def _paste_range(start, end, mask_size, img_size):
+    """Get the range of pixels where a mask resampled to [start, end] may be
+    non-zero.
+
+    Bilinear sampling with zero padding reaches at most one mask pixel beyond
+    the box, so the range is the box extended by one mask pixel and one image
+    pixel on each side. Degenerate boxes are sampled in the whole image like
+    in the full-image paste.
+    """
+    size = np.abs(end - start)
+    margin = size / mask_size + 1
+    range_start = np.clip(np.floor(np.minimum(start, end) - margin), 0,
+                          img_size)
+    range_end = np.clip(np.ceil(np.maximum(start, end) + margin), 0, img_size)
+    degenerate = ~(size > 0)
+    range_start[degenerate] = 0
+    range_end[degenerate] = img_size
+    return range_start.astype(np.int64), range_end.astype(np.int64)
+
+
+def _plan_paste_chunks(heights, widths, mem_limit):
+    """Group the masks sorted by the size of their regions in chunks, whose
+    grid of the largest region in them fits in ``mem_limit`` bytes.
+
+    Returns:
+        list[tuple[ndarray, int, int]]: Indices of the masks of every chunk
+            and the height and width of its grid.
+    """
+    # grid (2 floats) and sampled output (1 float) per pixel
+    bytes_per_pixel = 3 * BYTES_PER_FLOAT
+    num_masks = len(heights)
+    order = np.argsort(heights * widths, kind='stable')
+    chunks = []
+    chunk_start = 0
+    while chunk_start < num_masks:
+        chunk_end = chunk_start + 1
+        max_h, max_w = heights[order[chunk_start]], widths[order[chunk_start]]
+        while chunk_end < num_masks:
+            ind = order[chunk_end]
+            new_h, new_w = max(max_h, heights[ind]), max(max_w, widths[ind])
+            num = chunk_end - chunk_start + 1
+            if num * new_h * new_w * bytes_per_pixel > mem_limit:
+                break
+            max_h, max_w = new_h, new_w
+            chunk_end += 1
+        chunks.append((order[chunk_start:chunk_end], max_h, max_w))
+        chunk_start = chunk_end
+    return chunks
+
+
+def _paste_chunk(masks, boxes, inds, max_h, max_w, x_start, y_start,
+                 mask_thr_binary):
+    """Paste a chunk of masks into grids of (max_h, max_w) pixels from their
+    region offsets, with a single ``F.grid_sample`` call.
+
+    Returns:
+        ndarray: Binary masks of shape (len(inds), max_h, max_w).
+    """
+    device = masks.device
+    inds_t = torch.from_numpy(inds).to(device)
+    x0, y0, x1, y1 = torch.split(boxes[inds_t], 1, dim=1)  # each is Nx1
+    offsets_x = torch.from_numpy(x_start[inds]).to(
+        device=device, dtype=torch.float32)
+    offsets_y = torch.from_numpy(y_start[inds]).to(
+        device=device, dtype=torch.float32)
+    img_y = torch.arange(
+        max_h, device=device, dtype=torch.float32) + offsets_y[:, None]
+    img_x = torch.arange(
+        max_w, device=device, dtype=torch.float32) + offsets_x[:, None]
+    img_y = (img_y + 0.5 - y0) / (y1 - y0) * 2 - 1
+    img_x = (img_x + 0.5 - x0) / (x1 - x0) * 2 - 1
+    # img_x, img_y have shapes (N, w), (N, h)
+    if torch.isinf(img_x).any():
+        inds_inf = torch.where(torch.isinf(img_x))
+        img_x[inds_inf] = 0
+    if torch.isinf(img_y).any():
+        inds_inf = torch.where(torch.isinf(img_y))
+        img_y[inds_inf] = 0
+
+    num = len(inds)
+    gx = img_x[:, None, :].expand(num, max_h, max_w)
+    gy = img_y[:, :, None].expand(num, max_h, max_w)
+    grid = torch.stack([gx, gy], dim=3)
+    img_masks = F.grid_sample(
+        masks[inds_t].to(dtype=torch.float32)[:, None],
+        grid,
+        align_corners=False)
+    return (img_masks[:, 0] >= mask_thr_binary).cpu().numpy()
+
+
+def _paste_masks_in_regions(masks,
+                            boxes,
+                            img_h,
+                            img_w,
+                            mask_thr_binary,
+                            mem_limit,
+                            num_workers=0):
+    """Paste the masks into the regions of the image around their boxes.
+
+    Masks are sorted by the size of their regions and pasted together in
+    chunks with a single ``F.grid_sample`` call each. A chunk samples a grid
+    of the largest region in it, and its size is bounded by ``mem_limit``.
+    Every pixel is sampled at the same coordinates as in the full-image
+    paste, so the binary masks are identical inside the regions and empty
+    outside them.
+
+    On CPU, the chunks can be pasted concurrently by a pool of threads,
+    ``F.grid_sample`` releasing the GIL. Every thread holds a chunk, so up to
+    ``num_workers`` times ``mem_limit`` bytes are used at once.
+
+    Args:
+        masks (Tensor): Masks of shape (N, H, W).
+        boxes (Tensor): Boxes of shape (N, 4).
+        img_h (int): Height of the image to be pasted.
+        img_w (int): Width of the image to be pasted.
+        mask_thr_binary (float): Threshold to binarize the masks.
+        mem_limit (int): Memory limit of a chunk in bytes.
+        num_workers (int): Number of threads pasting the chunks on CPU.
+            0 pastes them in the calling thread. Default: 0.
+
+    Returns:
+        tuple[list[ndarray], ndarray]: Binary masks of the regions and the
+            (y, x) offsets of the regions in the image.
+    """
+    device = masks.device
+    boxes = boxes.to(device=device, dtype=torch.float32)
+    num_masks = boxes.size(0)
+    mask_h, mask_w = masks.shape[-2:]
+
+    if mask_thr_binary > 0:
+        np_boxes = boxes.cpu().numpy().astype(np.float64)
+        x_start, x_end = _paste_range(np_boxes[:, 0], np_boxes[:, 2], mask_w,
+                                      img_w)
+        y_start, y_end = _paste_range(np_boxes[:, 1], np_boxes[:, 3], mask_h,
+                                      img_h)
+    else:
+        # every pixel of the image passes the threshold
+        x_start = np.zeros(num_masks, dtype=np.int64)
+        y_start = np.zeros(num_masks, dtype=np.int64)
+        x_end = np.full(num_masks, img_w, dtype=np.int64)
+        y_end = np.full(num_masks, img_h, dtype=np.int64)
+    heights, widths = y_end - y_start, x_end - x_start
+
+    crops = [None] * num_masks
+    chunks = []
+    for inds, max_h, max_w in _plan_paste_chunks(heights, widths,
+                                                 mem_limit):
+        if max_h == 0 or max_w == 0:
+            for ind in inds:
+                crops[ind] = np.zeros((heights[ind], widths[ind]), dtype=bool)
+        else:
+            chunks.append((inds, max_h, max_w))
+
+    def paste(chunk):
+        inds, max_h, max_w = chunk
+        return _paste_chunk(masks, boxes, inds, max_h, max_w, x_start,
+                            y_start, mask_thr_binary)
+
+    if num_workers > 0 and device.type == 'cpu' and len(chunks) > 1:
+        with ThreadPoolExecutor(min(num_workers, len(chunks))) as pool:
+            chunk_masks = list(pool.map(paste, chunks))
+    else:
+        chunk_masks = map(paste, chunks)
+    for (inds, _, _), img_masks in zip(chunks, chunk_masks):
+        for i, ind in enumerate(inds):
+            crops[ind] = img_masks[i, :heights[ind], :widths[ind]]
+
+    return crops, np.stack([y_start, x_start], axis=1)
+
+
 def mask2result(det_bboxes,
                 det_labels,
                 det_masks,
                 num_classes,
                 mask_thr_binary=0.5,
-                img_size=None):
+                img_size=None,
+                encode=False,
+                mem_limit=MASK_PASTE_MEM_LIMIT,
+                num_workers=0):
+    """Paste the instance masks into the image and group them by class.
+
+    All the masks are pasted in a few batched ``F.grid_sample`` calls that
+    only sample the neighbourhood of each box, see
+    :func:`_paste_masks_in_regions`.
+
+    Args:
+        det_bboxes (Tensor | ndarray): Boxes of shape (N, 4) or (N, 5).
+        det_labels (Tensor | ndarray): Labels of shape (N, ).
+        det_masks (Tensor | ndarray | list): Masks of shape (N, H, W).
+        num_classes (int): Number of classes.
+        mask_thr_binary (float): Threshold to binarize the masks.
+            Default: 0.5.
+        img_size (tuple[int]): (height, width) of the image.
+        encode (bool): Whether to return the masks RLE-encoded, the same way
+            as ``encode_mask_results`` does. In that case no full-image
+            array is allocated per instance. The RoI heads set it with
+            ``mask_output='rle'`` in their ``test_cfg``. Default: False.
+        mem_limit (int): Memory limit of the masks pasted together in bytes.
+            Default: 256 MB.
+        num_workers (int): Number of threads pasting the chunks of masks on
+            CPU. Default: 0.
+
+    Returns:
+        list[list[ndarray | dict]]: Per-class lists of full-image binary
+            masks, or of RLE-encoded masks if ``encode`` is True.
+    """
     masks = det_masks[0] if isinstance(det_masks, list) else det_masks
     bboxes = det_bboxes[:, :4]
     labels = det_labels
@@ -37,38 +243,28 @@ def mask2result(det_bboxes,
         labels = torch.tensor(labels)
 
     cls_masks = [[] for _ in range(num_classes)]
+    num_dets = min(len(bboxes), len(labels), len(masks))
+    if num_dets == 0:
+        return cls_masks
 
-    for bbox, label, mask in zip(bboxes, labels, masks):
-
-        mask = mask[None, :, :]
-        x0_int, y0_int = 0, 0
-        x1_int, y1_int = img_size[::-1]
-
-        img_y = torch.arange(
-            y0_int, y1_int, device=mask.device, dtype=torch.float32) + 0.5
-        img_x = torch.arange(
-            x0_int, x1_int, device=mask.device, dtype=torch.float32) + 0.5
-        x0, y0, x1, y1 = bbox
-
-        img_y = (img_y - y0) / (y1 - y0) * 2 - 1
-        img_x = (img_x - x0) / (x1 - x0) * 2 - 1
-        if torch.isinf(img_x).any():
-            inds = torch.where(torch.isinf(img_x))
-            img_x[inds] = 0
-        if torch.isinf(img_y).any():
-            inds = torch.where(torch.isinf(img_y))
-            img_y[inds] = 0
-
-        gx = img_x[None, :].expand(img_y.size(0), img_x.size(0))
-        gy = img_y[:, None].expand(img_y.size(0), img_x.size(0))
-        grid = torch.stack([gx, gy], dim=2)
-
-        img_masks = F.grid_sample(
-            mask.to(dtype=torch.float32)[None, :, :, :], grid[None, :, :, :], align_corners=False)
-
-        mask = img_masks[0, 0, :, :]
-        mask = (mask >= mask_thr_binary).to(dtype=torch.bool)
-
-        cls_masks[label].append(to_numpy(mask, np.bool))
+    img_h, img_w = (int(x) for x in img_size)
+    crops, offsets = _paste_masks_in_regions(masks[:num_dets],
+                                             bboxes[:num_dets], img_h, img_w,
+                                             mask_thr_binary, mem_limit,
+                                             num_workers)
+    if encode:
+        canvas = np.zeros((img_h, img_w, 1), dtype=np.uint8, order='F')
+    for label, crop_mask, (y0, x0) in zip(labels[:num_dets].tolist(), crops,
+                                          offsets.tolist()):
+        crop_h, crop_w = crop_mask.shape
+        region = (slice(y0, y0 + crop_h), slice(x0, x0 + crop_w))
+        if encode:
+            canvas[region + (0, )] = crop_mask
+            cls_masks[label].append(mask_util.encode(canvas)[0])
+            canvas[region + (0, )] = 0
+        else:
+            mask = np.zeros((img_h, img_w), dtype=bool)
+            mask[region] = crop_mask
+            cls_masks[label].append(mask)
 
     return cls_masks
@@ -36,6 +36,10 @@ def split_combined_polys(polys, poly_lens, polys_per_mask):
 def encode_mask_results(mask_results):
     """Encode bitmap mask to RLE code.
 
+    All the masks of an image are encoded with a single ``mask_util.encode``
+    call. Masks already encoded, e.g. by the RoI heads with
+    ``mask_output='rle'``, are returned as is.
+
     Args:
         mask_results (list | tuple[list]): bitmap mask results.
             In mask scoring rcnn, mask_results is a tuple of (segm_results,
@@ -48,15 +52,28 @@ def encode_mask_results(mask_results):
         cls_segms, cls_mask_scores = mask_results
     else:
         cls_segms = mask_results
-    num_classes = len(cls_segms)
-    encoded_mask_results = [[] for _ in range(num_classes)]
-    for i in range(len(cls_segms)):
-        for cls_segm in cls_segms[i]:
-            encoded_mask_results[i].append(
-                mask_util.encode(
-                    np.array(
-                        cls_segm[:, :, np.newaxis], order='F',
-                        dtype='uint8'))[0])  # encoded with RLE
+    all_segms = [segm for segms in cls_segms for segm in segms]
+    if any(isinstance(segm, dict) for segm in all_segms):
+        return mask_results
+    if all_segms and all(segm.shape == all_segms[0].shape
+                         for segm in all_segms):
+        # masks are copied into one Fortran-ordered buffer, (h, w, n)
+        masks = np.empty(
+            all_segms[0].shape + (len(all_segms), ), dtype=np.uint8, order='F')
+        for i, segm in enumerate(all_segms):
+            masks[:, :, i] = segm
+        rles = mask_util.encode(masks)  # encoded with RLE
+    else:
+        rles = [
+            mask_util.encode(
+                np.array(segm[:, :, np.newaxis], order='F',
+                         dtype='uint8'))[0] for segm in all_segms
+        ]
+    encoded_mask_results = []
+    start = 0
+    for segms in cls_segms:
+        encoded_mask_results.append(rles[start:start + len(segms)])
+        start += len(segms)
     if isinstance(mask_results, tuple):
         return encoded_mask_results, cls_mask_scores
     else:
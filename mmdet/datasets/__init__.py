@@ -14,7 +14,8 @@ from .dataset_wrappers import (ClassBalancedDataset, ConcatDataset,
 from .deepfashion import DeepFashionDataset
 from .lvis import LVISDataset, LVISV1Dataset, LVISV05Dataset
 from .samplers import DistributedGroupSampler, DistributedSampler, GroupSampler
-from .utils import (NumClassCheckHook, get_loading_pipeline,
+from .utils import (NumClassCheckHook, PipelineProfilerHook,
+                    fuse_resize_normalize_pad, get_loading_pipeline,
                     replace_ImageToTensor)
 from .voc import VOCDataset
 from .wider_face import WIDERFaceDataset
@@ -27,5 +28,6 @@ __all__ = [
     'DistributedSampler', 'build_dataloader', 'ConcatDataset', 'RepeatDataset',
     'ClassBalancedDataset', 'WIDERFaceDataset', 'DATASETS', 'PIPELINES',
     'build_dataset', 'replace_ImageToTensor', 'get_loading_pipeline',
-    'NumClassCheckHook', 'CocoWithTextDataset', 'MultiImageMixDataset'
+    'NumClassCheckHook', 'CocoWithTextDataset', 'MultiImageMixDataset',
+    'fuse_resize_normalize_pad', 'PipelineProfilerHook'
 ]
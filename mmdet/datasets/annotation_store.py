@@ -0,0 +1,245 @@
+import hashlib
+import os
+import os.path as osp
+import pickle
+import shutil
+from collections.abc import Sequence
+
+import mmcv
+import numpy as np
+
+# keys of the annotations kept in columns, the other ones go to the extras
+_COLUMN_KEYS = ('id', 'image_id', 'bbox', 'area', 'category_id', 'iscrowd',
+                'ignore', 'segmentation')
+_ARRAYS = ('img_ids', 'ann_offsets', 'ann_ids', 'bboxes', 'areas',
+           'category_ids', 'iscrowd', 'ignore', 'segm_offsets', 'segm_blob',
+           'extra_offsets', 'extra_blob')
+
+
+def file_md5(filename, chunk_size=1 << 22):
+    """Get the md5 hex digest of the content of a file."""
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _pack_objects(objects):
+    """Pickle objects into one uint8 blob, with the offsets of every object.
+
+    None takes no bytes and is unpacked as None.
+    """
+    chunks = [
+        b'' if obj is None else pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        for obj in objects
+    ]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+    blob = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+    return offsets, blob
+
+
+class PackedAnnotations(Sequence):
+    """Annotations of an image in a :class:`CocoAnnotationStore`.
+
+    The columns are views of the memory mapped arrays of the store. Indexing
+    builds the COCO style dict of an annotation, for the parsers that need
+    it.
+    """
+
+    def __init__(self, store, start, end):
+        self.store = store
+        self.start = start
+        self.end = end
+        self.ann_ids = store.ann_ids[start:end]
+        self.bboxes = store.bboxes[start:end]
+        self.areas = store.areas[start:end]
+        self.category_ids = store.category_ids[start:end]
+        self.iscrowd = store.iscrowd[start:end]
+        self.ignore = store.ignore[start:end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def segmentation(self, i):
+        """Get the polygons or RLE of the i-th annotation."""
+        return self.store.get_object('segm', self.start + i)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError('annotation index out of range')
+        ann = dict(
+            id=int(self.ann_ids[i]),
+            image_id=int(self.store.ann_img_ids[self.start + i]),
+            bbox=self.bboxes[i].tolist(),
+            area=float(self.areas[i]),
+            category_id=int(self.category_ids[i]),
+            iscrowd=int(self.iscrowd[i]),
+            ignore=bool(self.ignore[i]))
+        segm = self.segmentation(i)
+        if segm is not None:
+            ann['segmentation'] = segm
+        ann.update(self.store.get_object('extra', self.start + i) or {})
+        return ann
+
+
+class CocoAnnotationStore:
+    """Columnar store of the annotations of a COCO style file.
+
+    Boxes, areas, category ids and flags of all the annotations are kept in
+    flat NumPy arrays sorted by image, and polygons, RLE and any other field
+    are pickled into separate blobs. The arrays are saved once to a directory
+    keyed by the md5 of the annotation file and memory mapped, so that the
+    dataloader workers share the pages of the store instead of touching the
+    Python objects of a ``pycocotools.COCO`` index.
+
+    Args:
+        path (str): Directory of the saved store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        for name in _ARRAYS:
+            setattr(self, name,
+                    np.load(osp.join(self.path, f'{name}.npy'), mmap_mode='r'))
+        meta = mmcv.load(osp.join(self.path, 'meta.pkl'))
+        self.images = meta['images']
+        self.categories = meta['categories']
+        self._id_order = np.argsort(self.img_ids, kind='stable')
+        self.ann_img_ids = np.repeat(self.img_ids, np.diff(self.ann_offsets))
+
+    @classmethod
+    def load_or_build(cls, ann_file, cache_dir='~/.cache/mmdet/ann_store'):
+        """Load the store of an annotation file, building it on a miss.
+
+        Args:
+            ann_file (str): Path of the COCO style annotation file.
+            cache_dir (str): Directory where the stores are saved.
+                Default: '~/.cache/mmdet/ann_store'.
+
+        Returns:
+            CocoAnnotationStore: The memory mapped store.
+        """
+        cache_dir = osp.expanduser(cache_dir)
+        name = osp.splitext(osp.basename(ann_file))[0]
+        path = osp.join(cache_dir, f'{name}.{file_md5(ann_file)}')
+        if not osp.exists(osp.join(path, 'meta.pkl')):
+            cls.build(mmcv.load(ann_file), path)
+        return cls(path)
+
+    @staticmethod
+    def build(dataset, path):
+        """Save the store of the content of a COCO style annotation file.
+
+        Images are kept in the order of the file, and the annotations of an
+        image in the order of the file too, like in ``pycocotools.COCO``.
+        """
+        images = {}
+        for img in dataset['images']:
+            images[img['id']] = img
+        img_ids = list(images)
+        img_inds = {img_id: i for i, img_id in enumerate(img_ids)}
+        anns = [
+            ann for ann in dataset.get('annotations', [])
+            if ann['image_id'] in img_inds
+        ]
+        anns.sort(key=lambda ann: img_inds[ann['image_id']])
+
+        counts = np.bincount(
+            np.array([img_inds[ann['image_id']] for ann in anns],
+                     dtype=np.int64),
+            minlength=len(img_ids))
+        ann_offsets = np.zeros(len(img_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=ann_offsets[1:])
+        arrays = dict(
+            img_ids=np.array(img_ids, dtype=np.int64),
+            ann_offsets=ann_offsets,
+            ann_ids=np.array([ann.get('id', -1) for ann in anns],
+                             dtype=np.int64),
+            bboxes=np.array([ann['bbox'] for ann in anns],
+                            dtype=np.float64).reshape(-1, 4),
+            areas=np.array([ann.get('area', 0) for ann in anns],
+                           dtype=np.float64),
+            category_ids=np.array([ann['category_id'] for ann in anns],
+                                  dtype=np.int64),
+            iscrowd=np.array([bool(ann.get('iscrowd', False)) for ann in anns],
+                             dtype=bool),
+            ignore=np.array([bool(ann.get('ignore', False)) for ann in anns],
+                            dtype=bool))
+        arrays['segm_offsets'], arrays['segm_blob'] = _pack_objects(
+            ann.get('segmentation') for ann in anns)
+        extras = ({k: v
+                   for k, v in ann.items() if k not in _COLUMN_KEYS}
+                  for ann in anns)
+        arrays['extra_offsets'], arrays['extra_blob'] = _pack_objects(
+            extra or None for extra in extras)
+
+        # several processes may build the same store, the first one wins
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        mmcv.mkdir_or_exist(tmp_path)
+        for name, array in arrays.items():
+            np.save(osp.join(tmp_path, f'{name}.npy'), array)
+        mmcv.dump(
+            dict(
+                images=[images[img_id] for img_id in img_ids],
+                categories=dataset.get('categories', [])),
+            osp.join(tmp_path, 'meta.pkl'))
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path)
+
+    def __len__(self):
+        return len(self.img_ids)
+
+    def __getitem__(self, i):
+        return PackedAnnotations(self, int(self.ann_offsets[i]),
+                                 int(self.ann_offsets[i + 1]))
+
+    def get_cat_ids(self, cat_names=()):
+        """Get the ids of the categories with the given names, in the order
+        of the file, like ``pycocotools.COCO.get_cat_ids``."""
+        cats = self.categories
+        if len(cat_names) > 0:
+            cats = [cat for cat in cats if cat['name'] in cat_names]
+        return [cat['id'] for cat in cats]
+
+    def index(self, img_id):
+        """Get the position of an image in the store by its id."""
+        pos = np.searchsorted(self.img_ids, img_id, sorter=self._id_order)
+        if pos == len(self) or self.img_ids[self._id_order[pos]] != img_id:
+            raise KeyError(img_id)
+        return int(self._id_order[pos])
+
+    def num_anns(self):
+        """Get the number of annotations of every image."""
+        return np.diff(self.ann_offsets)
+
+    def has_categories(self, cat_ids):
+        """Get whether every image has an annotation of the categories."""
+        in_cat = np.isin(self.category_ids, cat_ids)
+        counts = np.bincount(
+            np.repeat(np.arange(len(self)), self.num_anns())[in_cat],
+            minlength=len(self))
+        return counts > 0
+
+    def get_object(self, kind, i):
+        """Unpickle the segmentation (``kind='segm'``) or the extra fields
+        (``kind='extra'``) of the i-th annotation, or None if empty."""
+        offsets = getattr(self, f'{kind}_offsets')
+        start, end = offsets[i], offsets[i + 1]
+        if start == end:
+            return None
+        return pickle.loads(getattr(self, f'{kind}_blob')[start:end].tobytes())
+
+    def __getstate__(self):
+        # the arrays are mapped again in the process the store is unpickled in
+        return dict(path=self.path)
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._open()
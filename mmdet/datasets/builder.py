@@ -15,7 +15,10 @@ from mmcv.runner import get_dist_info
 from mmcv.utils import Registry, build_from_cfg
 from torch.utils.data import DataLoader
 
-from .samplers import DistributedGroupSampler, DistributedSampler, GroupSampler
+from .samplers import (AspectRatioGroupSampler,
+                       DistributedAspectRatioGroupSampler,
+                       DistributedGroupSampler, DistributedSampler,
+                       GroupSampler)
 
 if platform.system() != 'Windows':
     # https://github.com/pytorch/pytorch/issues/973
@@ -140,6 +143,7 @@ def build_dataloader(dataset,
                      dist=True,
                      shuffle=True,
                      seed=None,
+                     bucket_cfg=None,
                      **kwargs):
     """Build PyTorch DataLoader.
 
@@ -156,6 +160,13 @@ def build_dataloader(dataset,
         dist (bool): Distributed training/test or not. Default: True.
         shuffle (bool): Whether to shuffle the data at every epoch.
             Default: True.
+        seed (int, optional): Seed of the workers.
+        bucket_cfg (dict, optional): If set, the batches are grouped by
+            buckets of aspect ratio and size with these arguments of
+            :obj:`AspectRatioGroupSampler`, or
+            :obj:`DistributedAspectRatioGroupSampler` when shuffling in
+            distributed mode. Without shuffling in distributed mode, it is
+            ignored.
         kwargs: any keyword argument to be used to initialize DataLoader
 
     Returns:
@@ -165,7 +176,10 @@ def build_dataloader(dataset,
     if dist:
         # DistributedGroupSampler will definitely shuffle the data to satisfy
         # that images on each GPU are in the same group
-        if shuffle:
+        if shuffle and bucket_cfg is not None:
+            sampler = DistributedAspectRatioGroupSampler(
+                dataset, samples_per_gpu, world_size, rank, **bucket_cfg)
+        elif shuffle:
             sampler = DistributedGroupSampler(dataset, samples_per_gpu,
                                               world_size, rank)
         else:
@@ -174,7 +188,12 @@ def build_dataloader(dataset,
         batch_size = samples_per_gpu
         num_workers = workers_per_gpu
     else:
-        sampler = GroupSampler(dataset, samples_per_gpu) if shuffle else None
+        if bucket_cfg is not None:
+            sampler = AspectRatioGroupSampler(
+                dataset, samples_per_gpu, shuffle=shuffle, **bucket_cfg)
+        else:
+            sampler = GroupSampler(dataset,
+                                   samples_per_gpu) if shuffle else None
         batch_size = num_gpus * samples_per_gpu
         num_workers = num_gpus * workers_per_gpu
 
@@ -12,6 +12,7 @@ import os
 import os.path as osp
 import tempfile
 from collections import OrderedDict
+from collections.abc import Sequence
 
 import mmcv
 import numpy as np
@@ -191,12 +192,14 @@ class CityscapesDataset(CocoDataset):
                 the json filepaths, tmp_dir is the temporal directory created \
                 for saving txt/png files when txtfile_prefix is not specified.
         """
-        assert isinstance(results, list), 'results must be a list'
+        assert isinstance(results, Sequence), \
+            'results must be a sequence'
         assert len(results) == len(self), (
             'The length of results is not equal to the dataset len: {} != {}'.
             format(len(results), len(self)))
 
-        assert isinstance(results, list), 'results must be a list'
+        assert isinstance(results, Sequence), \
+            'results must be a sequence'
         assert len(results) == len(self), (
             'The length of results is not equal to the dataset len: {} != {}'.
             format(len(results), len(self)))
@@ -8,12 +8,12 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
-import copy
 import itertools
 import logging
 import os.path as osp
 import tempfile
 from collections import OrderedDict
+from collections.abc import Sequence
 
 import cv2
 import mmcv
@@ -21,12 +21,12 @@ import numpy as np
 from mmcv.utils import print_log
 import os
 from pycocotools.coco import COCO
-from pycocotools.cocoeval import COCOeval
 from pycocotools.mask import decode
 from terminaltables import AsciiTable
 
-from mmdet.core import eval_recalls
+from mmdet.core import ParallelCOCOeval, eval_recalls
 from mmdet.core import text_eval
+from .annotation_store import CocoAnnotationStore, PackedAnnotations
 from .builder import DATASETS
 from .custom import CustomDataset
 
@@ -58,6 +58,15 @@ def get_polygon(segm, bbox, return_rect):
 
 @DATASETS.register_module()
 class CocoDataset(CustomDataset):
+    """COCO dataset.
+
+    Args:
+        min_size (int, optional): Boxes with a smaller side are skipped.
+        ann_store (dict, optional): If set, the annotations are read from a
+            memory mapped :class:`CocoAnnotationStore` built with these
+            arguments, e.g. ``dict(cache_dir='/data/ann_store')``, and the
+            ``pycocotools.COCO`` index is only built for evaluation.
+    """
 
     CLASSES = ('person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
                'train', 'truck', 'boat', 'traffic light', 'fire hydrant',
@@ -74,10 +83,34 @@ class CocoDataset(CustomDataset):
                'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock',
                'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush')
 
-    def __init__(self, min_size=None, *args, **kwargs):
+    ann_store = None
+    _coco = None
+    _lazy_coco = False
+    # raw annotations of every image, when loaded from the dataset cache
+    _cached_anns = None
+    _cached_attrs = ('cat_ids', 'cat2label', 'img_ids')
+
+    def __init__(self, min_size=None, *args, ann_store=None, **kwargs):
+        self.ann_store_cfg = ann_store
         super().__init__(*args, **kwargs)
         self.min_size = min_size
 
+    @property
+    def coco(self):
+        """pycocotools.COCO: Index of the annotation file, built on first
+        access when the annotations are read from the store or the dataset
+        is loaded from its cache, i.e. only for evaluation."""
+        if self._coco is None and self._lazy_coco:
+            self._coco = self._build_coco_api(self.ann_file)
+        return self._coco
+
+    @coco.setter
+    def coco(self, coco):
+        self._coco = coco
+
+    def _build_coco_api(self, ann_file):
+        return COCO(ann_file)
+
     def load_annotations(self, ann_file):
         """Load annotation from COCO style annotation file.
 
@@ -88,7 +121,9 @@ class CocoDataset(CustomDataset):
             list[dict]: Annotation info from COCO api.
         """
 
-        self.coco = COCO(ann_file)
+        if self.ann_store_cfg is not None:
+            return self._load_annotation_store(ann_file)
+        self.coco = self._build_coco_api(ann_file)
         self.cat_ids = self.coco.get_cat_ids(cat_names=self.CLASSES)
         self.cat2label = {cat_id: i for i, cat_id in enumerate(self.cat_ids)}
         self.img_ids = self.coco.get_img_ids()
@@ -99,6 +134,48 @@ class CocoDataset(CustomDataset):
             data_infos.append(info)
         return data_infos
 
+    def _load_annotation_store(self, ann_file):
+        self.ann_store = CocoAnnotationStore.load_or_build(
+            ann_file, **self.ann_store_cfg)
+        self._lazy_coco = True
+        self.cat_ids = self.ann_store.get_cat_ids(cat_names=self.CLASSES)
+        self.cat2label = {cat_id: i for i, cat_id in enumerate(self.cat_ids)}
+        self.img_ids = self.ann_store.img_ids.tolist()
+        data_infos = []
+        for info in self.ann_store.images:
+            info = dict(info)
+            info['filename'] = info['file_name']
+            data_infos.append(info)
+        return data_infos
+
+    def _get_cache_state(self, valid_inds):
+        state = super()._get_cache_state(valid_inds)
+        if self.ann_store is None:
+            # the raw annotations are cached too, so that the annotation file
+            # is not parsed again in every dataloader worker
+            state['anns'] = [self._get_ann_info(i) for i in range(len(self))]
+        return state
+
+    def _set_cache_state(self, state):
+        valid_inds = super()._set_cache_state(state)
+        self._lazy_coco = True
+        self._cached_anns = state.get('anns')
+        if self.ann_store_cfg is not None:
+            self.ann_store = CocoAnnotationStore.load_or_build(
+                self.ann_file, **self.ann_store_cfg)
+        return valid_inds
+
+    def _get_ann_info(self, idx):
+        """Get the raw annotations of an image, packed if read from the
+        store."""
+        if self._cached_anns is not None:
+            return self._cached_anns[idx]
+        img_id = self.data_infos[idx]['id']
+        if self.ann_store is not None:
+            return self.ann_store[self.ann_store.index(img_id)]
+        ann_ids = self.coco.get_ann_ids(img_ids=[img_id])
+        return self.coco.load_anns(ann_ids)
+
     def get_ann_info(self, idx):
         """Get COCO annotation by index.
 
@@ -109,9 +186,7 @@ class CocoDataset(CustomDataset):
             dict: Annotation info of specified index.
         """
 
-        img_id = self.data_infos[idx]['id']
-        ann_ids = self.coco.get_ann_ids(img_ids=[img_id])
-        ann_info = self.coco.load_anns(ann_ids)
+        ann_info = self._get_ann_info(idx)
         return self._parse_ann_info(self.data_infos[idx], ann_info)
 
     def get_cat_ids(self, idx):
@@ -124,23 +199,29 @@ class CocoDataset(CustomDataset):
             list[int]: All categories in the image of specified index.
         """
 
-        img_id = self.data_infos[idx]['id']
-        ann_ids = self.coco.get_ann_ids(img_ids=[img_id])
-        ann_info = self.coco.load_anns(ann_ids)
+        ann_info = self._get_ann_info(idx)
+        if isinstance(ann_info, PackedAnnotations):
+            return ann_info.category_ids.tolist()
         return [ann['category_id'] for ann in ann_info]
 
     def _filter_imgs(self, min_size=32):
         """Filter images too small or without ground truths."""
         valid_inds = []
-        # obtain images that contain annotation
-        ids_with_ann = set(_['image_id'] for _ in self.coco.anns.values())
-        # obtain images that contain annotations of the required categories
-        ids_in_cat = set()
-        for i, class_id in enumerate(self.cat_ids):
-            ids_in_cat |= set(self.coco.cat_img_map[class_id])
-        # merge the image id sets of the two conditions and use the merged set
-        # to filter out images if self.filter_empty_gt=True
-        ids_in_cat &= ids_with_ann
+        if self.ann_store is not None:
+            # images with annotations of the required categories
+            in_cat = self.ann_store.has_categories(self.cat_ids)
+            ids_in_cat = set(self.ann_store.img_ids[in_cat].tolist())
+        else:
+            # obtain images that contain annotation
+            ids_with_ann = set(_['image_id'] for _ in self.coco.anns.values())
+            # obtain images that contain annotations of the required
+            # categories
+            ids_in_cat = set()
+            for i, class_id in enumerate(self.cat_ids):
+                ids_in_cat |= set(self.coco.cat_img_map[class_id])
+            # merge the image id sets of the two conditions and use the merged
+            # set to filter out images if self.filter_empty_gt=True
+            ids_in_cat &= ids_with_ann
 
         valid_img_ids = []
         for i, img_info in enumerate(self.data_infos):
@@ -165,6 +246,8 @@ class CocoDataset(CustomDataset):
                 labels, masks, seg_map. "masks" are raw annotations and not \
                 decoded into binary masks.
         """
+        if isinstance(ann_info, PackedAnnotations):
+            return self._parse_packed_ann_info(img_info, ann_info)
         gt_bboxes = []
         gt_labels = []
         gt_bboxes_ignore = []
@@ -215,6 +298,38 @@ class CocoDataset(CustomDataset):
 
         return ann
 
+    def _parse_packed_ann_info(self, img_info, ann_info):
+        """Parse the annotations of an image read from the store, with the
+        same filtering as :meth:`_parse_ann_info` done on the columns."""
+        x1, y1, w, h = ann_info.bboxes.T
+        inter_w = np.maximum(
+            0,
+            np.minimum(x1 + w, img_info['width']) - np.maximum(x1, 0))
+        inter_h = np.maximum(
+            0,
+            np.minimum(y1 + h, img_info['height']) - np.maximum(y1, 0))
+        valid = ~ann_info.ignore & (inter_w * inter_h != 0) & \
+            (ann_info.areas > 0) & (w >= 1) & (h >= 1) & \
+            np.isin(ann_info.category_ids, self.cat_ids)
+        if self.min_size is not None:
+            valid &= (w >= self.min_size) & (h >= self.min_size)
+        bboxes = np.stack([x1, y1, x1 + w, y1 + h], axis=1).astype(np.float32)
+        keep = valid & ~ann_info.iscrowd
+        gt_labels = np.array(
+            [self.cat2label[c] for c in ann_info.category_ids[keep].tolist()],
+            dtype=np.int64)
+        gt_masks_ann = [
+            ann_info.segmentation(i) for i in np.nonzero(keep)[0].tolist()
+        ]
+        seg_map = img_info['filename'].replace('jpg', 'png')
+
+        return dict(
+            bboxes=bboxes[keep].reshape(-1, 4),
+            labels=gt_labels,
+            bboxes_ignore=bboxes[valid & ann_info.iscrowd].reshape(-1, 4),
+            masks=gt_masks_ann,
+            seg_map=seg_map)
+
     def xyxy2xywh(self, bbox):
         """Convert ``xyxy`` style bounding boxes to ``xywh`` style for COCO
         evaluation.
@@ -305,6 +420,47 @@ class CocoDataset(CustomDataset):
                     segm_json_results.append(data)
         return bbox_json_results, segm_json_results
 
+    def results2dts(self, results):
+        """Convert the detection results to COCO style detections in memory.
+
+        Args:
+            results (list[list | tuple | ndarray]): Testing results of the
+                dataset.
+
+        Returns:
+            dict[str: list[dict]]: Possible keys are "bbox", "segm",
+                "proposal", and values are lists of COCO style detections
+                that can be passed to ``COCO.loadRes`` directly. For bbox and
+                mask predictions "proposal" shares the list of "bbox".
+        """
+        result_dts = dict()
+        if isinstance(results[0], list):
+            result_dts['bbox'] = self._det2json(results)
+            result_dts['proposal'] = result_dts['bbox']
+        elif isinstance(results[0], tuple):
+            result_dts['bbox'], result_dts['segm'] = self._segm2json(results)
+            result_dts['proposal'] = result_dts['bbox']
+        elif isinstance(results[0], np.ndarray):
+            result_dts['proposal'] = self._proposal2json(results)
+        else:
+            raise TypeError('invalid type of results')
+        return result_dts
+
+    def _dump_dts(self, result_dts, outfile_prefix):
+        """Dump the output of :meth:`results2dts` to json files."""
+        result_files = dict()
+        if 'bbox' in result_dts:
+            result_files['bbox'] = f'{outfile_prefix}.bbox.json'
+            result_files['proposal'] = f'{outfile_prefix}.bbox.json'
+            mmcv.dump(result_dts['bbox'], result_files['bbox'])
+        else:
+            result_files['proposal'] = f'{outfile_prefix}.proposal.json'
+            mmcv.dump(result_dts['proposal'], result_files['proposal'])
+        if 'segm' in result_dts:
+            result_files['segm'] = f'{outfile_prefix}.segm.json'
+            mmcv.dump(result_dts['segm'], result_files['segm'])
+        return result_files
+
     def results2json(self, results, outfile_prefix):
         """Dump the detection results to a COCO style json file.
 
@@ -324,26 +480,7 @@ class CocoDataset(CustomDataset):
             dict[str: str]: Possible keys are "bbox", "segm", "proposal", and \
                 values are corresponding filenames.
         """
-        result_files = dict()
-        if isinstance(results[0], list):
-            json_results = self._det2json(results)
-            result_files['bbox'] = f'{outfile_prefix}.bbox.json'
-            result_files['proposal'] = f'{outfile_prefix}.bbox.json'
-            mmcv.dump(json_results, result_files['bbox'])
-        elif isinstance(results[0], tuple):
-            json_results = self._segm2json(results)
-            result_files['bbox'] = f'{outfile_prefix}.bbox.json'
-            result_files['proposal'] = f'{outfile_prefix}.bbox.json'
-            result_files['segm'] = f'{outfile_prefix}.segm.json'
-            mmcv.dump(json_results[0], result_files['bbox'])
-            mmcv.dump(json_results[1], result_files['segm'])
-        elif isinstance(results[0], np.ndarray):
-            json_results = self._proposal2json(results)
-            result_files['proposal'] = f'{outfile_prefix}.proposal.json'
-            mmcv.dump(json_results, result_files['proposal'])
-        else:
-            raise TypeError('invalid type of results')
-        return result_files
+        return self._dump_dts(self.results2dts(results), outfile_prefix)
 
     def fast_eval_recall(self, results, proposal_nums, iou_thrs, logger=None):
         gt_bboxes = []
@@ -384,7 +521,7 @@ class CocoDataset(CustomDataset):
                 the json filepaths, tmp_dir is the temporal directory created \
                 for saving json files when jsonfile_prefix is not specified.
         """
-        assert isinstance(results, list), 'results must be a list'
+        assert isinstance(results, Sequence), 'results must be a sequence'
         assert len(results) == len(self), (
             'The length of results is not equal to the dataset len: {} != {}'.
             format(len(results), len(self)))
@@ -406,9 +543,15 @@ class CocoDataset(CustomDataset):
                  proposal_nums=(100, 300, 1000),
                  iou_thrs=None,
                  score_thr=-1,
-                 metric_items=None):
+                 metric_items=None,
+                 nproc=1):
         """Evaluation in COCO protocol.
 
+        Detections are built in memory from the result arrays and evaluated
+        against ``self.coco`` directly, which is shared by all the metrics
+        and never modified. Json files are only written if
+        ``jsonfile_prefix`` is given.
+
         Args:
             results (list[list | tuple]): Testing results of the dataset.
             metric (str | list[str]): Metrics to be evaluated. Options are
@@ -435,6 +578,8 @@ class CocoDataset(CustomDataset):
                 used when ``metric=='proposal'``, ``['mAP', 'mAP_50', 'mAP_75',
                 'mAP_s', 'mAP_m', 'mAP_l']`` will be used when
                 ``metric=='bbox' or metric=='segm'``.
+            nproc (int): Processes used for the per-image matching of
+                COCOeval and of the text detection metrics. Default: 1.
 
         Returns:
             dict[str, float]: COCO style evaluation metric.
@@ -469,11 +614,16 @@ class CocoDataset(CustomDataset):
             if not isinstance(metric_items, list):
                 metric_items = [metric_items]
 
-        result_files, tmp_dir = self.format_results(results, jsonfile_prefix)
+        assert isinstance(results, Sequence), 'results must be a sequence'
+        assert len(results) == len(self), (
+            'The length of results is not equal to the dataset len: {} != {}'.
+            format(len(results), len(self)))
+        result_dts = self.results2dts(results)
+        if jsonfile_prefix is not None:
+            self._dump_dts(result_dts, jsonfile_prefix)
 
         cocoGt = self.coco
         for metric in metrics:
-            cocoGt = copy.deepcopy(self.coco)
             msg = f'Evaluating {metric}...'
             if logger is None:
                 msg = '\n' + msg
@@ -491,10 +641,10 @@ class CocoDataset(CustomDataset):
                 continue
 
             metric_type = 'bbox' if metric == 'f1' else metric
-            if metric_type not in result_files:
+            if metric_type not in result_dts:
                 raise KeyError(f'{metric_type} is not in results')
             try:
-                cocoDt = cocoGt.loadRes(result_files[metric_type])
+                cocoDt = cocoGt.loadRes(result_dts[metric_type])
             except IndexError:
                 print_log(
                     'The testing results of the whole dataset is empty.',
@@ -503,7 +653,8 @@ class CocoDataset(CustomDataset):
                 break
 
             iou_type = 'bbox' if metric in {'proposal', 'f1'} else metric
-            cocoEval = COCOeval(cocoGt, cocoDt, iou_type)
+            cocoEval = ParallelCOCOeval(
+                cocoGt, cocoDt, iou_type, nproc=nproc, logger=logger)
             cocoEval.params.catIds = self.cat_ids
             cocoEval.params.imgIds = self.img_ids
             cocoEval.params.maxDets = list(proposal_nums)
@@ -570,7 +721,8 @@ class CocoDataset(CustomDataset):
                     recall, precision, hmean, _ = text_eval(
                         predictions, gt_annotations, score_thr,
                         show_recall_graph=False,
-                        use_transcriptions=False)
+                        use_transcriptions=False,
+                        nproc=nproc)
                     print('Text detection recall={:.4f} precision={:.4f} hmean={:.4f}'.
                           format(recall, precision, hmean))
                     eval_results[metric + '/hmean'] = float(f'{hmean:.3f}')
@@ -631,8 +783,6 @@ class CocoDataset(CustomDataset):
                 eval_results[f'{metric}_mAP_copypaste'] = (
                     f'{ap[0]:.3f} {ap[1]:.3f} {ap[2]:.3f} {ap[3]:.3f} '
                     f'{ap[4]:.3f} {ap[5]:.3f}')
-        if tmp_dir is not None:
-            tmp_dir.cleanup()
         return eval_results
 
 
@@ -2,16 +2,16 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 import collections
-import copy
 import editdistance
 import logging
+import math
 import numpy as np
 import os
 import string
 import subprocess  # nosec
 import tempfile
+from multiprocessing import Pool
 from mmcv.utils import print_log
-from pycocotools.cocoeval import COCOeval
 from tqdm import tqdm
 
 from mmdet.core import text_eval
@@ -21,19 +21,107 @@ from .coco import CocoDataset, ConcatenatedCocoDataset, get_polygon
 from .weighted_editdistance import weighted_edit_distance
 
 
+class LexiconIndex:
+    """BK-tree over the upper-cased words of a lexicon for nearest word
+    queries by edit distance.
+
+    A query only computes the distances to the nodes that may hold words
+    within ``margin`` of the nearest one, instead of to every word. Results
+    of repeated queries are kept in an LRU cache.
+
+    Args:
+        words (list[str]): Words of the lexicon.
+        cache_size (int): Number of queries to cache. Default: 65536.
+    """
+
+    def __init__(self, words, cache_size=2**16):
+        self.words = list(words)
+        self.upper_words = [word.upper() for word in self.words]
+        self.root = None
+        for index, word in enumerate(self.upper_words):
+            self._insert(word, index)
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, index):
+        return self.words[index]
+
+    def _insert(self, word, index):
+        # a node is (word, indices of the word in the lexicon, children by distance)
+        if self.root is None:
+            self.root = (word, [index], {})
+            return
+        node = self.root
+        while True:
+            distance = editdistance.eval(word, node[0])
+            if distance == 0:
+                node[1].append(index)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (word, [index], {})
+                return
+            node = child
+
+    def search(self, sequence, margin=2):
+        """Find the words closest to an upper-cased sequence.
+
+        Returns:
+            tuple[int, list[tuple[int]]]: The smallest edit distance and the
+                (index, distance) of all the words within ``margin`` of it,
+                in the order of the lexicon.
+        """
+        key = (sequence, margin)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        best = math.inf
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            word, indices, children = stack.pop()
+            distance = editdistance.eval(sequence, word)
+            if distance <= best + margin:
+                found.append((distance, indices))
+                best = min(best, distance)
+            radius = best + margin
+            # words of a child are at this edge distance from the node word
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        candidates = sorted((index, distance) for distance, indices in found
+                            if distance <= best + margin for index in indices)
+
+        result = best, candidates
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+
 def find_in_lexicon(sequence, lexicon, lexicon_mapping, char_distrib):
     sequence = sequence.upper()
-    distances = [editdistance.eval(sequence, word.upper()) for word in lexicon]
-    argmin = np.argmin(distances)
-    distance = distances[argmin]
+    margin = 2 if char_distrib is not None else 0
+    if isinstance(lexicon, LexiconIndex):
+        distance, candidates = lexicon.search(sequence, margin=margin)
+    else:
+        # building an index for a single query costs more than a linear scan
+        distances = [editdistance.eval(sequence, word.upper()) for word in lexicon]
+        distance = min(distances)
+        candidates = [(i, d) for i, d in enumerate(distances) if d <= distance + margin]
     if char_distrib is not None:
-        small_lexicon = [word for i, word in enumerate(lexicon) if distances[i] <= distance + 2]
+        small_lexicon = [lexicon[i] for i, _ in candidates]
         distances = [weighted_edit_distance(sequence, word.upper(), char_distrib) for word in small_lexicon]
         argmin = np.argmin(distances)
         distance = distances[argmin]
         word = small_lexicon[argmin]
     else:
-        word = lexicon[argmin]
+        # the first word of the lexicon at the smallest distance
+        word = lexicon[next(i for i, d in candidates if d == distance)]
     if lexicon_mapping:
         word = lexicon_mapping[word]
     return word, distance
@@ -59,10 +147,17 @@ class CocoWithTextDataset(CocoDataset):
         self.lexicon_path = None
         self.lexicon_mapping_path = None
 
+    def _dataset_cache_params(self):
+        return dict(max_texts_num=self.max_texts_num)
+
     def _filter_imgs(self, min_size=32):
         """Filter images too small or without ground truths."""
         valid_inds = []
-        ids_with_ann = collections.Counter(_['image_id'] for _ in self.coco.anns.values())
+        if self.ann_store is not None:
+            ids_with_ann = dict(zip(self.ann_store.img_ids.tolist(), self.ann_store.num_anns().tolist()))
+            ids_with_ann = {k: v for k, v in ids_with_ann.items() if v > 0}
+        else:
+            ids_with_ann = collections.Counter(_['image_id'] for _ in self.coco.anns.values())
         if self.max_texts_num > 0:
             ids_with_ann = {k for k, v in ids_with_ann.items() if v <= self.max_texts_num}
         for i, img_info in enumerate(self.data_infos):
@@ -221,9 +316,9 @@ class CocoWithTextDataset(CocoDataset):
     def _read_lexicon(self, path):
         if not path:
             return []
-        if self.lexicon_path is None or self.lexicon != path:
+        if self.lexicon_path is None or self.lexicon_path != path:
             with open(path) as read_file:
-                self.lexicon = [line.strip() for line in read_file]
+                self.lexicon = LexiconIndex([line.strip() for line in read_file])
             self.lexicon_path = path
         return self.lexicon
 
@@ -245,8 +340,21 @@ class CocoWithTextDataset(CocoDataset):
                  classwise=False,
                  proposal_nums=(100, 300, 1000),
                  iou_thrs=np.arange(0.5, 0.96, 0.05),
-                 score_thr=-1):
-
+                 score_thr=-1,
+                 nproc=1):
+        # one pool is shared by the text metrics of every threshold
+        pool = Pool(nproc) if nproc > 1 else None
+        try:
+            return self._evaluate(results, metric, logger, jsonfile_prefix,
+                                  classwise, proposal_nums, iou_thrs,
+                                  score_thr, nproc, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _evaluate(self, results, metric, logger, jsonfile_prefix, classwise,
+                  proposal_nums, iou_thrs, score_thr, nproc, pool):
         metrics = list(metric) if isinstance(metric, list) else [metric]
 
         computed_metrics = ['word_spotting', 'e2e_recognition']
@@ -262,12 +370,13 @@ class CocoWithTextDataset(CocoDataset):
             if metric.split('@')[0] not in computed_metrics:
                 raise RuntimeError(f'Unknonwn metric: {metric}')
 
-        eval_results = super().evaluate(results, metrics, logger, jsonfile_prefix, classwise, proposal_nums, iou_thrs, score_thr)
+        eval_results = super().evaluate(results, metrics, logger, jsonfile_prefix, classwise, proposal_nums, iou_thrs, score_thr,
+                                        nproc=nproc)
 
-        result_files, tmp_dir = self.format_results(results, jsonfile_prefix)
+        result_dts = self.results2dts(results)
 
+        cocoGt = self.coco
         for metric in removed_metrics:
-            cocoGt = copy.deepcopy(self.coco)
             msg = f'Evaluating {metric}...'
             if logger is None:
                 msg = '\n' + msg
@@ -276,22 +385,15 @@ class CocoWithTextDataset(CocoDataset):
             metric, metric_params = self._parse_metric(metric)
 
             metric_type = 'bbox'
-            if metric_type not in result_files:
+            if metric_type not in result_dts:
                 raise KeyError(f'{metric_type} is not in results')
-            try:
-                cocoDt = cocoGt.loadRes(result_files[metric_type])
-            except IndexError:
+            if not result_dts[metric_type]:
                 print_log(
                     'The testing results of the whole dataset is empty.',
                     logger=logger,
                     level=logging.ERROR)
                 break
 
-            iou_type = 'bbox'
-            cocoEval = COCOeval(cocoGt, cocoDt, iou_type)
-            cocoEval.params.catIds = self.cat_ids
-            cocoEval.params.imgIds = self.img_ids
-
             predictions = []
             for img_i, res in enumerate(tqdm(results)):
                 img_id = os.path.basename(cocoGt.imgs[img_i]['filename']).split('.')[0].split('_')[-1]
@@ -333,7 +435,7 @@ class CocoWithTextDataset(CocoDataset):
                             }
                         })
                 predictions.append(per_image_predictions)
-            gt_annotations = cocoEval.cocoGt.imgToAnns
+            gt_annotations = cocoGt.imgToAnns
             filtered_predictions = self._filter_predictions(
                 predictions, metric_params['det_thr'], metric_params['rec_thr']
             )
@@ -344,7 +446,9 @@ class CocoWithTextDataset(CocoDataset):
                     filtered_predictions, gt_annotations, score_thr,
                     show_recall_graph=False,
                     use_transcriptions=True,
-                    word_spotting=metric.startswith('word_spotting'))
+                    word_spotting=metric.startswith('word_spotting'),
+                    nproc=nproc,
+                    pool=pool)
 
                 print(f'Text detection recall={recall} precision={precision} hmean={hmean}')
                 eval_results[metric + '/hmean'] = float(f'{hmean:.3f}')
@@ -363,7 +467,9 @@ class CocoWithTextDataset(CocoDataset):
                             filtered_predictions, gt_annotations, score_thr,
                             show_recall_graph=False,
                             use_transcriptions=True,
-                            word_spotting=metric.startswith('word_spotting'))
+                            word_spotting=metric.startswith('word_spotting'),
+                            nproc=nproc,
+                            pool=pool)
 
                         if hmean >= best_hmean:
                             best_hmean = hmean
@@ -381,8 +487,6 @@ class CocoWithTextDataset(CocoDataset):
                 print(f'Text detection recall={best_recall} precision={best_precision} hmean={best_hmean} @ '
                       f'det_thr={best_det_thr} and rec_thr={best_rec_thr}')
 
-        if tmp_dir is not None:
-            tmp_dir.cleanup()
         return eval_results
 
 
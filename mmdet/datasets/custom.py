@@ -4,7 +4,11 @@
 # Copyright (C) 2020-2021 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 #
+import hashlib
+import mmap
+import os
 import os.path as osp
+import pickle
 import warnings
 from collections import OrderedDict
 from random import randrange
@@ -15,6 +19,7 @@ from mmcv.utils import print_log
 from torch.utils.data import Dataset
 
 from mmdet.core import eval_map, eval_recalls, eval_segm
+from .annotation_store import file_md5
 from .builder import DATASETS
 from .pipelines import Compose
 
@@ -55,10 +60,21 @@ class CustomDataset(Dataset):
             boxes of the dataset's classes will be filtered out. This option
             only works when `test_mode=False`, i.e., we never filter images
             during tests.
+        dataset_cache (dict, optional): If set, the loaded and filtered image
+            infos and the group flags are saved to ``cache_dir`` and loaded
+            from there by the next datasets built with the same annotation
+            file and filtering parameters. The file is identified by its
+            path, size and modification time, and also by its md5 if
+            ``hash_content=True``. Subclasses reading other files while
+            loading add them to the key. Default: None.
     """
 
     CLASSES = None
 
+    # attributes set by ``load_annotations`` or ``_filter_imgs`` that are
+    # saved in the dataset cache along with the image infos
+    _cached_attrs = ()
+
     def __init__(self,
                  ann_file,
                  pipeline,
@@ -68,7 +84,8 @@ class CustomDataset(Dataset):
                  seg_prefix=None,
                  proposal_file=None,
                  test_mode=False,
-                 filter_empty_gt=True):
+                 filter_empty_gt=True,
+                 dataset_cache=None):
         self.ann_file = ann_file
         self.data_root = data_root
         self.img_prefix = img_prefix
@@ -76,6 +93,7 @@ class CustomDataset(Dataset):
         self.proposal_file = proposal_file
         self.test_mode = test_mode
         self.filter_empty_gt = filter_empty_gt
+        self.dataset_cache = dataset_cache
         self.CLASSES = self.get_classes(classes)
 
         # join paths if data_root is specified
@@ -90,23 +108,36 @@ class CustomDataset(Dataset):
                     or osp.isabs(self.proposal_file)):
                 self.proposal_file = osp.join(self.data_root,
                                               self.proposal_file)
-        # load annotations (and proposals)
-        self.data_infos = self.load_annotations(self.ann_file)
-
+        cache_file = None
+        state = None
+        if self.dataset_cache is not None:
+            cache_file = self._get_dataset_cache_file(**self.dataset_cache)
+            state = self._load_dataset_cache(cache_file)
+
+        if state is not None:
+            valid_inds = self._set_cache_state(state)
+        else:
+            # load annotations
+            self.data_infos = self.load_annotations(self.ann_file)
+            valid_inds = None
+            # filter images too small and containing no annotations
+            if not test_mode:
+                valid_inds = self._filter_imgs()
+                self.data_infos = [self.data_infos[i] for i in valid_inds]
+                # set group flag for the sampler
+                self._set_group_flag()
+            if cache_file is not None:
+                self._save_dataset_cache(cache_file,
+                                         self._get_cache_state(valid_inds))
+
+        # load proposals
         if self.proposal_file is not None:
             self.proposals = self.load_proposals(self.proposal_file)
+            if valid_inds is not None:
+                self.proposals = [self.proposals[i] for i in valid_inds]
         else:
             self.proposals = None
 
-        # filter images too small and containing no annotations
-        if not test_mode:
-            valid_inds = self._filter_imgs()
-            self.data_infos = [self.data_infos[i] for i in valid_inds]
-            if self.proposals is not None:
-                self.proposals = [self.proposals[i] for i in valid_inds]
-            # set group flag for the sampler
-            self._set_group_flag()
-
         # processing pipeline
         self.pipeline = Compose(pipeline)
 
@@ -173,6 +204,74 @@ class CustomDataset(Dataset):
                 valid_inds.append(i)
         return valid_inds
 
+    def _dataset_cache_params(self):
+        """Parameters of the subclasses that change the loaded and filtered
+        image infos, used to key the dataset cache."""
+        return {}
+
+    def _get_dataset_cache_file(self, cache_dir, hash_content=False):
+        """Get the path of the dataset cache keyed on the annotation file
+        and the filtering parameters."""
+        stat = os.stat(self.ann_file)
+        key = dict(
+            type=type(self).__name__,
+            ann_file=osp.abspath(self.ann_file),
+            size=stat.st_size,
+            mtime=stat.st_mtime_ns,
+            classes=self.CLASSES,
+            img_prefix=self.img_prefix,
+            test_mode=self.test_mode,
+            filter_empty_gt=self.filter_empty_gt,
+            params=self._dataset_cache_params())
+        if hash_content:
+            key['md5'] = file_md5(self.ann_file)
+        digest = hashlib.md5(repr(sorted(key.items())).encode()).hexdigest()
+        name = osp.splitext(osp.basename(self.ann_file))[0]
+        return osp.join(
+            osp.expanduser(cache_dir), f'{name}.{digest}.dataset.pkl')
+
+    @staticmethod
+    def _load_dataset_cache(cache_file):
+        """Load the dataset cache with a single read of the mapped file, or
+        return None if there is none."""
+        try:
+            with open(cache_file, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return pickle.loads(m)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+
+    @staticmethod
+    def _save_dataset_cache(cache_file, state):
+        mmcv.mkdir_or_exist(osp.dirname(cache_file))
+        # written aside and renamed, as several processes may build it
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+
+    def _get_cache_state(self, valid_inds):
+        """Get what is saved in the dataset cache."""
+        return dict(
+            data_infos=self.data_infos,
+            valid_inds=valid_inds,
+            flag=getattr(self, 'flag', None),
+            attrs={name: getattr(self, name)
+                   for name in self._cached_attrs})
+
+    def _set_cache_state(self, state):
+        """Restore the dataset from its cache.
+
+        Returns:
+            list[int] | None: Indices of the images kept by the filtering.
+        """
+        self.data_infos = state['data_infos']
+        if state['flag'] is not None:
+            self.flag = state['flag']
+        for name, value in state['attrs'].items():
+            setattr(self, name, value)
+        return state['valid_inds']
+
     def _set_group_flag(self):
         """Set flag according to image aspect ratio.
 
@@ -15,6 +15,7 @@ import numpy as np
 from mmcv.utils import build_from_cfg, print_log
 from torch.utils.data.dataset import ConcatDataset as _ConcatDataset
 
+from mmdet.utils.profiling import get_nbytes, trace_memory
 from .builder import DATASETS, PIPELINES
 from .coco import CocoDataset
 
@@ -310,13 +311,24 @@ class MultiImageMixDataset(object):
             dynamically. Default to None.
         skip_type_keys (list[str], optional): Sequence of type string to
             be skip pipeline. Default to None.
+        copy_samples (bool): Whether to deep copy the samples of the dataset.
+            Samples are built by the dataset pipeline on every access and the
+            mixing transforms do not modify their inputs, so only shallow
+            copies are made by default. Enable it for datasets returning
+            samples shared between accesses to a pipeline modifying arrays in
+            place. Default: False.
+        track_allocs (bool): Whether to count, in :attr:`alloc_stats`, the
+            copies of samples and the memory allocated to build every sample.
+            Default: False.
     """
 
     def __init__(self,
                  dataset,
                  pipeline,
                  dynamic_scale=None,
-                 skip_type_keys=None):
+                 skip_type_keys=None,
+                 copy_samples=False,
+                 track_allocs=False):
         assert isinstance(pipeline, collections.abc.Sequence)
         if skip_type_keys is not None:
             assert all([
@@ -345,11 +357,43 @@ class MultiImageMixDataset(object):
             assert isinstance(dynamic_scale, tuple)
         self._dynamic_scale = dynamic_scale
 
+        self.copy_samples = copy_samples
+        self.track_allocs = track_allocs
+        self.alloc_stats = dict(
+            samples=0, copies=0, copied_bytes=0, peak_bytes=0)
+
     def __len__(self):
         return self.num_samples
 
+    def _get_sample(self, idx):
+        sample = self.dataset[idx]
+        if not self.copy_samples:
+            return dict(sample)
+        if self.track_allocs:
+            self.alloc_stats['copies'] += 1
+            self.alloc_stats['copied_bytes'] += get_nbytes(sample)
+        return copy.deepcopy(sample)
+
+    def get_alloc_stats(self):
+        """Get the copies and the peak memory allocated per sample, counted
+        in this process when ``track_allocs`` is set."""
+        num_samples = max(self.alloc_stats['samples'], 1)
+        return {
+            f'{key}_per_sample': value / num_samples
+            for key, value in self.alloc_stats.items() if key != 'samples'
+        }
+
     def __getitem__(self, idx):
-        results = copy.deepcopy(self.dataset[idx])
+        if not self.track_allocs:
+            return self._mix(idx)
+        with trace_memory() as stats:
+            results = self._mix(idx)
+        self.alloc_stats['samples'] += 1
+        self.alloc_stats['peak_bytes'] += stats['peak_bytes']
+        return results
+
+    def _mix(self, idx):
+        results = self._get_sample(idx)
         for (transform, transform_type) in zip(self.pipeline,
                                                self.pipeline_types):
             if self._skip_type_keys is not None and \
@@ -360,9 +404,7 @@ class MultiImageMixDataset(object):
                 indexes = transform.get_indexes(self.dataset)
                 if not isinstance(indexes, collections.abc.Sequence):
                     indexes = [indexes]
-                mix_results = [
-                    copy.deepcopy(self.dataset[index]) for index in indexes
-                ]
+                mix_results = [self._get_sample(index) for index in indexes]
                 results['mix_results'] = mix_results
 
             if self._dynamic_scale is not None:
@@ -10,6 +10,7 @@ import logging
 import os.path as osp
 import tempfile
 from collections import OrderedDict
+from collections.abc import Sequence
 
 import numpy as np
 from mmcv.utils import print_log
@@ -272,16 +273,7 @@ class LVISV05Dataset(CocoDataset):
         'wrench', 'wristband', 'wristlet', 'yacht', 'yak', 'yogurt',
         'yoke_(animal_equipment)', 'zebra', 'zucchini')
 
-    def load_annotations(self, ann_file):
-        """Load annotation from lvis style annotation file.
-
-        Args:
-            ann_file (str): Path of annotation file.
-
-        Returns:
-            list[dict]: Annotation info from LVIS api.
-        """
-
+    def _build_coco_api(self, ann_file):
         try:
             import lvis
             assert lvis.__version__ >= '10.5.3'
@@ -295,7 +287,19 @@ class LVISV05Dataset(CocoDataset):
             raise ImportError('Package lvis is not installed. Please run pip '
                               'install mmlvis to install open-mmlab forked '
                               'lvis.')
-        self.coco = LVIS(ann_file)
+        return LVIS(ann_file)
+
+    def load_annotations(self, ann_file):
+        """Load annotation from lvis style annotation file.
+
+        Args:
+            ann_file (str): Path of annotation file.
+
+        Returns:
+            list[dict]: Annotation info from LVIS api.
+        """
+
+        self.coco = self._build_coco_api(ann_file)
         self.cat_ids = self.coco.get_cat_ids()
         self.cat2label = {cat_id: i for i, cat_id in enumerate(self.cat_ids)}
         self.img_ids = self.coco.get_img_ids()
@@ -355,7 +359,7 @@ class LVISV05Dataset(CocoDataset):
             raise ImportError('Package lvis is not installed. Please run pip '
                               'install mmlvis to install open-mmlab forked '
                               'lvis.')
-        assert isinstance(results, list), 'results must be a list'
+        assert isinstance(results, Sequence), 'results must be a sequence'
         assert len(results) == len(self), (
             'The length of results is not equal to the dataset len: {} != {}'.
             format(len(results), len(self)))
@@ -720,20 +724,7 @@ class LVISV1Dataset(LVISDataset):
         'yoke_(animal_equipment)', 'zebra', 'zucchini')
 
     def load_annotations(self, ann_file):
-        try:
-            import lvis
-            assert lvis.__version__ >= '10.5.3'
-            from lvis import LVIS
-        except AssertionError:
-            raise AssertionError('Incompatible version of lvis is installed. '
-                                 'Run pip uninstall lvis first. Then run pip '
-                                 'install mmlvis to install open-mmlab forked '
-                                 'lvis. ')
-        except ImportError:
-            raise ImportError('Package lvis is not installed. Please run pip '
-                              'install mmlvis to install open-mmlab forked '
-                              'lvis.')
-        self.coco = LVIS(ann_file)
+        self.coco = self._build_coco_api(ann_file)
         self.cat_ids = self.coco.get_cat_ids()
         self.cat2label = {cat_id: i for i, cat_id in enumerate(self.cat_ids)}
         self.img_ids = self.coco.get_img_ids()
@@ -7,6 +7,11 @@
 from .auto_augment import (AutoAugment, BrightnessTransform, ColorTransform,
                            ContrastTransform, EqualizeTransform, Rotate, Shear,
                            Translate)
+from .batch_transforms import (BatchAugment, BatchBrightnessTransform,
+                               BatchColorTransform, BatchContrastTransform,
+                               BatchExpand, BatchMinIoURandomCrop,
+                               BatchPhotoMetricDistortion, BatchRandomFlip,
+                               BatchResize)
 from .compose import Compose
 from .copy_paste_aug import CopyPaste
 from .formating import (Collect, DefaultFormatBundle, ImageToTensor,
@@ -14,11 +19,13 @@ from .formating import (Collect, DefaultFormatBundle, ImageToTensor,
 from .instaboost import InstaBoost
 from .loading import (LoadAnnotations, LoadImageFromFile, LoadImageFromWebcam,
                       LoadMultiChannelImageFromFiles, LoadProposals)
+from .profiler import (PipelineProfiler, enable_pipeline_profiling,
+                       format_pipeline_summary, get_pipeline_profiler)
 from .test_time_aug import MultiScaleFlipAug
 from .transforms import (Albu, CutOut, Expand, MinIoURandomCrop, MixUp, Mosaic,
                          Normalize, Pad, PhotoMetricDistortion, RandomAffine,
                          RandomCenterCropPad, RandomCrop, RandomFlip,
-                         Resize, SegRescale)
+                         Resize, ResizeNormalizePad, SegRescale)
 
 __all__ = [
     'Compose', 'to_tensor', 'ToTensor', 'ImageToTensor', 'ToDataContainer',
@@ -30,5 +37,10 @@ __all__ = [
     'InstaBoost', 'RandomCenterCropPad', 'AutoAugment', 'CutOut', 'Shear',
     'Rotate', 'ColorTransform', 'EqualizeTransform', 'BrightnessTransform',
     'ContrastTransform', 'Translate', 'CopyPaste', 'RandomAffine', 'Mosaic',
-    'MixUp'
+    'MixUp', 'ResizeNormalizePad', 'PipelineProfiler',
+    'enable_pipeline_profiling', 'get_pipeline_profiler',
+    'format_pipeline_summary', 'BatchAugment', 'BatchPhotoMetricDistortion',
+    'BatchRandomFlip', 'BatchExpand', 'BatchMinIoURandomCrop', 'BatchResize',
+    'BatchBrightnessTransform', 'BatchContrastTransform',
+    'BatchColorTransform'
 ]
@@ -0,0 +1,540 @@
+import collections
+
+import mmcv
+import numpy as np
+import torch
+import torch.nn.functional as F
+from mmcv.utils import build_from_cfg
+
+from ..builder import PIPELINES
+from .auto_augment import (BrightnessTransform, ColorTransform,
+                           ContrastTransform)
+from .transforms import (Expand, MinIoURandomCrop, PhotoMetricDistortion,
+                         RandomFlip)
+
+# coefficients of the gray level of BGR pixels, like ``cv2.COLOR_BGR2GRAY``
+_BGR2GRAY = (0.114, 0.587, 0.299)
+# sources of the BGR channels for every hue sector, like ``cv2.COLOR_HSV2BGR``
+_HSV_SECTORS = ((1, 3, 0), (1, 0, 2), (3, 0, 1), (0, 2, 1), (0, 1, 3),
+                (2, 1, 0))
+_BBOX_KEYS = ('gt_bboxes', 'gt_bboxes_ignore')
+# (horizontal, vertical) axes flipped by every flip direction
+_FLIP_AXES = dict(
+    horizontal=(True, False), vertical=(False, True), diagonal=(True, True))
+
+
+def bgr2hsv(img):
+    """Convert a batch of float BGR images of shape (N, 3, H, W) to HSV, with
+    the hue in degrees like ``mmcv.bgr2hsv`` for float images."""
+    eps = torch.finfo(torch.float32).eps
+    b, g, r = img.unbind(1)
+    v = img.max(1)[0]
+    diff = v - img.min(1)[0]
+    s = diff / (v.abs() + eps)
+    diff = 60. / (diff + eps)
+    h = torch.where(
+        v == r, (g - b) * diff,
+        torch.where(v == g, (b - r) * diff + 120., (r - g) * diff + 240.))
+    h = torch.where(h < 0, h + 360., h)
+    return torch.stack([h, s, v], 1)
+
+
+def hsv2bgr(img):
+    """Convert a batch of HSV images of shape (N, 3, H, W), with the hue in
+    degrees, to float BGR like ``mmcv.hsv2bgr`` for float images."""
+    h, s, v = img.unbind(1)
+    h = h / 60.
+    h = h - 6 * torch.floor(h / 6)
+    sector = torch.floor(h)
+    h = h - sector
+    invalid = sector >= 6
+    sector = sector.long().masked_fill(invalid, 0)
+    h = h.masked_fill(invalid, 0)
+    tab = torch.stack(
+        [v, v * (1 - s), v * (1 - s * h), v * (1 - s * (1 - h))], 1)
+    sectors = img.new_tensor(_HSV_SECTORS, dtype=torch.long)
+    bgr = tab.gather(1, sectors[sector].permute(0, 3, 1, 2))
+    return torch.where((s == 0).unsqueeze(1), v.unsqueeze(1), bgr)
+
+
+def _valid_mask(results):
+    """Get the mask of shape (N, 1, H, W) of the pixels of the images."""
+    img = results['img']
+    n, _, h, w = img.shape
+    shapes = img.new_tensor([meta['img_shape'][:2]
+                             for meta in results['img_metas']],
+                            dtype=torch.long)
+    rows = torch.arange(h, device=img.device)
+    cols = torch.arange(w, device=img.device)
+    mask = (rows[None, :, None] < shapes[:, 0, None, None]) & \
+        (cols[None, None, :] < shapes[:, 1, None, None])
+    return mask.unsqueeze(1)
+
+
+def _crop_masks(results, i):
+    """Crop the padding of the instance masks of the i-th image."""
+    h, w = results['img_metas'][i]['img_shape'][:2]
+    for key in ('gt_masks', 'gt_masks_ignore'):
+        if results.get(key) is not None:
+            masks = results[key][i]
+            if (masks.height, masks.width) != (h, w):
+                results[key][i] = masks.crop(np.array([0, 0, w, h]))
+
+
+def _map_masks(results, i, func):
+    """Apply a function to the instance masks of the i-th image."""
+    _crop_masks(results, i)
+    for key in ('gt_masks', 'gt_masks_ignore'):
+        if results.get(key) is not None:
+            results[key][i] = func(results[key][i])
+
+
+def _compose_flip(meta, direction):
+    """Record in an image meta the flip composed of the one already done
+    by the data pipeline and a flip in ``direction``."""
+    done = meta.get('flip_direction') if meta.get('flip', False) else None
+    axes = tuple(
+        a != b for a, b in zip(
+            _FLIP_AXES.get(done, (False, False)), _FLIP_AXES[direction]))
+    composed = None
+    for name, name_axes in _FLIP_AXES.items():
+        if name_axes == axes:
+            composed = name
+    meta['flip'] = composed is not None
+    meta['flip_direction'] = composed
+
+
+def _paste_images(crops, fill):
+    """Paste image crops of shape (C, h, w) at the top left corner of a new
+    batch filled with a value per channel."""
+    h = max(crop.shape[1] for crop in crops)
+    w = max(crop.shape[2] for crop in crops)
+    img = fill.view(1, -1, 1, 1).repeat(len(crops), 1, h, w)
+    for i, crop in enumerate(crops):
+        img[i, :, :crop.shape[1], :crop.shape[2]] = crop
+    return img
+
+
+class BatchAugment(object):
+    """Augment a collated batch of images and annotations.
+
+    The transforms are applied to whole batches of torch tensors, on the
+    device of the batch, after the collation instead of one image at a time
+    in the dataloader workers, so that the cost of the augmentation scales
+    with the batch size rather than the number of workers. They sample their
+    random parameters per image like their counterparts of the data
+    pipeline.
+
+    The images are expected to be normalized and padded by the data
+    pipeline. They are denormalized to BGR pixels with the ``img_norm_cfg``
+    of their meta, if any, before the transforms and normalized back after
+    them. The padding is reset and the images are padded again to
+    ``size_divisor``. Semantic segmentation maps are not supported.
+
+    Args:
+        transforms (Sequence[dict | callable]): Batch transforms or their
+            configs.
+        size_divisor (int): The divisor of the padded size of the images.
+            Default: 32.
+
+    Example:
+        >>> import torch
+        >>> batch_augment = BatchAugment(
+        ...     [dict(type='BatchRandomFlip', flip_ratio=0.5)])
+        >>> data = dict(
+        ...     img=torch.rand(2, 3, 32, 32),
+        ...     img_metas=[dict(img_shape=(30, 32, 3)),
+        ...                dict(img_shape=(32, 20, 3))],
+        ...     gt_bboxes=[torch.tensor([[0., 0., 10., 10.]]),
+        ...                torch.zeros((0, 4))],
+        ...     gt_labels=[torch.tensor([1]), torch.zeros(0).long()])
+        >>> data = batch_augment(data)
+        >>> tuple(data['img'].shape)
+        (2, 3, 32, 32)
+    """
+
+    def __init__(self, transforms, size_divisor=32):
+        assert isinstance(transforms, collections.abc.Sequence)
+        self.transforms = []
+        for transform in transforms:
+            if isinstance(transform, dict):
+                transform = build_from_cfg(transform, PIPELINES)
+            elif not callable(transform):
+                raise TypeError('transform must be callable or a dict')
+            self.transforms.append(transform)
+        self.size_divisor = size_divisor
+
+    def _get_norm_cfg(self, results):
+        metas = results['img_metas']
+        if 'img_norm_cfg' not in metas[0]:
+            return None
+        img = results['img']
+        mean = img.new_tensor(
+            np.stack([meta['img_norm_cfg']['mean'] for meta in metas]))
+        std = img.new_tensor(
+            np.stack([meta['img_norm_cfg']['std'] for meta in metas]))
+        to_rgb = metas[0]['img_norm_cfg']['to_rgb']
+        assert all(meta['img_norm_cfg']['to_rgb'] == to_rgb
+                   for meta in metas), 'to_rgb differs in the batch'
+        return mean[:, :, None, None], std[:, :, None, None], to_rgb
+
+    @torch.no_grad()
+    def __call__(self, data):
+        """Augment a batch.
+
+        Args:
+            data (dict): Collated batch, with the ``img`` tensor of shape
+                (N, C, H, W), the ``img_metas`` and per image lists of
+                annotations, such as ``gt_bboxes`` and ``gt_masks``.
+
+        Returns:
+            dict: The augmented batch.
+        """
+        assert 'gt_semantic_seg' not in data, \
+            'BatchAugment does not support semantic segmentation maps'
+        results = dict(data)
+        # the per image annotations and metas are replaced, not the ones of
+        # the batch
+        for key, value in results.items():
+            if isinstance(value, (list, tuple)):
+                results[key] = list(value)
+        results['img_metas'] = [dict(meta) for meta in results['img_metas']]
+        norm_cfg = self._get_norm_cfg(results)
+        img = results['img']
+        if norm_cfg is not None:
+            mean, std, to_rgb = norm_cfg
+            img = img * std + mean
+            if to_rgb:
+                img = img.flip(1)
+        results['img'] = img
+
+        for t in self.transforms:
+            results = t(results)
+
+        img = results['img']
+        if norm_cfg is not None:
+            if to_rgb:
+                img = img.flip(1)
+            img = (img - mean) / std
+        d = self.size_divisor
+        pad_h = -img.shape[2] % d
+        pad_w = -img.shape[3] % d
+        if pad_h or pad_w:
+            img = F.pad(img, (0, pad_w, 0, pad_h))
+        results['img'] = img
+        # reset the padding like Pad
+        results['img'] = img.masked_fill(~_valid_mask(results), 0)
+
+        for i, meta in enumerate(results['img_metas']):
+            h, w, c = meta['img_shape']
+            meta['pad_shape'] = (-(-h // d) * d, -(-w // d) * d, c)
+            for key in ('gt_masks', 'gt_masks_ignore'):
+                if results.get(key) is not None:
+                    masks = results[key][i]
+                    if (masks.height, masks.width) != meta['pad_shape'][:2]:
+                        results[key][i] = masks.pad(meta['pad_shape'][:2], 0)
+        return results
+
+    def __repr__(self):
+        format_string = self.__class__.__name__ + '('
+        for t in self.transforms:
+            format_string += '\n'
+            format_string += f'    {t}'
+        format_string += f'\n    size_divisor={self.size_divisor}'
+        format_string += '\n)'
+        return format_string
+
+
+@PIPELINES.register_module()
+class BatchPhotoMetricDistortion(PhotoMetricDistortion):
+    """Batched :obj:`PhotoMetricDistortion` for :obj:`BatchAugment`.
+
+    The steps are applied to all the images with neutral parameters for the
+    ones they are skipped for.
+    """
+
+    def __call__(self, results):
+        img = results['img']
+        params = [self._get_params() for _ in range(len(img))]
+
+        def param(name, mode=None, neutral=0.):
+            values = [
+                neutral if p[name] is None or
+                (mode is not None and p['mode'] != mode) else p[name]
+                for p in params
+            ]
+            return img.new_tensor(values)[:, None, None]
+
+        img = img + param('brightness')[:, None]
+        img = img * param('contrast', mode=1, neutral=1.)[:, None]
+        h, s, v = bgr2hsv(img).unbind(1)
+        s = s * param('saturation', neutral=1.)
+        h = h + param('hue')
+        h = torch.where(h > 360, h - 360, h)
+        h = torch.where(h < 0, h + 360, h)
+        img = hsv2bgr(torch.stack([h, s, v], 1))
+        img = img * param('contrast', mode=0, neutral=1.)[:, None]
+        permutations = img.new_tensor(
+            np.stack([
+                np.arange(3) if p['permutation'] is None else p['permutation']
+                for p in params
+            ]),
+            dtype=torch.long)
+        img = img[torch.arange(len(img), device=img.device)[:, None],
+                  permutations]
+        results['img'] = img
+        return results
+
+
+@PIPELINES.register_module()
+class BatchRandomFlip(RandomFlip):
+    """Batched :obj:`RandomFlip` for :obj:`BatchAugment`.
+
+    The images are flipped within their unpadded size. The flags set by the
+    data pipeline do not change the direction of the flips, but ``flip``
+    and ``flip_direction`` record the flips composed with theirs.
+    """
+
+    def __call__(self, results):
+        img = results['img']
+        n, _, h, w = img.shape
+        directions = [self._random_direction() for _ in range(n)]
+        shapes = img.new_tensor(
+            [meta['img_shape'][:2] for meta in results['img_metas']],
+            dtype=torch.long)
+        for dim, size, names in ((2, h, ('vertical', 'diagonal')),
+                                 (3, w, ('horizontal', 'diagonal'))):
+            flipped = img.new_tensor([d in names for d in directions],
+                                     dtype=torch.bool)
+            if not flipped.any():
+                continue
+            # flip the first size pixels of every row or column in place
+            inds = torch.arange(size, device=img.device).repeat(n, 1)
+            sizes = shapes[:, dim - 2, None]
+            inds = torch.where(flipped[:, None] & (inds < sizes),
+                               sizes - 1 - inds, inds)
+            shape = [n, 1, 1, 1]
+            shape[dim] = size
+            img = img.gather(dim, inds.view(shape).expand_as(img))
+
+        for i, (meta, direction) in enumerate(
+                zip(results['img_metas'], directions)):
+            if direction is None:
+                continue
+            _compose_flip(meta, direction)
+            for key in _BBOX_KEYS:
+                if results.get(key) is not None:
+                    results[key][i] = self.bbox_flip(results[key][i],
+                                                     meta['img_shape'],
+                                                     direction)
+            _map_masks(results, i, lambda masks: masks.flip(direction))
+        results['img'] = img
+        return results
+
+    def bbox_flip(self, bboxes, img_shape, direction):
+        """Flip bboxes of a tensor, like :meth:`RandomFlip.bbox_flip`."""
+        flipped = bboxes.clone()
+        h, w = img_shape[:2]
+        if direction in ('horizontal', 'diagonal'):
+            flipped[..., 0::4] = w - bboxes[..., 2::4]
+            flipped[..., 2::4] = w - bboxes[..., 0::4]
+        if direction in ('vertical', 'diagonal'):
+            flipped[..., 1::4] = h - bboxes[..., 3::4]
+            flipped[..., 3::4] = h - bboxes[..., 1::4]
+        return flipped
+
+
+@PIPELINES.register_module()
+class BatchExpand(Expand):
+    """Batched :obj:`Expand` for :obj:`BatchAugment`.
+
+    The batch grows to the largest expanded image.
+    """
+
+    def __call__(self, results):
+        img = results['img']
+        crops = []
+        for i, meta in enumerate(results['img_metas']):
+            h, w, c = meta['img_shape']
+            crop = img[i, :, :h, :w]
+            params = self._get_params(h, w)
+            if params is None:
+                crops.append(crop)
+                continue
+            ratio, left, top = params
+            new_h, new_w = int(h * ratio), int(w * ratio)
+            expand_img = img.new_tensor(self.mean).view(-1, 1, 1).repeat(
+                1, new_h, new_w)
+            expand_img[:, top:top + h, left:left + w] = crop
+            crops.append(expand_img)
+            for key in _BBOX_KEYS:
+                if results.get(key) is not None:
+                    results[key][i] = results[key][i] + \
+                        results[key][i].new_tensor([left, top, left, top])
+            _map_masks(results, i,
+                       lambda masks: masks.expand(new_h, new_w, top, left))
+            meta['img_shape'] = (new_h, new_w, c)
+        results['img'] = _paste_images(crops, img.new_tensor(self.mean))
+        return results
+
+
+@PIPELINES.register_module()
+class BatchMinIoURandomCrop(MinIoURandomCrop):
+    """Batched :obj:`MinIoURandomCrop` for :obj:`BatchAugment`.
+
+    The patches are sampled on the CPU and the batch shrinks to the largest
+    cropped image.
+    """
+
+    def __call__(self, results):
+        img = results['img']
+        crops = []
+        for i, meta in enumerate(results['img_metas']):
+            h, w, c = meta['img_shape']
+            keys = [key for key in _BBOX_KEYS if results.get(key) is not None]
+            boxes = [results[key][i].cpu().numpy() for key in keys]
+            boxes = np.concatenate(boxes, 0)
+            patch = self._get_patch(boxes, h, w)
+            if patch is None:
+                crops.append(img[i, :, :h, :w])
+                continue
+
+            # only adjust boxes and instance masks when the gt is not empty
+            if len(boxes) == 0:
+                _map_masks(results, i, lambda masks: masks.crop(patch))
+            else:
+                _crop_masks(results, i)
+                for key in keys:
+                    boxes = results[key][i]
+                    mask = self._is_center_of_bboxes_in_patch(
+                        boxes.cpu().numpy(), patch)
+                    inds = torch.from_numpy(mask.nonzero()[0]).to(
+                        boxes.device)
+                    boxes = boxes[inds]
+                    patch_t = boxes.new_tensor(patch)
+                    if self.bbox_clip_border:
+                        boxes[:, 2:] = torch.min(boxes[:, 2:], patch_t[2:])
+                        boxes[:, :2] = torch.max(boxes[:, :2], patch_t[:2])
+                    results[key][i] = boxes - patch_t[:2].repeat(2)
+
+                    label_key = self.bbox2label.get(key)
+                    if results.get(label_key) is not None:
+                        results[label_key][i] = results[label_key][i][inds]
+
+                    mask_key = self.bbox2mask.get(key)
+                    if results.get(mask_key) is not None:
+                        results[mask_key][i] = results[mask_key][i][
+                            mask.nonzero()[0]].crop(patch)
+            crops.append(img[i, :, patch[1]:patch[3], patch[0]:patch[2]])
+            meta['img_shape'] = (patch[3] - patch[1], patch[2] - patch[0], c)
+        results['img'] = _paste_images(crops, img.new_zeros(img.shape[1]))
+        return results
+
+
+@PIPELINES.register_module()
+class BatchResize(object):
+    """Resize the images of a batch for :obj:`BatchAugment`, to follow the
+    geometric batch transforms.
+
+    Every image is resized bilinearly within its unpadded size, and its
+    ``scale_factor`` is updated.
+
+    Args:
+        img_scale (tuple[int]): Target scale (w, h) of the images.
+        keep_ratio (bool): Whether to keep the aspect ratio, rescaling the
+            images to fit in the scale like :obj:`Resize`. Default: False.
+        bbox_clip_border (bool): Whether to clip the boxes outside of the
+            images. Default: True.
+    """
+
+    def __init__(self, img_scale, keep_ratio=False, bbox_clip_border=True):
+        self.img_scale = img_scale
+        self.keep_ratio = keep_ratio
+        self.bbox_clip_border = bbox_clip_border
+
+    def __call__(self, results):
+        img = results['img']
+        crops = []
+        for i, meta in enumerate(results['img_metas']):
+            h, w, c = meta['img_shape']
+            if self.keep_ratio:
+                new_w, new_h = mmcv.rescale_size((w, h), self.img_scale)
+            else:
+                new_w, new_h = self.img_scale
+            crops.append(
+                F.interpolate(
+                    img[i:i + 1, :, :h, :w],
+                    size=(new_h, new_w),
+                    mode='bilinear',
+                    align_corners=False)[0])
+            scale_factor = np.array([new_w / w, new_h / h] * 2,
+                                    dtype=np.float32)
+            for key in _BBOX_KEYS:
+                if results.get(key) is not None:
+                    bboxes = results[key][i] * \
+                        results[key][i].new_tensor(scale_factor)
+                    if self.bbox_clip_border:
+                        bboxes[:, 0::2] = bboxes[:, 0::2].clamp(0, new_w)
+                        bboxes[:, 1::2] = bboxes[:, 1::2].clamp(0, new_h)
+                    results[key][i] = bboxes
+            _map_masks(results, i, lambda masks: masks.resize((new_h, new_w)))
+            meta['img_shape'] = (new_h, new_w, c)
+            meta['scale_factor'] = scale_factor * meta.get('scale_factor', 1.)
+        results['img'] = _paste_images(crops, img.new_zeros(img.shape[1]))
+        return results
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(img_scale={self.img_scale}, '
+        repr_str += f'keep_ratio={self.keep_ratio}, '
+        repr_str += f'bbox_clip_border={self.bbox_clip_border})'
+        return repr_str
+
+
+def _gray(img):
+    """Get the gray levels of shape (N, 1, H, W) of BGR images."""
+    return (img * img.new_tensor(_BGR2GRAY).view(1, 3, 1, 1)).sum(
+        1, keepdim=True)
+
+
+def _blend(results, transform, degenerated):
+    """Blend the images with degenerated images by the factor of the
+    transform, for the images it is applied to with its probability."""
+    img = results['img']
+    applied = img.new_tensor(
+        [np.random.rand() <= transform.prob for _ in range(len(img))],
+        dtype=torch.bool)
+    factor = transform.factor
+    blended = (img * factor + degenerated * (1 - factor)).clamp(0, 255)
+    results['img'] = torch.where(applied[:, None, None, None], blended, img)
+    return results
+
+
+@PIPELINES.register_module()
+class BatchBrightnessTransform(BrightnessTransform):
+    """Batched :obj:`BrightnessTransform` for :obj:`BatchAugment`."""
+
+    def __call__(self, results):
+        return _blend(results, self, 0.)
+
+
+@PIPELINES.register_module()
+class BatchContrastTransform(ContrastTransform):
+    """Batched :obj:`ContrastTransform` for :obj:`BatchAugment`, blending the
+    images with their mean gray level."""
+
+    def __call__(self, results):
+        img = results['img']
+        valid = _valid_mask(results)
+        gray = _gray(img).clamp(0, 255).round() * valid
+        mean = gray.sum((1, 2, 3)) / valid.sum((1, 2, 3))
+        return _blend(results, self, mean.round().view(-1, 1, 1, 1))
+
+
+@PIPELINES.register_module()
+class BatchColorTransform(ColorTransform):
+    """Batched :obj:`ColorTransform` for :obj:`BatchAugment`, blending the
+    images with their gray levels."""
+
+    def __call__(self, results):
+        return _blend(results, self, _gray(results['img']))
@@ -3,6 +3,7 @@ import collections
 from mmcv.utils import build_from_cfg
 
 from ..builder import PIPELINES
+from .profiler import get_pipeline_profiler
 
 
 @PIPELINES.register_module()
@@ -12,6 +13,10 @@ class Compose(object):
     Args:
         transforms (Sequence[dict | callable]): Sequence of transform object or
             config dict to be composed.
+
+    If the profiling of the pipelines is enabled by
+    :func:`enable_pipeline_profiling` before it is built, the statistics of
+    every transform are recorded by the profiler.
     """
 
     def __init__(self, transforms):
@@ -25,6 +30,14 @@ class Compose(object):
                 self.transforms.append(transform)
             else:
                 raise TypeError('transform must be callable or a dict')
+        self.profiler = get_pipeline_profiler()
+        if self.profiler is not None:
+            # transforms are registered by type, functions by name
+            self.slots = [
+                self.profiler.register(
+                    getattr(t, '__name__', type(t).__name__))
+                for t in self.transforms
+            ]
 
     def __call__(self, data):
         """Call function to apply transforms sequentially.
@@ -36,12 +49,21 @@ class Compose(object):
            dict: Transformed data.
         """
 
+        if self.profiler is not None:
+            return self._profiled_call(data)
         for t in self.transforms:
             data = t(data)
             if data is None:
                 return None
         return data
 
+    def _profiled_call(self, data):
+        for slot, t in zip(self.slots, self.transforms):
+            data = self.profiler.run(slot, t, data)
+            if data is None:
+                return None
+        return data
+
     def __repr__(self):
         format_string = self.__class__.__name__ + '('
         for t in self.transforms:
@@ -32,16 +32,21 @@ class CopyPaste:
             self.rotate = None
         self.colors = [(np.random.rand(3) * 255).astype(np.uint8) for _ in range(20)]
 
+    @staticmethod
+    def _writeable(array):
+        # arrays shared with a cache or another sample are copied on write
+        return array if array.flags.writeable else array.copy()
+
     def image_copy_paste(self, results, composed_mask):
-        img_dtype = results['img'].dtype
-        composed_mask = composed_mask[..., None]
-        results['img'] = results['copy_paste']['img'] * composed_mask + results['img'] * (1 - composed_mask)
-        results['img'] = results['img'].astype(img_dtype)
+        # the pasted pixels are written directly into the target image
+        img = self._writeable(results['img'])
+        np.copyto(img, results['copy_paste']['img'], casting='unsafe', where=composed_mask[..., None])
+        results['img'] = img
 
     def masks_copy_paste(self, results, paste_objects, composed_mask):
-        results['gt_masks'].masks = np.array([
-            np.where(composed_mask == 1, 0, mask).astype(np.uint8) for mask in results['gt_masks'].masks
-        ])
+        masks = self._writeable(results['gt_masks'].masks).astype(np.uint8, copy=False)
+        masks[:, composed_mask] = 0
+        results['gt_masks'].masks = masks
         results['gt_masks'].masks = np.concatenate(
             (results['gt_masks'].masks, results['copy_paste']['gt_masks'].masks[paste_objects]), axis=0)
         results['gt_bboxes'] = np.concatenate(
@@ -155,11 +160,12 @@ class CopyPaste:
         return results
 
     def get_composed_mask(self, results, h, w, inds=None):
-        composed_mask = np.zeros((h, w), dtype=np.uint8)
-        for i, mask in enumerate(results['copy_paste']['gt_masks'].masks):
-            if inds is None or i in inds:
-                composed_mask = np.logical_or(composed_mask, mask)
-        return composed_mask
+        masks = results['copy_paste']['gt_masks'].masks
+        if inds is not None:
+            masks = masks[np.unique(inds)]
+        if len(masks) == 0:
+            return np.zeros((h, w), dtype=bool)
+        return np.any(masks, axis=0)
 
     def __call__(self, results):
         if 'copy_paste' not in results:
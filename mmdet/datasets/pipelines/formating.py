@@ -96,6 +96,10 @@ class ImageToTensor(object):
         """
         for key in self.keys:
             img = results[key]
+            if results.get('img_layout') == 'CHW':
+                # already transposed by ResizeNormalizePad
+                results[key] = to_tensor(img)
+                continue
             if len(img.shape) < 3:
                 img = np.expand_dims(img, -1)
             results[key] = to_tensor(img.transpose(2, 0, 1))
@@ -209,9 +213,11 @@ class DefaultFormatBundle(object):
             img = results['img']
             # add default meta keys
             results = self._add_default_meta_keys(results)
-            if len(img.shape) < 3:
-                img = np.expand_dims(img, -1)
-            img = np.ascontiguousarray(img.transpose(2, 0, 1))
+            # images of ResizeNormalizePad are already transposed
+            if results.get('img_layout') != 'CHW':
+                if len(img.shape) < 3:
+                    img = np.expand_dims(img, -1)
+                img = np.ascontiguousarray(img.transpose(2, 0, 1))
             results['img'] = DC(to_tensor(img), stack=True)
         for key in ['proposals', 'gt_bboxes', 'gt_bboxes_ignore', 'gt_labels']:
             if key not in results:
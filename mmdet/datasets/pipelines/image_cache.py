@@ -0,0 +1,215 @@
+import fcntl
+import hashlib
+import os
+import os.path as osp
+from contextlib import contextmanager
+
+import mmcv
+import numpy as np
+
+_HEADER_FIELDS = ('magic', 'clock', 'resident_bytes', 'hits', 'misses',
+                  'num_images')
+_MAGIC = 0x6d6d646574696d67
+_HEADER_BYTES = 64
+_SLOT_DTYPE = np.dtype([('key', '<u8', (2, )), ('nbytes', '<i8'),
+                        ('last_used', '<i8'), ('shape', '<i4', (3, ))])
+
+
+class SharedImageCache:
+    """Cache of decoded uint8 images shared by all the processes of a node.
+
+    Images are stored as raw files in ``cache_dir``, which should be on a
+    shared memory file system such as ``/dev/shm``, so that every dataloader
+    worker reads the images decoded by any other one. An index file of
+    ``max_images`` slots, mapped in memory by every process and guarded by a
+    file lock, keeps the shape, size and last use of the cached images. When
+    the images exceed ``max_bytes``, the least recently used ones are
+    evicted.
+
+    The cache is opened lazily in every process, so an instance may be
+    created before the dataloader workers are forked. All the processes
+    using the same directory must use the same ``max_images``, the index of
+    a cache in use is never reset.
+
+    Args:
+        cache_dir (str): Directory of the cache. Processes using the same
+            directory share the images. Default: '/dev/shm/mmdet_image_cache'.
+        max_bytes (int): Budget of the cached images in bytes.
+            Default: 4 GB.
+        max_images (int): Maximum number of cached images. Default: 100000.
+    """
+
+    def __init__(self,
+                 cache_dir='/dev/shm/mmdet_image_cache',
+                 max_bytes=4 * 1024**3,
+                 max_images=100000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_images = max_images
+        self._pid = None
+        self._lock_file = None
+        self._header = None
+        self._slots = None
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        mmcv.mkdir_or_exist(self.cache_dir)
+        index_file = osp.join(self.cache_dir, 'index')
+        # locks of a file description are shared with the forked processes,
+        # so every process opens the index on its own
+        self._lock_file = open(index_file, 'a+b')
+        size = _HEADER_BYTES + self.max_images * _SLOT_DTYPE.itemsize
+        with self._locked():
+            index_size = osp.getsize(index_file)
+            if index_size == 0:
+                self._lock_file.truncate(size)
+            else:
+                header = np.fromfile(index_file, dtype='<i8', count=1)
+                # other processes may have mapped the index, so it is not
+                # reset here
+                if len(header) == 0 or header[0] != _MAGIC:
+                    raise ValueError(
+                        f'{index_file} is not the index of an image cache, '
+                        'remove it or use another cache_dir')
+                if index_size != size:
+                    num_slots = (index_size -
+                                 _HEADER_BYTES) // _SLOT_DTYPE.itemsize
+                    raise ValueError(
+                        f'the image cache in {self.cache_dir} has '
+                        f'{num_slots} slots instead of max_images='
+                        f'{self.max_images}, use the same max_images or '
+                        'another cache_dir')
+            self._header = np.memmap(
+                index_file, dtype='<i8', mode='r+',
+                shape=(_HEADER_BYTES // 8, ))
+            self._header[0] = _MAGIC
+            self._slots = np.memmap(
+                index_file,
+                dtype=_SLOT_DTYPE,
+                mode='r+',
+                offset=_HEADER_BYTES,
+                shape=(self.max_images, ))
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _field(self, name):
+        return _HEADER_FIELDS.index(name)
+
+    @staticmethod
+    def _digest(key):
+        return np.frombuffer(hashlib.md5(key.encode()).digest(), dtype='<u8')
+
+    def _image_file(self, digest):
+        return osp.join(self.cache_dir, digest.tobytes().hex())
+
+    def _find(self, digest):
+        valid = self._slots['nbytes'] > 0
+        matches = (self._slots['key'] == digest).all(axis=1)
+        inds = np.nonzero(valid & matches)[0]
+        return inds[0] if len(inds) else None
+
+    def get(self, key):
+        """Get the image cached under ``key``, or None on a miss."""
+        self._open()
+        digest = self._digest(key)
+        with self._locked():
+            ind = self._find(digest)
+            if ind is None:
+                self._header[self._field('misses')] += 1
+                return None
+            self._header[self._field('clock')] += 1
+            self._slots['last_used'][ind] = self._header[self._field('clock')]
+            self._header[self._field('hits')] += 1
+            shape = tuple(self._slots['shape'][ind])
+        try:
+            img = np.fromfile(self._image_file(digest), dtype=np.uint8)
+        except FileNotFoundError:
+            # evicted by another process in the meantime, which is a miss
+            with self._locked():
+                self._header[self._field('hits')] -= 1
+                self._header[self._field('misses')] += 1
+            return None
+        shape = shape[:2] if shape[2] == 0 else shape
+        return img.reshape(shape)
+
+    def put(self, key, img):
+        """Cache an uint8 image under ``key``, evicting the least recently
+        used images if needed. Images larger than the budget are skipped."""
+        if img.dtype != np.uint8 or img.nbytes > self.max_bytes or \
+                img.ndim not in (2, 3):
+            return
+        self._open()
+        digest = self._digest(key)
+        with self._locked():
+            if self._find(digest) is not None:
+                return
+            header = self._header
+            resident = self._field('resident_bytes')
+            while True:
+                valid = self._slots['nbytes'] > 0
+                free = np.nonzero(~valid)[0]
+                if len(free) and header[resident] + img.nbytes <= \
+                        self.max_bytes:
+                    break
+                if not valid.any():
+                    # the header drifted from the slots, e.g. after a crashed
+                    # writer, and is recounted from them
+                    header[resident] = self._slots['nbytes'][valid].sum()
+                    header[self._field('num_images')] = valid.sum()
+                    break
+                last_used = np.where(valid, self._slots['last_used'],
+                                     np.iinfo(np.int64).max)
+                victim = np.argmin(last_used)
+                self._evict(victim)
+            image_file = self._image_file(digest)
+            tmp_file = f'{image_file}.{os.getpid()}.tmp'
+            np.ascontiguousarray(img).tofile(tmp_file)
+            os.replace(tmp_file, image_file)
+            header[self._field('clock')] += 1
+            ind = free[0]
+            self._slots['key'][ind] = digest
+            self._slots['nbytes'][ind] = img.nbytes
+            self._slots['last_used'][ind] = header[self._field('clock')]
+            self._slots['shape'][ind] = \
+                img.shape if img.ndim == 3 else img.shape + (0, )
+            header[resident] += img.nbytes
+            header[self._field('num_images')] += 1
+
+    def _evict(self, ind):
+        if self._slots['nbytes'][ind] == 0:
+            return
+        try:
+            os.remove(self._image_file(np.array(self._slots['key'][ind])))
+        except FileNotFoundError:
+            pass
+        self._header[self._field('resident_bytes')] -= \
+            self._slots['nbytes'][ind]
+        self._header[self._field('num_images')] -= 1
+        self._slots['nbytes'][ind] = 0
+
+    def stats(self):
+        """Get the hit rate and resident bytes of the cache, shared by all
+        the processes using it."""
+        self._open()
+        with self._locked():
+            stats = {
+                name: int(self._header[self._field(name)])
+                for name in ('hits', 'misses', 'resident_bytes', 'num_images')
+            }
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def __getstate__(self):
+        # the index is reopened in the process the cache is unpickled in
+        state = self.__dict__.copy()
+        state.update(_pid=None, _lock_file=None, _header=None, _slots=None)
+        return state
@@ -4,6 +4,7 @@
 # Copyright (C) 2020-2021 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 #
+import os
 import os.path as osp
 
 import mmcv
@@ -11,7 +12,9 @@ import numpy as np
 import pycocotools.mask as maskUtils
 
 from mmdet.core import BitmapMasks, PolygonMasks
+from mmdet.utils import get_root_logger
 from ..builder import PIPELINES
+from .image_cache import SharedImageCache
 
 
 @PIPELINES.register_module()
@@ -32,16 +35,55 @@ class LoadImageFromFile(object):
         file_client_args (dict): Arguments to instantiate a FileClient.
             See :class:`mmcv.fileio.FileClient` for details.
             Defaults to ``dict(backend='disk')``.
+        cache (dict, optional): Arguments of a :class:`SharedImageCache`
+            keeping the decoded images in shared memory for all the
+            dataloader workers, e.g. ``dict(max_bytes=8 * 1024**3)``. The
+            images on disk are keyed on their modification time and size.
+            Its statistics are logged every ``log_interval`` loaded images
+            of a process, 0 disables the logging. Defaults to None.
     """
 
     def __init__(self,
                  to_float32=False,
                  color_type='color',
-                 file_client_args=dict(backend='disk')):
+                 file_client_args=dict(backend='disk'),
+                 cache=None):
         self.to_float32 = to_float32
         self.color_type = color_type
         self.file_client_args = file_client_args.copy()
         self.file_client = None
+        self.cache_cfg = cache
+        self.cache = None
+        self.log_interval = 0
+        if cache is not None:
+            cache = cache.copy()
+            self.log_interval = cache.pop('log_interval', 1000)
+            self.cache = SharedImageCache(**cache)
+        self.num_loaded = 0
+
+    def _load_image(self, filename):
+        if self.cache is None:
+            img_bytes = self.file_client.get(filename)
+            return mmcv.imfrombytes(img_bytes, flag=self.color_type)
+
+        key = f'{filename}:{self.color_type}'
+        if self.file_client_args['backend'] == 'disk':
+            # a replaced file must not be served from a persistent cache
+            stat = os.stat(filename)
+            key += f':{stat.st_mtime_ns}:{stat.st_size}'
+        img = self.cache.get(key)
+        if img is None:
+            img_bytes = self.file_client.get(filename)
+            img = mmcv.imfrombytes(img_bytes, flag=self.color_type)
+            self.cache.put(key, img)
+        self.num_loaded += 1
+        if self.log_interval and self.num_loaded % self.log_interval == 0:
+            stats = self.cache.stats()
+            get_root_logger().info(
+                f'Image cache: hit rate {stats["hit_rate"]:.3f}, '
+                f'{stats["num_images"]} images, '
+                f'{stats["resident_bytes"] / 1024**2:.1f} MB resident')
+        return img
 
     def __call__(self, results):
         """Call functions to load image and get image meta information.
@@ -62,8 +104,7 @@ class LoadImageFromFile(object):
         else:
             filename = results['img_info']['filename']
 
-        img_bytes = self.file_client.get(filename)
-        img = mmcv.imfrombytes(img_bytes, flag=self.color_type)
+        img = self._load_image(filename)
         if self.to_float32:
             img = img.astype(np.float32)
 
@@ -83,7 +124,10 @@ class LoadImageFromFile(object):
         repr_str = (f'{self.__class__.__name__}('
                     f'to_float32={self.to_float32}, '
                     f"color_type='{self.color_type}', "
-                    f'file_client_args={self.file_client_args})')
+                    f'file_client_args={self.file_client_args}')
+        if self.cache_cfg is not None:
+            repr_str += f', cache={self.cache_cfg}'
+        repr_str += ')'
         return repr_str
 
 
@@ -0,0 +1,220 @@
+import glob
+import os
+import os.path as osp
+import time
+
+import mmcv
+import numpy as np
+from terminaltables import AsciiTable
+
+from mmdet.utils.profiling import get_nbytes, trace_memory
+
+_FIELDS = ('calls', 'time_ns', 'alloc_bytes', 'output_bytes')
+
+_profiler = None
+
+
+class PipelineProfiler:
+    """Per-transform statistics of the data pipelines, shared by the
+    dataloader workers.
+
+    Every process, i.e. the process enabling the profiling and each of its
+    dataloader workers, writes the calls, wall time, peak of memory
+    allocated (traced with ``tracemalloc``) and bytes of the output arrays of
+    every transform type to its own memory mapped file, so no lock is
+    needed. The files of the workers are created on their first transform.
+    The statistics of the workers of a process, or of all the processes
+    using the same ``stats_dir``, are summed by :meth:`summary`.
+
+    The transform types are registered by :obj:`Compose` when the pipelines
+    are built, before the workers are started.
+
+    Args:
+        stats_dir (str): Directory of the statistics files.
+            Default: '/dev/shm/mmdet_pipeline_stats'.
+        trace_alloc (bool): Whether to trace the memory allocated by the
+            transforms, which slows them down. Transforms of nested pipelines
+            share the peak of the outer one before Python 3.9.
+            Default: True.
+        max_transforms (int): Maximum number of transform types.
+            Default: 256.
+    """
+
+    def __init__(self,
+                 stats_dir='/dev/shm/mmdet_pipeline_stats',
+                 trace_alloc=True,
+                 max_transforms=256):
+        self.stats_dir = stats_dir
+        self.trace_alloc = trace_alloc
+        self.max_transforms = max_transforms
+        mmcv.mkdir_or_exist(stats_dir)
+        self.main_pid = os.getpid()
+        # statistics left by the processes which are not running anymore
+        for stats_file in self._stats_files('*'):
+            if not osp.exists(f'/proc/{self._main_pid_of(stats_file)}'):
+                self._remove(stats_file)
+        self.names = []
+        self._open('w+')
+
+    @property
+    def stats_file(self):
+        """str: Statistics file of the current process."""
+        return osp.join(self.stats_dir,
+                        f'{self.main_pid}.{os.getpid()}.stats')
+
+    def _stats_files(self, main_pid):
+        return glob.glob(osp.join(self.stats_dir, f'{main_pid}.*.stats'))
+
+    @staticmethod
+    def _main_pid_of(stats_file):
+        return osp.basename(stats_file).split('.')[0]
+
+    @staticmethod
+    def _remove(stats_file):
+        meta_file = f'{stats_file[:-len(".stats")]}.json'
+        for filename in (stats_file, meta_file):
+            if osp.exists(filename):
+                os.remove(filename)
+
+    def _open(self, mode):
+        """Map the statistics file of the current process."""
+        self._pid = os.getpid()
+        self._stats = np.memmap(
+            self.stats_file,
+            dtype=np.int64,
+            mode=mode,
+            shape=(self.max_transforms, len(_FIELDS)))
+        self._dump_names()
+
+    def _dump_names(self):
+        meta = dict(
+            names=self.names, shape=[self.max_transforms, len(_FIELDS)])
+        mmcv.dump(meta, f'{self.stats_file[:-len(".stats")]}.json')
+
+    def register(self, name):
+        """Get the slot of a transform type, registering it if needed."""
+        if name in self.names:
+            return self.names.index(name)
+        assert len(self.names) < self.max_transforms, \
+            'too many transform types to profile'
+        self.names.append(name)
+        self._dump_names()
+        return len(self.names) - 1
+
+    def run(self, slot, transform, data):
+        """Run a transform and record its statistics."""
+        if self.trace_alloc:
+            with trace_memory() as alloc:
+                start = time.perf_counter_ns()
+                data = transform(data)
+                elapsed = time.perf_counter_ns() - start
+            alloc_bytes = alloc['peak_bytes']
+        else:
+            start = time.perf_counter_ns()
+            data = transform(data)
+            elapsed = time.perf_counter_ns() - start
+            alloc_bytes = 0
+        if self._pid != os.getpid():
+            # first transform of a dataloader worker
+            self._open('r+' if osp.exists(self.stats_file) else 'w+')
+        stats = self._stats[slot]
+        stats += (1, elapsed, alloc_bytes, get_nbytes(data))
+        return data
+
+    def reset(self):
+        """Reset the statistics of this process and its workers. The files
+        of the workers which exited are removed."""
+        for stats_file in self._stats_files(self.main_pid):
+            pid = osp.basename(stats_file).split('.')[1]
+            if not osp.exists(f'/proc/{pid}'):
+                self._remove(stats_file)
+            elif stats_file == self.stats_file:
+                self._stats[:] = 0
+            else:
+                np.memmap(stats_file, dtype=np.int64, mode='r+')[:] = 0
+
+    @staticmethod
+    def summary(stats_dir='/dev/shm/mmdet_pipeline_stats', main_pid='*'):
+        """Sum the statistics of the processes using a directory.
+
+        Args:
+            stats_dir (str): Directory of the statistics files.
+            main_pid (int | str): Pid of the process which enabled the
+                profiling, only its statistics and the ones of its workers
+                are summed. Defaults to all the processes of the directory.
+
+        Returns:
+            list[dict]: Per transform type, sorted by decreasing total time,
+                the number of ``calls``, and per call the ``time_ms``,
+                ``alloc_bytes`` and ``output_bytes``, with the
+                ``time_ratio`` of the total time of all the transforms.
+        """
+        totals = {}
+        for meta_file in glob.glob(
+                osp.join(stats_dir, f'{main_pid}.*.json')):
+            stats_file = f'{meta_file[:-len(".json")]}.stats'
+            if not osp.exists(stats_file):
+                continue
+            meta = mmcv.load(meta_file)
+            stats = np.fromfile(stats_file, dtype=np.int64)
+            stats = stats.reshape(meta['shape'])
+            for name, values in zip(meta['names'], stats):
+                totals[name] = totals.get(name, 0) + values
+
+        total_time = sum(values[1] for values in totals.values())
+        summary = []
+        for name, values in totals.items():
+            calls, time_ns, alloc_bytes, output_bytes = values.tolist()
+            if calls == 0:
+                continue
+            summary.append(
+                dict(
+                    name=name,
+                    calls=calls,
+                    time_ms=time_ns / calls / 1e6,
+                    alloc_bytes=alloc_bytes / calls,
+                    output_bytes=output_bytes / calls,
+                    time_ratio=time_ns / max(total_time, 1)))
+        return sorted(summary, key=lambda x: -x['time_ms'] * x['calls'])
+
+    def __getstate__(self):
+        # the process it is unpickled in creates its own statistics file
+        state = self.__dict__.copy()
+        state.update(_pid=None, _stats=None)
+        return state
+
+
+def format_pipeline_summary(summary):
+    """Format the summary of :meth:`PipelineProfiler.summary` as a table."""
+    table_data = [[
+        'transform', 'calls', 'time (ms)', 'time (%)', 'alloc (MB)',
+        'output (MB)'
+    ]]
+    for stats in summary:
+        table_data.append([
+            stats['name'], stats['calls'], f'{stats["time_ms"]:.3f}',
+            f'{stats["time_ratio"] * 100:.1f}',
+            f'{stats["alloc_bytes"] / 2**20:.2f}',
+            f'{stats["output_bytes"] / 2**20:.2f}'
+        ])
+    return AsciiTable(table_data).table
+
+
+def enable_pipeline_profiling(**kwargs):
+    """Profile the pipelines built from now on in this process and its
+    dataloader workers.
+
+    Args:
+        **kwargs: Arguments of :obj:`PipelineProfiler`.
+
+    Returns:
+        PipelineProfiler: The profiler.
+    """
+    global _profiler
+    _profiler = PipelineProfiler(**kwargs)
+    return _profiler
+
+
+def get_pipeline_profiler():
+    """Get the profiler of the pipelines, or None if profiling is off."""
+    return _profiler
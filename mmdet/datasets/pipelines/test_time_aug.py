@@ -75,8 +75,12 @@ class MultiScaleFlipAug(object):
         if not self.flip and self.flip_direction != ['horizontal']:
             warnings.warn(
                 'flip_direction has no effect when flip is set to False')
-        if (self.flip
-                and not any([t['type'] == 'RandomFlip' for t in transforms])):
+        if (self.flip and not any([
+                t['type'] == 'RandomFlip' or
+                (t['type'] == 'ResizeNormalizePad' and
+                 t.get('flip') is not None)
+                for t in transforms
+        ])):
             warnings.warn(
                 'flip has no effect when RandomFlip is not in transforms')
 
@@ -6,7 +6,6 @@
 #
 import math
 
-import copy
 import cv2
 import inspect
 import mmcv
@@ -426,6 +425,27 @@ class RandomFlip(object):
             raise ValueError(f"Invalid flipping direction '{direction}'")
         return flipped
 
+    def _random_direction(self):
+        """Randomly choose the flipping direction, None means non-flip."""
+        if isinstance(self.direction, list):
+            # None means non-flip
+            direction_list = self.direction + [None]
+        else:
+            # None means non-flip
+            direction_list = [self.direction, None]
+
+        if isinstance(self.flip_ratio, list):
+            non_flip_ratio = 1 - sum(self.flip_ratio)
+            flip_ratio_list = self.flip_ratio + [non_flip_ratio]
+        else:
+            non_flip_ratio = 1 - self.flip_ratio
+            # exclude non-flip
+            single_ratio = self.flip_ratio / (len(direction_list) - 1)
+            flip_ratio_list = [single_ratio] * (len(direction_list) -
+                                                1) + [non_flip_ratio]
+
+        return np.random.choice(direction_list, p=flip_ratio_list)
+
     def __call__(self, results):
         """Call function to flip bounding boxes, masks, semantic segmentation
         maps.
@@ -439,25 +459,7 @@ class RandomFlip(object):
         """
 
         if 'flip' not in results:
-            if isinstance(self.direction, list):
-                # None means non-flip
-                direction_list = self.direction + [None]
-            else:
-                # None means non-flip
-                direction_list = [self.direction, None]
-
-            if isinstance(self.flip_ratio, list):
-                non_flip_ratio = 1 - sum(self.flip_ratio)
-                flip_ratio_list = self.flip_ratio + [non_flip_ratio]
-            else:
-                non_flip_ratio = 1 - self.flip_ratio
-                # exclude non-flip
-                single_ratio = self.flip_ratio / (len(direction_list) - 1)
-                flip_ratio_list = [single_ratio] * (len(direction_list) -
-                                                    1) + [non_flip_ratio]
-
-            cur_dir = np.random.choice(direction_list, p=flip_ratio_list)
-
+            cur_dir = self._random_direction()
             results['flip'] = cur_dir is not None
         if 'flip_direction' not in results:
             results['flip_direction'] = cur_dir
@@ -614,6 +616,131 @@ class Normalize(object):
         return repr_str
 
 
+@PIPELINES.register_module()
+class ResizeNormalizePad(object):
+    """Resize, flip, normalize and pad the image in one transform.
+
+    The image is resized (and flipped) like with :obj:`Resize` and
+    :obj:`RandomFlip`, then normalized with the same OpenCV operations as
+    :obj:`Normalize`, and written once, with the channels in RGB order if
+    needed, into a buffer of the padded shape in (C, H, W) order. This
+    replaces the normalized copy, the padded copy and the transposed copy of
+    the separate transforms and of :obj:`DefaultFormatBundle`, which gives
+    the same outputs and meta keys. ``results['img_layout']`` is set to
+    ``'CHW'`` so that the formatting transforms do not transpose the image
+    again, therefore nothing reading the image should follow before them.
+
+    Pipelines are rewritten to use it with
+    :func:`mmdet.datasets.fuse_resize_normalize_pad`.
+
+    Args:
+        normalize (dict): Arguments of :obj:`Normalize`.
+        pad (dict): Arguments of :obj:`Pad`.
+        resize (dict, optional): Arguments of :obj:`Resize`, if the image is
+            resized.
+        flip (dict, optional): Arguments of :obj:`RandomFlip`, if the image
+            is flipped after being resized.
+        dtype (str): Type of the output image, 'float32' or 'float16'.
+            Default: 'float32'.
+    """
+
+    def __init__(self,
+                 normalize,
+                 pad,
+                 resize=None,
+                 flip=None,
+                 dtype='float32'):
+        self.resize = Resize(**resize) if resize is not None else None
+        self.flip = RandomFlip(**flip) if flip is not None else None
+        self.normalize = Normalize(**normalize)
+        self.pad = Pad(**pad)
+        assert dtype in ('float32', 'float16')
+        self.dtype = np.dtype(dtype)
+
+    def _get_pad_shape(self, img_shape):
+        h, w = img_shape[:2]
+        if self.pad.pad_to_square:
+            # like Pad, which keeps the size of the last image
+            self.pad.size = (max(h, w), max(h, w))
+        if self.pad.size is not None:
+            pad_h, pad_w = self.pad.size
+            assert pad_h >= h and pad_w >= w, \
+                f'the padded shape {self.pad.size} is smaller than the image'
+        else:
+            divisor = self.pad.size_divisor
+            pad_h = int(np.ceil(h / divisor)) * divisor
+            pad_w = int(np.ceil(w / divisor)) * divisor
+        return (pad_h, pad_w) + tuple(img_shape[2:])
+
+    def _normalize_pad_img(self, img, pad_shape):
+        """Normalize an image and write it transposed into the padded
+        buffer."""
+        norm = self.normalize
+        img = img.astype(np.float32)
+        if img.ndim < 3:
+            img = img[..., None]
+        h, w, c = img.shape
+        # same operations as mmcv.imnormalize, but the channels are swapped
+        # to RGB order when written to the output instead of in place
+        mean = np.float64(norm.mean.reshape(1, -1))
+        stdinv = 1 / np.float64(norm.std.reshape(1, -1))
+        to_rgb = norm.to_rgb and c == 3
+        if to_rgb:
+            mean = mean[:, ::-1].copy()
+            stdinv = stdinv[:, ::-1].copy()
+        cv2.subtract(img, mean, img)
+        cv2.multiply(img, stdinv, img)
+        channels = img.transpose(2, 0, 1)
+        if to_rgb:
+            channels = channels[::-1]
+
+        out = np.empty((c, ) + tuple(pad_shape[:2]), dtype=self.dtype)
+        pad_val = np.reshape(self.pad.pad_val, (-1, 1, 1))
+        out[:, h:] = pad_val
+        out[:, :h, w:] = pad_val
+        out[:, :h, :w] = channels
+        return out
+
+    def __call__(self, results):
+        """Call function to resize, flip, normalize and pad images, and to
+        update the boxes, masks and semantic segmentation maps.
+
+        Args:
+            results (dict): Result dict from loading pipeline.
+
+        Returns:
+            dict: Updated result dict, with the images in (C, H, W) order.
+        """
+        if self.resize is not None:
+            results = self.resize(results)
+        if self.flip is not None:
+            results = self.flip(results)
+
+        for key in results.get('img_fields', ['img']):
+            pad_shape = self._get_pad_shape(results[key].shape)
+            results[key] = self._normalize_pad_img(results[key], pad_shape)
+        results['img_norm_cfg'] = dict(
+            mean=self.normalize.mean,
+            std=self.normalize.std,
+            to_rgb=self.normalize.to_rgb)
+        results['pad_shape'] = pad_shape
+        results['pad_fixed_size'] = self.pad.size
+        results['pad_size_divisor'] = self.pad.size_divisor
+        results['img_layout'] = 'CHW'
+        self.pad._pad_masks(results)
+        self.pad._pad_seg(results)
+        return results
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(resize={self.resize}, '
+        repr_str += f'flip={self.flip}, '
+        repr_str += f'normalize={self.normalize}, '
+        repr_str += f'pad={self.pad}, '
+        repr_str += f'dtype={self.dtype})'
+        return repr_str
+
+
 @PIPELINES.register_module()
 class RandomCrop(object):
     """Random crop the image & bboxes & masks.
@@ -868,6 +995,51 @@ class PhotoMetricDistortion(object):
         self.saturation_lower, self.saturation_upper = saturation_range
         self.hue_delta = hue_delta
 
+    def _get_params(self):
+        """Sample the parameters of the distortion, None means the
+        corresponding step is skipped."""
+        params = dict(contrast=None)
+        # random brightness
+        if random.randint(2):
+            params['brightness'] = random.uniform(-self.brightness_delta,
+                                                  self.brightness_delta)
+        else:
+            params['brightness'] = None
+
+        # mode == 0 --> do random contrast first
+        # mode == 1 --> do random contrast last
+        params['mode'] = random.randint(2)
+        if params['mode'] == 1:
+            if random.randint(2):
+                params['contrast'] = random.uniform(self.contrast_lower,
+                                                    self.contrast_upper)
+
+        # random saturation
+        if random.randint(2):
+            params['saturation'] = random.uniform(self.saturation_lower,
+                                                  self.saturation_upper)
+        else:
+            params['saturation'] = None
+
+        # random hue
+        if random.randint(2):
+            params['hue'] = random.uniform(-self.hue_delta, self.hue_delta)
+        else:
+            params['hue'] = None
+
+        # random contrast
+        if params['mode'] == 0:
+            if random.randint(2):
+                params['contrast'] = random.uniform(self.contrast_lower,
+                                                    self.contrast_upper)
+
+        # randomly swap channels
+        if random.randint(2):
+            params['permutation'] = random.permutation(3)
+        else:
+            params['permutation'] = None
+        return params
+
     def __call__(self, results):
         """Call function to perform photometric distortion on images.
 
@@ -886,48 +1058,32 @@ class PhotoMetricDistortion(object):
             'PhotoMetricDistortion needs the input image of dtype ' \
             'np.float32, please set "to_float32=True" in ' \
             '"LoadImageFromFile" pipeline'
-        # random brightness
-        if random.randint(2):
-            delta = random.uniform(-self.brightness_delta,
-                                   self.brightness_delta)
-            img += delta
+        params = self._get_params()
+        if params['brightness'] is not None:
+            img += params['brightness']
 
-        # mode == 0 --> do random contrast first
-        # mode == 1 --> do random contrast last
-        mode = random.randint(2)
-        if mode == 1:
-            if random.randint(2):
-                alpha = random.uniform(self.contrast_lower,
-                                       self.contrast_upper)
-                img *= alpha
+        if params['mode'] == 1 and params['contrast'] is not None:
+            img *= params['contrast']
 
         # convert color from BGR to HSV
         img = mmcv.bgr2hsv(img)
 
-        # random saturation
-        if random.randint(2):
-            img[..., 1] *= random.uniform(self.saturation_lower,
-                                          self.saturation_upper)
+        if params['saturation'] is not None:
+            img[..., 1] *= params['saturation']
 
-        # random hue
-        if random.randint(2):
-            img[..., 0] += random.uniform(-self.hue_delta, self.hue_delta)
+        if params['hue'] is not None:
+            img[..., 0] += params['hue']
             img[..., 0][img[..., 0] > 360] -= 360
             img[..., 0][img[..., 0] < 0] += 360
 
         # convert color from HSV to BGR
         img = mmcv.hsv2bgr(img)
 
-        # random contrast
-        if mode == 0:
-            if random.randint(2):
-                alpha = random.uniform(self.contrast_lower,
-                                       self.contrast_upper)
-                img *= alpha
+        if params['mode'] == 0 and params['contrast'] is not None:
+            img *= params['contrast']
 
-        # randomly swap channels
-        if random.randint(2):
-            img = img[..., random.permutation(3)]
+        if params['permutation'] is not None:
+            img = img[..., params['permutation']]
 
         results['img'] = img
         return results
@@ -973,6 +1129,16 @@ class Expand(object):
         self.seg_ignore_label = seg_ignore_label
         self.prob = prob
 
+    def _get_params(self, h, w):
+        """Sample the expand ratio and the position of an image of size
+        (h, w) on the canvas, or None if it is not expanded."""
+        if random.uniform(0, 1) > self.prob:
+            return None
+        ratio = random.uniform(self.min_ratio, self.max_ratio)
+        left = int(random.uniform(0, w * ratio - w))
+        top = int(random.uniform(0, h * ratio - h))
+        return ratio, left, top
+
     def __call__(self, results):
         """Call function to expand images, bounding boxes.
 
@@ -983,16 +1149,16 @@ class Expand(object):
             dict: Result dict with images, bounding boxes expanded
         """
 
-        if random.uniform(0, 1) > self.prob:
-            return results
-
         if 'img_fields' in results:
             assert results['img_fields'] == ['img'], \
                 'Only single img_fields is allowed'
         img = results['img']
 
         h, w, c = img.shape
-        ratio = random.uniform(self.min_ratio, self.max_ratio)
+        params = self._get_params(h, w)
+        if params is None:
+            return results
+        ratio, left, top = params
         # speedup expand when meets large image
         if np.all(self.mean == self.mean[0]):
             expand_img = np.empty((int(h * ratio), int(w * ratio), c),
@@ -1002,8 +1168,6 @@ class Expand(object):
             expand_img = np.full((int(h * ratio), int(w * ratio), c),
                                  self.mean,
                                  dtype=img.dtype)
-        left = int(random.uniform(0, w * ratio - w))
-        top = int(random.uniform(0, h * ratio - h))
         expand_img[top:top + h, left:left + w] = img
 
         results['img'] = expand_img
@@ -1073,31 +1237,21 @@ class MinIoURandomCrop(object):
             'gt_bboxes_ignore': 'gt_masks_ignore'
         }
 
-    def __call__(self, results):
-        """Call function to crop images and bounding boxes with minimum IoU
-        constraint.
-
-        Args:
-            results (dict): Result dict from loading pipeline.
-
-        Returns:
-            dict: Result dict with images and bounding boxes cropped, \
-                'img_shape' key is updated.
-        """
+    @staticmethod
+    def _is_center_of_bboxes_in_patch(boxes, patch):
+        center = (boxes[:, :2] + boxes[:, 2:]) / 2
+        mask = ((center[:, 0] > patch[0]) * (center[:, 1] > patch[1]) *
+                (center[:, 0] < patch[2]) * (center[:, 1] < patch[3]))
+        return mask
 
-        if 'img_fields' in results:
-            assert results['img_fields'] == ['img'], \
-                'Only single img_fields is allowed'
-        img = results['img']
-        assert 'bbox_fields' in results
-        boxes = [results[key] for key in results['bbox_fields']]
-        boxes = np.concatenate(boxes, 0)
-        h, w, c = img.shape
+    def _get_patch(self, boxes, h, w):
+        """Sample the crop patch of an image of size (h, w) with the boxes of
+        all the bbox fields, or None to keep the original image."""
         while True:
             mode = random.choice(self.sample_mode)
             self.mode = mode
             if mode == 1:
-                return results
+                return None
 
             min_iou = mode
             for i in range(50):
@@ -1122,50 +1276,67 @@ class MinIoURandomCrop(object):
                     continue
 
                 # center of boxes should inside the crop img
-                # only adjust boxes and instance masks when the gt is not empty
                 if len(overlaps) > 0:
-                    # adjust boxes
-                    def is_center_of_bboxes_in_patch(boxes, patch):
-                        center = (boxes[:, :2] + boxes[:, 2:]) / 2
-                        mask = ((center[:, 0] > patch[0]) *
-                                (center[:, 1] > patch[1]) *
-                                (center[:, 0] < patch[2]) *
-                                (center[:, 1] < patch[3]))
-                        return mask
-
-                    mask = is_center_of_bboxes_in_patch(boxes, patch)
+                    mask = self._is_center_of_bboxes_in_patch(boxes, patch)
                     if not mask.any():
                         continue
-                    for key in results.get('bbox_fields', []):
-                        boxes = results[key].copy()
-                        mask = is_center_of_bboxes_in_patch(boxes, patch)
-                        boxes = boxes[mask]
-                        if self.bbox_clip_border:
-                            boxes[:, 2:] = boxes[:, 2:].clip(max=patch[2:])
-                            boxes[:, :2] = boxes[:, :2].clip(min=patch[:2])
-                        boxes -= np.tile(patch[:2], 2)
-
-                        results[key] = boxes
-                        # labels
-                        label_key = self.bbox2label.get(key)
-                        if label_key in results:
-                            results[label_key] = results[label_key][mask]
-
-                        # mask fields
-                        mask_key = self.bbox2mask.get(key)
-                        if mask_key in results:
-                            results[mask_key] = results[mask_key][
-                                mask.nonzero()[0]].crop(patch)
-                # adjust the img no matter whether the gt is empty before crop
-                img = img[patch[1]:patch[3], patch[0]:patch[2]]
-                results['img'] = img
-                results['img_shape'] = img.shape
-
-                # seg fields
-                for key in results.get('seg_fields', []):
-                    results[key] = results[key][patch[1]:patch[3],
-                                                patch[0]:patch[2]]
-                return results
+                return patch
+
+    def __call__(self, results):
+        """Call function to crop images and bounding boxes with minimum IoU
+        constraint.
+
+        Args:
+            results (dict): Result dict from loading pipeline.
+
+        Returns:
+            dict: Result dict with images and bounding boxes cropped, \
+                'img_shape' key is updated.
+        """
+
+        if 'img_fields' in results:
+            assert results['img_fields'] == ['img'], \
+                'Only single img_fields is allowed'
+        img = results['img']
+        assert 'bbox_fields' in results
+        boxes = [results[key] for key in results['bbox_fields']]
+        boxes = np.concatenate(boxes, 0)
+        h, w, c = img.shape
+        patch = self._get_patch(boxes, h, w)
+        if patch is None:
+            return results
+
+        # only adjust boxes and instance masks when the gt is not empty
+        if len(boxes) > 0:
+            for key in results.get('bbox_fields', []):
+                boxes = results[key].copy()
+                mask = self._is_center_of_bboxes_in_patch(boxes, patch)
+                boxes = boxes[mask]
+                if self.bbox_clip_border:
+                    boxes[:, 2:] = boxes[:, 2:].clip(max=patch[2:])
+                    boxes[:, :2] = boxes[:, :2].clip(min=patch[:2])
+                boxes -= np.tile(patch[:2], 2)
+
+                results[key] = boxes
+                # labels
+                label_key = self.bbox2label.get(key)
+                if label_key in results:
+                    results[label_key] = results[label_key][mask]
+
+                # mask fields
+                mask_key = self.bbox2mask.get(key)
+                if mask_key in results:
+                    results[mask_key] = results[mask_key][
+                        mask.nonzero()[0]].crop(patch)
+        # adjust the img no matter whether the gt is empty before crop
+        img = img[patch[1]:patch[3], patch[0]:patch[2]]
+        results['img'] = img
+        results['img_shape'] = img.shape
+
+        # seg fields
+        for key in results.get('seg_fields', []):
+            results[key] = results[key][patch[1]:patch[3], patch[0]:patch[2]]
+        return results
 
     def __repr__(self):
         repr_str = self.__class__.__name__
@@ -1956,10 +2127,12 @@ class Mosaic:
 
         loc_strs = ('top_left', 'top_right', 'bottom_left', 'bottom_right')
         for i, loc in enumerate(loc_strs):
+            # the sub-images are only read and pasted into the mosaic, so
+            # they are not copied
             if loc == 'top_left':
-                results_patch = copy.deepcopy(results)
+                results_patch = results
             else:
-                results_patch = copy.deepcopy(results['mix_results'][i - 1])
+                results_patch = results['mix_results'][i - 1]
 
             img_i = results_patch['img']
             h_i, w_i = img_i.shape[:2]
@@ -1985,6 +2158,7 @@ class Mosaic:
             if gt_bboxes_i.shape[0] > 0:
                 padw = x1_p - x1_c
                 padh = y1_p - y1_c
+                gt_bboxes_i = gt_bboxes_i.copy()
                 gt_bboxes_i[:, 0::2] = \
                     scale_ratio_i * gt_bboxes_i[:, 0::2] + padw
                 gt_bboxes_i[:, 1::2] = \
@@ -2205,12 +2379,13 @@ class MixUp:
         is_filp = random.uniform(0, 1) > self.flip_ratio
 
         if len(retrieve_img.shape) == 3:
-            out_img = np.ones(
+            out_img = np.full(
                 (self.dynamic_scale[0], self.dynamic_scale[1], 3),
-                dtype=retrieve_img.dtype) * self.pad_val
+                self.pad_val,
+                dtype=retrieve_img.dtype)
         else:
-            out_img = np.ones(
-                self.dynamic_scale, dtype=retrieve_img.dtype) * self.pad_val
+            out_img = np.full(
+                self.dynamic_scale, self.pad_val, dtype=retrieve_img.dtype)
 
         # 1. keep_ratio resize
         scale_ratio = min(self.dynamic_scale[0] / retrieve_img.shape[0],
@@ -2231,25 +2406,26 @@ class MixUp:
         if is_filp:
             out_img = out_img[:, ::-1, :]
 
-        # 5. random crop
+        # 5. random crop, of the image zero padded to the target size, done
+        # by copying the cropped part into the output canvas
         ori_img = results['img']
         origin_h, origin_w = out_img.shape[:2]
         target_h, target_w = ori_img.shape[:2]
-        padded_img = np.zeros(
-            (max(origin_h, target_h), max(origin_w,
-                                          target_w), 3)).astype(np.uint8)
-        padded_img[:origin_h, :origin_w] = out_img
 
         x_offset, y_offset = 0, 0
-        if padded_img.shape[0] > target_h:
-            y_offset = random.randint(0, padded_img.shape[0] - target_h)
-        if padded_img.shape[1] > target_w:
-            x_offset = random.randint(0, padded_img.shape[1] - target_w)
-        padded_cropped_img = padded_img[y_offset:y_offset + target_h,
-                                        x_offset:x_offset + target_w]
-
-        # 6. adjust bbox
-        retrieve_gt_bboxes = retrieve_results['gt_bboxes']
+        if origin_h > target_h:
+            y_offset = random.randint(0, origin_h - target_h)
+        if origin_w > target_w:
+            x_offset = random.randint(0, origin_w - target_w)
+        padded_cropped_img = np.zeros(
+            (target_h, target_w) + out_img.shape[2:], dtype=np.uint8)
+        cropped_img = out_img[y_offset:y_offset + target_h,
+                              x_offset:x_offset + target_w]
+        padded_cropped_img[:cropped_img.shape[0], :cropped_img.
+                           shape[1]] = cropped_img
+
+        # 6. adjust bbox, the retrieved sample is left untouched
+        retrieve_gt_bboxes = retrieve_results['gt_bboxes'].copy()
         retrieve_gt_bboxes[:, 0::2] = np.clip(
             retrieve_gt_bboxes[:, 0::2] * scale_ratio, 0, origin_w)
         retrieve_gt_bboxes[:, 1::2] = np.clip(
@@ -2270,9 +2446,10 @@ class MixUp:
 
         # 8. mix up
         if keep_list.sum() >= 1.0:
-            ori_img = ori_img.astype(np.float32)
-            mixup_img = 0.5 * ori_img + 0.5 * padded_cropped_img.astype(
-                np.float32)
+            # blended in place in a single float copy of the image
+            mixup_img = ori_img.astype(np.float32)
+            mixup_img += padded_cropped_img
+            mixup_img *= 0.5
 
             retrieve_gt_labels = retrieve_results['gt_labels'][keep_list]
             retrieve_gt_bboxes = cp_retrieve_gt_bboxes[keep_list]
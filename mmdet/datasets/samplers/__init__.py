@@ -1,4 +1,11 @@
+from .bucket_sampler import (AspectRatioGroupSampler,
+                             DistributedAspectRatioGroupSampler,
+                             ReorderedResults)
 from .distributed_sampler import DistributedSampler
 from .group_sampler import DistributedGroupSampler, GroupSampler
 
-__all__ = ['DistributedSampler', 'DistributedGroupSampler', 'GroupSampler']
+__all__ = [
+    'DistributedSampler', 'DistributedGroupSampler', 'GroupSampler',
+    'AspectRatioGroupSampler', 'DistributedAspectRatioGroupSampler',
+    'ReorderedResults'
+]
@@ -0,0 +1,323 @@
+from collections.abc import Sequence
+
+import numpy as np
+import torch
+from mmcv.runner import get_dist_info
+
+from mmdet.utils import get_root_logger
+from .group_sampler import DistributedGroupSampler, GroupSampler
+
+# boundaries of the aspect ratio (w / h) buckets, from 1:2 to 2:1
+DEFAULT_RATIO_BINS = (1 / 2, 2 / 3, 3 / 4, 1, 4 / 3, 3 / 2, 2)
+
+
+def get_img_shapes(dataset):
+    """Get the (h, w) of the images of a dataset from its ``data_infos``,
+    looking into the dataset wrappers.
+
+    Returns:
+        np.ndarray | None: Array of shape (N, 2), or None if the sizes are
+            not known.
+    """
+    if hasattr(dataset, 'datasets'):
+        shapes = [get_img_shapes(d) for d in dataset.datasets]
+        if any(s is None for s in shapes):
+            return None
+        return np.concatenate(shapes)
+    if hasattr(dataset, 'dataset'):
+        shapes = get_img_shapes(dataset.dataset)
+        if shapes is None:
+            return None
+        if hasattr(dataset, 'repeat_indices'):
+            # ClassBalancedDataset
+            return shapes[np.asarray(dataset.repeat_indices)]
+        if hasattr(dataset, 'times'):
+            # RepeatDataset
+            return np.tile(shapes, (dataset.times, 1))
+        return shapes
+    data_infos = getattr(dataset, 'data_infos', None)
+    if data_infos is None or not all('width' in info and 'height' in info
+                                     for info in data_infos):
+        return None
+    return np.array([(info['height'], info['width']) for info in data_infos],
+                    dtype=np.float64).reshape(-1, 2)
+
+
+def rescale_shapes(shapes, img_scale):
+    """Rescale (h, w) shapes to fit in a scale, like :obj:`Resize` with
+    ``keep_ratio=True``."""
+    long_edge, short_edge = max(img_scale), min(img_scale)
+    scale = np.minimum(long_edge / shapes.max(1), short_edge / shapes.min(1))
+    return np.round(shapes * scale[:, None])
+
+
+def get_bucket_flags(shapes,
+                     ratio_bins=DEFAULT_RATIO_BINS,
+                     size_bins=(),
+                     min_bucket_size=1):
+    """Group images by bins of aspect ratio and size.
+
+    The buckets are ordered by aspect ratio, then by size. The buckets with
+    less than ``min_bucket_size`` images are merged with the next ones, so
+    that the groups are not mostly padded with repeated images.
+
+    Args:
+        shapes (np.ndarray): (h, w) of the images, of shape (N, 2).
+        ratio_bins (Sequence[float]): Boundaries of the aspect ratio (w / h)
+            bins.
+        size_bins (Sequence[float]): Boundaries of the size bins, the size
+            being the square root of the area. Default: ().
+        min_bucket_size (int): Minimum number of images of a group.
+            Default: 1.
+
+    Returns:
+        np.ndarray: Group of every image, from 0 to the number of groups - 1.
+    """
+    h, w = shapes[:, 0], shapes[:, 1]
+    ratio_ids = np.digitize(w / h, ratio_bins)
+    size_ids = np.digitize(np.sqrt(w * h), size_bins)
+    keys = ratio_ids * (len(size_bins) + 1) + size_ids
+    buckets, counts = np.unique(keys, return_counts=True)
+
+    groups = np.zeros(len(buckets), dtype=np.int64)
+    group, group_size = 0, 0
+    for i, count in enumerate(counts):
+        groups[i] = group
+        group_size += count
+        if group_size >= min_bucket_size:
+            group += 1
+            group_size = 0
+    if 0 < group_size and group > 0:
+        # the last images are too few for a group of their own
+        groups[groups == group] = group - 1
+    return groups[np.searchsorted(buckets, keys)]
+
+
+def padding_overhead(shapes, indices, samples_per_gpu, size_divisor=32):
+    """Get the ratio of padded pixels over image pixels of the batches of
+    consecutive indices, padded to the largest image of the batch and to
+    ``size_divisor``."""
+    shapes = shapes[np.asarray(indices, dtype=np.int64)]
+    if len(shapes) == 0:
+        return 0.
+    padded = 0.
+    for start in range(0, len(shapes), samples_per_gpu):
+        batch = shapes[start:start + samples_per_gpu]
+        h, w = np.ceil(batch.max(0) / size_divisor) * size_divisor
+        padded += h * w * len(batch)
+    return padded / shapes.prod(1).sum() - 1
+
+
+class ReorderedResults(Sequence):
+    """Read-only view of a sequence of results in another order.
+
+    Nothing is read from the results until an item is accessed, so that
+    lazy sequences such as :obj:`ShardedResults` stay lazy.
+
+    Args:
+        results (Sequence): Results to reorder.
+        inds (np.ndarray): Index in ``results`` of every item of the view.
+    """
+
+    def __init__(self, results, inds):
+        self.results = results
+        self.inds = inds
+
+    def __len__(self):
+        return len(self.inds)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return self.results[int(self.inds[idx])]
+
+
+class _BucketMixin:
+    """Buckets of a group sampler, and the report of their padding."""
+
+    def _get_bucket_flags(self, dataset, num_replicas, ratio_bins, size_bins,
+                          img_scale, min_bucket_size):
+        shapes = get_img_shapes(dataset)
+        assert shapes is not None and len(shapes) == len(dataset), \
+            'the sizes of the images must be in the data_infos of the dataset'
+        if img_scale is not None:
+            shapes = rescale_shapes(shapes, img_scale)
+        if min_bucket_size is None:
+            min_bucket_size = 4 * self.samples_per_gpu * num_replicas
+        self.shapes = shapes
+        return get_bucket_flags(shapes, ratio_bins, size_bins,
+                                min_bucket_size)
+
+    def _sample_epoch(self, sampler):
+        # the random state is restored not to change the sampled epochs
+        np_state = np.random.get_state()
+        torch_state = torch.random.get_rng_state()
+        try:
+            return list(iter(sampler))
+        finally:
+            np.random.set_state(np_state)
+            torch.random.set_rng_state(torch_state)
+
+    def report(self, baseline, size_divisor=32):
+        """Get the number of buckets and the padding overhead of an epoch.
+
+        Args:
+            baseline (Sampler): Sampler of the same images grouped by
+                orientation only.
+            size_divisor (int): The divisor of the padded size of the images.
+                Default: 32.
+
+        Returns:
+            dict: ``num_buckets``, ``padding_overhead`` and
+                ``baseline_padding_overhead``, the ratios of padded pixels
+                over image pixels.
+        """
+        return dict(
+            num_buckets=len(np.unique(self.flag)),
+            padding_overhead=padding_overhead(self.shapes,
+                                              self._sample_epoch(self),
+                                              self.samples_per_gpu,
+                                              size_divisor),
+            baseline_padding_overhead=padding_overhead(
+                self.shapes, self._sample_epoch(baseline),
+                self.samples_per_gpu, size_divisor))
+
+    def _log_report(self, report):
+        logger = get_root_logger()
+        logger.info(
+            f'{self.__class__.__name__}: {report["num_buckets"]} buckets, '
+            f'padding overhead {report["padding_overhead"]:.1%} instead of '
+            f'{report["baseline_padding_overhead"]:.1%} with the groups of '
+            'landscape and portrait images')
+
+
+class AspectRatioGroupSampler(_BucketMixin, GroupSampler):
+    """Sampler of batches of images of similar aspect ratio and size.
+
+    Like :obj:`GroupSampler`, but the groups are finer bins of aspect ratio
+    and size computed from the ``data_infos`` of the dataset, so that the
+    batches are padded less. Without shuffling, the images are sampled once
+    in the order of the buckets, for batched inference, and
+    :meth:`restore_order` puts the results back in the order of the
+    dataset.
+
+    Arguments:
+        dataset: Dataset used for sampling.
+        samples_per_gpu (int): Batch size. Default: 1.
+        ratio_bins (Sequence[float]): Boundaries of the aspect ratio (w / h)
+            bins. Default: from 1:2 to 2:1.
+        size_bins (Sequence[float]): Boundaries of the size bins, the size
+            being the square root of the area after rescaling to
+            ``img_scale``. Default: ().
+        img_scale (tuple[int], optional): Scale the images are resized to
+            with the aspect ratio kept by the pipeline, to compute their
+            size and padding.
+        min_bucket_size (int, optional): Minimum number of images of a
+            group. Defaults to 4 batches.
+        shuffle (bool): Whether to shuffle the batches. Default: True.
+        report (bool): Whether to log the padding overhead of an epoch, and
+            the one with the groups of landscape and portrait images.
+            Default: True.
+    """
+
+    def __init__(self,
+                 dataset,
+                 samples_per_gpu=1,
+                 ratio_bins=DEFAULT_RATIO_BINS,
+                 size_bins=(),
+                 img_scale=None,
+                 min_bucket_size=None,
+                 shuffle=True,
+                 report=True):
+        self.samples_per_gpu = samples_per_gpu
+        flag = self._get_bucket_flags(dataset, 1, ratio_bins, size_bins,
+                                      img_scale, min_bucket_size)
+        super(AspectRatioGroupSampler, self).__init__(dataset,
+                                                      samples_per_gpu, flag)
+        self.shuffle = shuffle
+        if not shuffle:
+            self.num_samples = len(dataset)
+        if report:
+            baseline_flag = self.shapes[:, 1] > self.shapes[:, 0]
+            if shuffle:
+                baseline = GroupSampler(dataset, samples_per_gpu,
+                                        baseline_flag)
+            else:
+                baseline = range(len(dataset))
+            self._log_report(self.report(baseline))
+
+    def __iter__(self):
+        if self.shuffle:
+            return super(AspectRatioGroupSampler, self).__iter__()
+        return iter(self.get_order().tolist())
+
+    def get_order(self):
+        """Get the indices sampled without shuffling, by bucket."""
+        return np.argsort(self.flag, kind='stable')
+
+    def restore_order(self, results):
+        """Put the results of the samples of an epoch without shuffling
+        back in the order of the dataset.
+
+        Returns:
+            ReorderedResults: Lazy view of the results in the order of the
+                dataset.
+        """
+        assert not self.shuffle and len(results) == len(self.flag)
+        return ReorderedResults(results, np.argsort(self.get_order()))
+
+
+class DistributedAspectRatioGroupSampler(_BucketMixin,
+                                         DistributedGroupSampler):
+    """Distributed sampler of batches of images of similar aspect ratio and
+    size.
+
+    Like :obj:`DistributedGroupSampler`, with the groups of
+    :obj:`AspectRatioGroupSampler`.
+
+    Arguments:
+        dataset: Dataset used for sampling.
+        samples_per_gpu (int): Batch size of every process. Default: 1.
+        num_replicas (optional): Number of processes participating in
+            distributed training.
+        rank (optional): Rank of the current process within num_replicas.
+        ratio_bins (Sequence[float]): Boundaries of the aspect ratio (w / h)
+            bins. Default: from 1:2 to 2:1.
+        size_bins (Sequence[float]): Boundaries of the size bins.
+            Default: ().
+        img_scale (tuple[int], optional): Scale the images are resized to
+            with the aspect ratio kept by the pipeline.
+        min_bucket_size (int, optional): Minimum number of images of a
+            group. Defaults to 4 batches of all the processes.
+        report (bool): Whether to log the padding overhead of an epoch of
+            the process. Default: True.
+    """
+
+    def __init__(self,
+                 dataset,
+                 samples_per_gpu=1,
+                 num_replicas=None,
+                 rank=None,
+                 ratio_bins=DEFAULT_RATIO_BINS,
+                 size_bins=(),
+                 img_scale=None,
+                 min_bucket_size=None,
+                 report=True):
+        _rank, _num_replicas = get_dist_info()
+        if num_replicas is None:
+            num_replicas = _num_replicas
+        if rank is None:
+            rank = _rank
+        self.samples_per_gpu = samples_per_gpu
+        flag = self._get_bucket_flags(dataset, num_replicas, ratio_bins,
+                                      size_bins, img_scale, min_bucket_size)
+        super(DistributedAspectRatioGroupSampler,
+              self).__init__(dataset, samples_per_gpu, num_replicas, rank,
+                             flag)
+        if report:
+            baseline_flag = (self.shapes[:, 1] >
+                             self.shapes[:, 0]).astype(np.int64)
+            baseline = DistributedGroupSampler(dataset, samples_per_gpu,
+                                               self.num_replicas, self.rank,
+                                               baseline_flag)
+            self._log_report(self.report(baseline))
@@ -8,12 +8,22 @@ from torch.utils.data import Sampler
 
 
 class GroupSampler(Sampler):
+    """Sampler of batches of images of the same group.
 
-    def __init__(self, dataset, samples_per_gpu=1):
-        assert hasattr(dataset, 'flag')
+    Arguments:
+        dataset: Dataset used for sampling.
+        samples_per_gpu (int): Batch size. Default: 1.
+        flag (np.ndarray, optional): Group of every sample. Defaults to the
+            ``flag`` of the dataset.
+    """
+
+    def __init__(self, dataset, samples_per_gpu=1, flag=None):
+        if flag is None:
+            assert hasattr(dataset, 'flag')
+            flag = dataset.flag
         self.dataset = dataset
         self.samples_per_gpu = samples_per_gpu
-        self.flag = dataset.flag.astype(np.int64)
+        self.flag = flag.astype(np.int64)
         self.group_sizes = np.bincount(self.flag)
         self.num_samples = 0
         for i, size in enumerate(self.group_sizes):
@@ -64,13 +74,16 @@ class DistributedGroupSampler(Sampler):
         num_replicas (optional): Number of processes participating in
             distributed training.
         rank (optional): Rank of the current process within num_replicas.
+        flag (np.ndarray, optional): Group of every sample. Defaults to the
+            ``flag`` of the dataset.
     """
 
     def __init__(self,
                  dataset,
                  samples_per_gpu=1,
                  num_replicas=None,
-                 rank=None):
+                 rank=None,
+                 flag=None):
         _rank, _num_replicas = get_dist_info()
         if num_replicas is None:
             num_replicas = _num_replicas
@@ -82,8 +95,10 @@ class DistributedGroupSampler(Sampler):
         self.rank = rank
         self.epoch = 0
 
-        assert hasattr(self.dataset, 'flag')
-        self.flag = self.dataset.flag
+        if flag is None:
+            assert hasattr(self.dataset, 'flag')
+            flag = self.dataset.flag
+        self.flag = flag
         self.group_sizes = np.bincount(self.flag)
 
         self.num_samples = 0
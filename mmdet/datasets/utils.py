@@ -8,10 +8,13 @@ import copy
 import warnings
 
 from mmcv.cnn import VGG
+from mmcv.runner import get_dist_info
 from mmcv.runner.hooks import HOOKS, Hook
 
 from mmdet.models.dense_heads import GARPNHead, RPNHead
 from mmdet.models.roi_heads.mask_heads import FusedSemanticHead
+from .pipelines.profiler import (PipelineProfiler, format_pipeline_summary,
+                                 get_pipeline_profiler)
 
 
 def replace_ImageToTensor(pipelines):
@@ -74,6 +77,84 @@ def replace_ImageToTensor(pipelines):
     return pipelines
 
 
+def fuse_resize_normalize_pad(pipelines, dtype='float32'):
+    """Replace the ``Resize``, ``RandomFlip``, ``Normalize`` and ``Pad``
+    transforms followed by the formatting of the image in a data pipeline by
+    a ``ResizeNormalizePad`` transform, which gives the same outputs with
+    fewer copies of the image.
+
+    ``Resize`` and ``RandomFlip`` are optional, ``Normalize`` must be
+    directly followed by ``Pad`` and then by ``DefaultFormatBundle`` or
+    ``ImageToTensor``. Other sequences are left unchanged.
+
+    Args:
+        pipelines (list[dict]): Data pipeline configs.
+        dtype (str): Type of the fused output image. Default: 'float32'.
+
+    Returns:
+        list: The new pipeline list with the fused transforms.
+
+    Examples:
+        >>> img_norm_cfg = dict(mean=[0, 0, 0], std=[1, 1, 1])
+        >>> pipelines = [
+        ...    dict(type='LoadImageFromFile'),
+        ...    dict(type='Resize', img_scale=(1333, 800), keep_ratio=True),
+        ...    dict(type='RandomFlip', flip_ratio=0.5),
+        ...    dict(type='Normalize', **img_norm_cfg),
+        ...    dict(type='Pad', size_divisor=32),
+        ...    dict(type='DefaultFormatBundle'),
+        ...    dict(type='Collect', keys=['img'])
+        ...    ]
+        >>> expected_pipelines = [
+        ...    dict(type='LoadImageFromFile'),
+        ...    dict(
+        ...        type='ResizeNormalizePad',
+        ...        resize=dict(img_scale=(1333, 800), keep_ratio=True),
+        ...        flip=dict(flip_ratio=0.5),
+        ...        normalize=img_norm_cfg,
+        ...        pad=dict(size_divisor=32),
+        ...        dtype='float32'),
+        ...    dict(type='DefaultFormatBundle'),
+        ...    dict(type='Collect', keys=['img'])
+        ...    ]
+        >>> assert expected_pipelines == fuse_resize_normalize_pad(pipelines)
+    """
+
+    def args(cfg):
+        return {k: v for k, v in cfg.items() if k != 'type'}
+
+    pipelines = copy.deepcopy(pipelines)
+    for pipeline in pipelines:
+        if pipeline['type'] == 'MultiScaleFlipAug':
+            assert 'transforms' in pipeline
+            pipeline['transforms'] = fuse_resize_normalize_pad(
+                pipeline['transforms'], dtype)
+
+    types = [pipeline['type'] for pipeline in pipelines] + [None] * 3
+    fused_pipelines = []
+    i = 0
+    while i < len(pipelines):
+        j = i
+        fused = dict(type='ResizeNormalizePad')
+        if types[j] == 'Resize':
+            fused['resize'] = args(pipelines[j])
+            j += 1
+        if types[j] == 'RandomFlip':
+            fused['flip'] = args(pipelines[j])
+            j += 1
+        if types[j:j + 3] in (['Normalize', 'Pad', 'DefaultFormatBundle'],
+                              ['Normalize', 'Pad', 'ImageToTensor']):
+            fused['normalize'] = args(pipelines[j])
+            fused['pad'] = args(pipelines[j + 1])
+            fused['dtype'] = dtype
+            fused_pipelines.append(fused)
+            i = j + 2
+        else:
+            fused_pipelines.append(pipelines[i])
+            i += 1
+    return fused_pipelines
+
+
 def get_loading_pipeline(pipeline):
     """Only keep loading image and annotations related configuration.
 
@@ -157,3 +238,45 @@ class NumClassCheckHook(Hook):
             runner (obj:`EpochBasedRunner`): Epoch based Runner.
         """
         self._check_head(runner)
+
+
+@HOOKS.register_module()
+class PipelineProfilerHook(Hook):
+    """Log the statistics of the transforms of the data pipelines.
+
+    The statistics of this process and its dataloader workers are recorded
+    when the profiling is enabled by ``pipeline_profile`` in the config, see
+    :func:`enable_pipeline_profiling`. The other jobs using the same
+    ``stats_dir`` are left out.
+
+    Args:
+        interval (int): Logging interval in iterations. Default: 50.
+        stats_dir (str, optional): Directory of the statistics. Defaults to
+            the one of the profiler of this process.
+        reset (bool): Whether to reset the statistics of this process after
+            logging them, so that every table covers one interval.
+            Default: False.
+    """
+
+    def __init__(self, interval=50, stats_dir=None, reset=False):
+        self.interval = interval
+        self.stats_dir = stats_dir
+        self.reset = reset
+
+    def after_train_iter(self, runner):
+        if not self.every_n_iters(runner, self.interval):
+            return
+        profiler = get_pipeline_profiler()
+        if profiler is None:
+            return
+        stats_dir = self.stats_dir
+        if stats_dir is None:
+            stats_dir = profiler.stats_dir
+        rank, _ = get_dist_info()
+        if rank == 0:
+            summary = PipelineProfiler.summary(stats_dir, profiler.main_pid)
+            if summary:
+                runner.logger.info('Data pipeline profile:\n' +
+                                   format_pipeline_summary(summary))
+        if self.reset and profiler is not None:
+            profiler.reset()
@@ -4,6 +4,8 @@
 # Copyright (C) 2020-2021 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 #
+import hashlib
+import os
 import os.path as osp
 import defusedxml.ElementTree as ET
 
@@ -64,6 +66,18 @@ class XMLDataset(CustomDataset):
 
         return data_infos
 
+    def _dataset_cache_params(self):
+        """The XML files are read while loading, so their sizes and
+        modification times key the dataset cache too."""
+        md5 = hashlib.md5()
+        for img_id in mmcv.list_from_file(self.ann_file):
+            xml_path = osp.join(self.img_prefix, 'Annotations',
+                                f'{img_id}.xml')
+            stat = os.stat(xml_path)
+            md5.update(
+                f'{img_id} {stat.st_size} {stat.st_mtime_ns}\n'.encode())
+        return dict(xml_files=md5.hexdigest())
+
     def _filter_imgs(self, min_size=32):
         """Filter images too small or without annotation."""
         valid_inds = []
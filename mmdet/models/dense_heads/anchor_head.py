@@ -9,7 +9,9 @@ import torch.nn as nn
 from mmcv.cnn import normal_init
 from mmcv.runner import force_fp32
 
-from mmdet.core import (anchor_inside_flags, build_anchor_generator,
+from mmdet.core import (AssignResult, BboxOverlaps2D, DeltaXYWHBBoxCoder,
+                        MaxIoUAssigner, PseudoSampler, RandomSampler,
+                        anchor_inside_flags, build_anchor_generator,
                         build_assigner, build_bbox_coder, build_sampler,
                         images_to_levels, multi_apply, multiclass_nms, unmap)
 from mmdet.core.utils.misc import topk
@@ -36,7 +38,10 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             using `IoULoss`, `GIoULoss`, or `DIoULoss` in the bbox head.
         loss_cls (dict): Config of classification loss.
         loss_bbox (dict): Config of localization loss.
-        train_cfg (dict): Training config of anchor head.
+        train_cfg (dict): Training config of anchor head. With
+            ``batched_targets=True``, the targets of all the images are
+            computed at once when possible, see
+            :meth:`_get_targets_batched`.
         test_cfg (dict): Testing config of anchor head.
     """  # noqa: W605
 
@@ -170,12 +175,10 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             featmap_sizes, device)
         anchor_list = [multi_level_anchors for _ in range(num_imgs)]
 
-        # for each image, we compute valid flags of multi level anchors
-        valid_flag_list = []
-        for img_id, img_meta in enumerate(img_metas):
-            multi_level_flags = self.anchor_generator.valid_flags(
-                featmap_sizes, img_meta['pad_shape'], device)
-            valid_flag_list.append(multi_level_flags)
+        # valid flags of multi level anchors of all the images at once
+        valid_flag_list = self.anchor_generator.batch_valid_flags(
+            featmap_sizes, [img_meta['pad_shape'] for img_meta in img_metas],
+            device)
 
         return anchor_list, valid_flag_list
 
@@ -278,6 +281,164 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
         return (labels, label_weights, bbox_targets, bbox_weights, pos_inds,
                 neg_inds, sampling_result)
 
+    def _can_batch_targets(self, unmap_outputs=True):
+        """Whether the targets of the images can be computed at once by
+        :meth:`_get_targets_batched`.
+
+        The batched assignment holds the overlaps of all the images at once,
+        so an assigner bounding them with ``tile_elements`` assigns the
+        images one by one instead. The padded gts of the images are
+        compared with :obj:`BboxOverlaps2D`, and the targets of the positive
+        anchors of all the images are encoded at once, which only
+        :obj:`DeltaXYWHBBoxCoder` is known to support.
+        """
+        sampler = getattr(self, 'sampler', None)
+        return (self.train_cfg.get('batched_targets', False) and unmap_outputs
+                and type(self)._get_targets_single is
+                AnchorHead._get_targets_single
+                and type(self.assigner) is MaxIoUAssigner
+                and self.assigner.tile_elements <= 0
+                and type(self.assigner.iou_calculator) is BboxOverlaps2D
+                and (self.reg_decoded_bbox
+                     or type(self.bbox_coder) is DeltaXYWHBBoxCoder)
+                and (type(sampler) is PseudoSampler or
+                     (type(sampler) is RandomSampler
+                      and not sampler.add_gt_as_proposals)))
+
+    def _get_targets_batched(self,
+                             anchors,
+                             valid_flags,
+                             gt_bboxes_list,
+                             gt_bboxes_ignore_list,
+                             gt_labels_list,
+                             img_metas,
+                             return_sampling_results=False):
+        """Compute regression and classification targets for anchors in
+        multiple images at once.
+
+        The results are the ones of :meth:`_get_targets_single` with
+        ``unmap_outputs=True`` for every image, with a :obj:`MaxIoUAssigner`
+        and a :obj:`PseudoSampler` or :obj:`RandomSampler`. The overlaps,
+        assignments and targets of all the images are computed with a few
+        tensor operations, only the sampling results are built image by
+        image, when they are random or returned.
+
+        Args:
+            anchors (Tensor): Anchors of the images, of shape
+                (num_imgs, num_anchors, 4).
+            valid_flags (Tensor): Valid flags of the anchors of the images,
+                of shape (num_imgs, num_anchors).
+            gt_bboxes_list (list[Tensor]): Ground truth bboxes of each image.
+            gt_bboxes_ignore_list (list[Tensor]): Ground truth bboxes to be
+                ignored of each image.
+            gt_labels_list (list[Tensor]): Ground truth labels of each image.
+            img_metas (list[dict]): Meta info of each image.
+            return_sampling_results (bool): Whether to build the sampling
+                results of the images.
+
+        Returns:
+            tuple | None: None if an image has no valid anchor, otherwise:
+
+                - labels (Tensor): Labels of all the anchors.
+                - label_weights (Tensor): Label weights of all the anchors.
+                - bbox_targets (Tensor): BBox targets of all the anchors.
+                - bbox_weights (Tensor): BBox weights of all the anchors.
+                - num_pos_list (list[int]): Number of positive samples of \
+                    each image.
+                - num_neg_list (list[int]): Number of negative samples of \
+                    each image.
+                - sampling_results_list (list[:obj:`SamplingResult`] | \
+                    None): Sampling results of each image.
+        """
+        num_imgs, num_anchors = anchors.shape[:2]
+        allowed_border = self.train_cfg.allowed_border
+        if allowed_border >= 0:
+            img_shapes = anchors.new_tensor(
+                [img_meta['img_shape'][:2] for img_meta in img_metas])
+            img_h, img_w = img_shapes[:, 0:1], img_shapes[:, 1:2]
+            inside_flags = valid_flags & \
+                (anchors[..., 0] >= -allowed_border) & \
+                (anchors[..., 1] >= -allowed_border) & \
+                (anchors[..., 2] < img_w + allowed_border) & \
+                (anchors[..., 3] < img_h + allowed_border)
+        else:
+            inside_flags = valid_flags
+        if not inside_flags.any(dim=1).all():
+            return None
+
+        gt_inds, max_overlaps = self.assigner.batch_assign(
+            anchors, gt_bboxes_list, gt_bboxes_ignore_list, inside_flags)
+        if self.sampling or return_sampling_results:
+            # sample the images in order, to draw the same random samples
+            pos_flags = torch.zeros_like(inside_flags)
+            neg_flags = torch.zeros_like(inside_flags)
+            sampling_results_list = []
+            for i in range(num_imgs):
+                inside_inds = torch.nonzero(
+                    inside_flags[i], as_tuple=False).squeeze(1)
+                img_gt_inds = gt_inds[i, inside_inds]
+                assigned_labels = None
+                if not self.sampling and gt_labels_list[i] is not None:
+                    assigned_labels = img_gt_inds.new_full(
+                        img_gt_inds.shape, -1)
+                    img_pos = img_gt_inds > 0
+                    assigned_labels[img_pos] = gt_labels_list[i][
+                        img_gt_inds[img_pos] - 1]
+                assign_result = AssignResult(
+                    len(gt_bboxes_list[i]),
+                    img_gt_inds,
+                    max_overlaps[i, inside_inds],
+                    labels=assigned_labels)
+                sampling_result = self.sampler.sample(
+                    assign_result, anchors[i, inside_inds], gt_bboxes_list[i])
+                pos_flags[i, inside_inds[sampling_result.pos_inds]] = True
+                neg_flags[i, inside_inds[sampling_result.neg_inds]] = True
+                sampling_results_list.append(sampling_result)
+        else:
+            pos_flags = gt_inds > 0
+            neg_flags = gt_inds == 0
+            sampling_results_list = None
+
+        bbox_targets = torch.zeros_like(anchors)
+        bbox_weights = torch.zeros_like(anchors)
+        labels = anchors.new_full((num_imgs, num_anchors),
+                                  self.num_classes,
+                                  dtype=torch.long)
+        label_weights = anchors.new_zeros((num_imgs, num_anchors),
+                                          dtype=torch.float)
+
+        pos_img_inds, pos_inds = torch.nonzero(pos_flags, as_tuple=True)
+        if len(pos_inds) > 0:
+            # index of the assigned gts in the gts of all the images
+            gt_offsets = gt_inds.new_tensor(
+                [0] + [len(gt_bboxes) for gt_bboxes in gt_bboxes_list[:-1]])
+            pos_gt_inds = gt_offsets.cumsum(0)[pos_img_inds] + \
+                gt_inds[pos_img_inds, pos_inds] - 1
+            pos_gt_bboxes = torch.cat(gt_bboxes_list)[pos_gt_inds]
+            if not self.reg_decoded_bbox:
+                pos_bbox_targets = self.bbox_coder.encode(
+                    anchors[pos_img_inds, pos_inds], pos_gt_bboxes)
+            else:
+                pos_bbox_targets = pos_gt_bboxes
+            bbox_targets[pos_img_inds, pos_inds] = pos_bbox_targets
+            bbox_weights[pos_img_inds, pos_inds] = 1.0
+            if gt_labels_list[0] is None:
+                # Only rpn gives gt_labels as None
+                # Foreground is the first class since v2.5.0
+                labels[pos_img_inds, pos_inds] = 0
+            else:
+                labels[pos_img_inds, pos_inds] = torch.cat(
+                    gt_labels_list)[pos_gt_inds]
+            pos_weight = self.train_cfg.pos_weight
+            label_weights[pos_img_inds,
+                          pos_inds] = 1.0 if pos_weight <= 0 else pos_weight
+        label_weights[neg_flags] = 1.0
+
+        num_pos_list = pos_flags.sum(dim=1).tolist()
+        num_neg_list = neg_flags.sum(dim=1).tolist()
+        return (labels, label_weights, bbox_targets, bbox_weights,
+                num_pos_list, num_neg_list, sampling_results_list)
+
     def get_targets(self,
                     anchor_list,
                     valid_flag_list,
@@ -328,6 +489,7 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
         """
         num_imgs = len(img_metas)
         assert len(anchor_list) == len(valid_flag_list) == num_imgs
+        batched = self._can_batch_targets(unmap_outputs)
 
         # anchor number of multi levels
         num_level_anchors = [anchors.size(0) for anchors in anchor_list[0]]
@@ -344,25 +506,42 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             gt_bboxes_ignore_list = [None for _ in range(num_imgs)]
         if gt_labels_list is None:
             gt_labels_list = [None for _ in range(num_imgs)]
-        results = multi_apply(
-            self._get_targets_single,
-            concat_anchor_list,
-            concat_valid_flag_list,
-            gt_bboxes_list,
-            gt_bboxes_ignore_list,
-            gt_labels_list,
-            img_metas,
-            label_channels=label_channels,
-            unmap_outputs=unmap_outputs)
-        (all_labels, all_label_weights, all_bbox_targets, all_bbox_weights,
-         pos_inds_list, neg_inds_list, sampling_results_list) = results[:7]
-        rest_results = list(results[7:])  # user-added return values
-        # no valid anchors
-        if any([labels is None for labels in all_labels]):
-            return None
+        if batched:
+            results = self._get_targets_batched(
+                torch.stack(concat_anchor_list),
+                torch.stack(concat_valid_flag_list), gt_bboxes_list,
+                gt_bboxes_ignore_list, gt_labels_list, img_metas,
+                return_sampling_results)
+            # no valid anchors
+            if results is None:
+                return None
+            (all_labels, all_label_weights, all_bbox_targets,
+             all_bbox_weights, num_pos_list, num_neg_list,
+             sampling_results_list) = results
+            rest_results = []
+        else:
+            results = multi_apply(
+                self._get_targets_single,
+                concat_anchor_list,
+                concat_valid_flag_list,
+                gt_bboxes_list,
+                gt_bboxes_ignore_list,
+                gt_labels_list,
+                img_metas,
+                label_channels=label_channels,
+                unmap_outputs=unmap_outputs)
+            (all_labels, all_label_weights, all_bbox_targets,
+             all_bbox_weights, pos_inds_list, neg_inds_list,
+             sampling_results_list) = results[:7]
+            rest_results = list(results[7:])  # user-added return values
+            # no valid anchors
+            if any([labels is None for labels in all_labels]):
+                return None
+            num_pos_list = [inds.numel() for inds in pos_inds_list]
+            num_neg_list = [inds.numel() for inds in neg_inds_list]
         # sampled anchors of all images
-        num_total_pos = sum([max(inds.numel(), 1) for inds in pos_inds_list])
-        num_total_neg = sum([max(inds.numel(), 1) for inds in neg_inds_list])
+        num_total_pos = sum([max(num, 1) for num in num_pos_list])
+        num_total_neg = sum([max(num, 1) for num in num_neg_list])
         # split targets to a list w.r.t. multiple levels
         labels_list = images_to_levels(all_labels, num_level_anchors)
         label_weights_list = images_to_levels(all_label_weights,
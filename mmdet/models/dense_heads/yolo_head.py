@@ -365,11 +365,8 @@ class YOLOV3Head(BaseDenseHead, BBoxTestMixin):
             featmap_sizes, device)
         anchor_list = [multi_level_anchors for _ in range(num_imgs)]
 
-        responsible_flag_list = []
-        for img_id in range(len(img_metas)):
-            responsible_flag_list.append(
-                self.anchor_generator.responsible_flags(
-                    featmap_sizes, gt_bboxes[img_id], device))
+        responsible_flag_list = self.anchor_generator.batch_responsible_flags(
+            featmap_sizes, gt_bboxes, device)
 
         target_maps_list, neg_maps_list = self.get_targets(
             anchor_list, responsible_flag_list, gt_bboxes, gt_labels)
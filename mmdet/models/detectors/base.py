@@ -33,6 +33,8 @@ class BaseDetector(nn.Module, metaclass=ABCMeta):
         self.fp16_enabled = False
         self.img_metas = None
         self.forward_backup = None
+        # batched augmentation of the training batches, see BatchAugment
+        self.batch_augment = None
 
     @property
     def with_neck(self):
@@ -324,6 +326,8 @@ class BaseDetector(nn.Module, metaclass=ABCMeta):
                 DDP, it means the batch size on each GPU), which is used for \
                 averaging the logs.
         """
+        if self.batch_augment is not None:
+            data = self.batch_augment(data)
         losses = self(**data)
         loss, log_vars = self._parse_losses(losses)
 
@@ -414,6 +418,10 @@ class BaseDetector(nn.Module, metaclass=ABCMeta):
             segms = mmcv.concat_list(segm_result)
             if isinstance(segms[0], torch.Tensor):
                 segms = torch.stack(segms, dim=0).detach().cpu().numpy()
+            elif isinstance(segms[0], dict):
+                # RLE-encoded masks
+                segms = maskUtils.decode(segms).astype(bool)
+                segms = segms.transpose(2, 0, 1)
             else:
                 segms = np.stack(segms, axis=0)
         # if out_file specified, do not show image in window
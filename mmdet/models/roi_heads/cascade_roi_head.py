@@ -467,7 +467,9 @@ class CascadeRoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
                 det_masks,
                 num_classes,
                 mask_thr_binary=self.test_cfg.mask_thr_binary,
-                img_size=(img_h, img_w))
+                img_size=(img_h, img_w),
+                encode=self.test_cfg.get('mask_output') == 'rle',
+                num_workers=self.test_cfg.get('mask_paste_workers', 0))
             return bbox_results, segm_results
 
         return bbox_results
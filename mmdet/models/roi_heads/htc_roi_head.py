@@ -616,7 +616,9 @@ class HybridTaskCascadeRoIHead(CascadeRoIHead):
                     det_masks,
                     self.mask_head[-1].num_classes,
                     mask_thr_binary=self.test_cfg.mask_thr_binary,
-                    img_size=ori_shape[:2])
+                    img_size=ori_shape[:2],
+                    encode=self.test_cfg.get('mask_output') == 'rle',
+                    num_workers=self.test_cfg.get('mask_paste_workers', 0))
             return [(bbox_result, segm_result)]
         else:
             return [bbox_result]
@@ -610,7 +610,9 @@ class SCNetRoIHead(CascadeRoIHead):
                     det_masks,
                     self.mask_head.num_classes,
                     mask_thr_binary=self.test_cfg.mask_thr_binary,
-                    img_size=ori_shape[:2])
+                    img_size=ori_shape[:2],
+                    encode=self.test_cfg.get('mask_output') == 'rle',
+                    num_workers=self.test_cfg.get('mask_paste_workers', 0))
             return [(det_bbox_results, det_segm_results)]
         else:
             return [det_bbox_results]
@@ -12,6 +12,11 @@
 # See the License for the specific language governing permissions
 # and limitations under the License.
 
+import json
+import os
+import os.path as osp
+
+import numpy as np
 import onnx
 import onnxruntime
 from onnx import helper, shape_inference
@@ -19,9 +24,63 @@ from onnx import helper, shape_inference
 from mmdet.models import build_detector
 
 
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+ONNX_TO_NUMPY_TYPES = {
+    'tensor(float)': np.float32,
+    'tensor(float16)': np.float16,
+    'tensor(double)': np.float64,
+    'tensor(int64)': np.int64,
+    'tensor(int32)': np.int32,
+    'tensor(uint8)': np.uint8,
+    'tensor(bool)': np.bool_,
+}
+
+
 class ModelONNXRuntime:
+    """ONNX Runtime model.
+
+    Args:
+        model_file_path (str): Path to the onnx file.
+        cfg (Config, optional): Config of the model, used to show results.
+        classes (Sequence[str], optional): Class names.
+        providers (list[str], optional): Execution providers in the order of
+            preference. Defaults to the ones of ONNX Runtime.
+        intra_op_num_threads (int): Number of threads used to run an
+            operator, 0 lets ONNX Runtime choose. Default: 0.
+        inter_op_num_threads (int): Number of threads used to run operators
+            in parallel, 0 lets ONNX Runtime choose. Default: 0.
+        graph_optimization_level (str): One of 'disable', 'basic',
+            'extended' and 'all'. Default: 'all'.
+        optimized_model_path (str, optional): Where to serialize the
+            optimized graph. If it was optimized from the same model file,
+            at the same level and for the same providers, the session is
+            created from it without optimizing the graph again.
+        io_binding (bool): Whether to bind the inputs and outputs. Outputs of
+            static shapes are written to buffers preallocated once and
+            reused, so they are overwritten by the next call.
+            Default: False.
+        profile_prefix (str, optional): If set, per-node profiling is
+            enabled and dumped to a json file with this prefix by
+            :meth:`end_profiling`.
+    """
 
-    def __init__(self, model_file_path, cfg=None, classes=None):
+    def __init__(self,
+                 model_file_path,
+                 cfg=None,
+                 classes=None,
+                 providers=None,
+                 intra_op_num_threads=0,
+                 inter_op_num_threads=0,
+                 graph_optimization_level='all',
+                 optimized_model_path=None,
+                 io_binding=False,
+                 profile_prefix=None):
         self.device = onnxruntime.get_device()
         self.model = onnx.load(model_file_path)
         self.classes = classes
@@ -32,11 +91,27 @@ class ModelONNXRuntime:
             if classes is not None:
                 self.pt_model.CLASSES = classes
 
+        self.providers = providers
         self.sess_options = onnxruntime.SessionOptions()
-        # self.sess_options.enable_profiling = False
+        self.sess_options.intra_op_num_threads = intra_op_num_threads
+        self.sess_options.inter_op_num_threads = inter_op_num_threads
+        if inter_op_num_threads > 1:
+            self.sess_options.execution_mode = \
+                onnxruntime.ExecutionMode.ORT_PARALLEL
+        self.sess_options.graph_optimization_level = \
+            GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level]
+        if profile_prefix is not None:
+            self.sess_options.enable_profiling = True
+            self.sess_options.profile_file_prefix = profile_prefix
+
+        if optimized_model_path is None:
+            self.session = self._create_session(
+                self.model.SerializeToString(), self.sess_options)
+        else:
+            self.session = self._create_optimized_session(
+                model_file_path, optimized_model_path,
+                graph_optimization_level)
 
-        self.session = onnxruntime.InferenceSession(
-            self.model.SerializeToString(), self.sess_options)
         self.input_names = []
         self.output_names = []
         for input in self.session.get_inputs():
@@ -44,6 +119,68 @@ class ModelONNXRuntime:
         for output in self.session.get_outputs():
             self.output_names.append(output.name)
 
+        self.io_binding = io_binding
+        self.output_buffers = {}
+
+    def _create_optimized_session(self, model_file_path, optimized_model_path,
+                                  graph_optimization_level):
+        """Create the session from the optimized graph saved by a previous
+        run, or optimize the graph and save it.
+
+        Graphs optimized beyond 'basic' contain nodes fused for the execution
+        providers, so the saved graph is only reused if it was optimized
+        from the same model file, at the same level and for the same
+        providers, as recorded in a json file next to it.
+        """
+        stat = os.stat(model_file_path)
+        providers = self.providers
+        if providers is None:
+            providers = onnxruntime.get_available_providers()
+        key = dict(
+            model=osp.abspath(model_file_path),
+            size=stat.st_size,
+            mtime=stat.st_mtime_ns,
+            graph_optimization_level=graph_optimization_level,
+            providers=list(providers))
+        key_file = f'{optimized_model_path}.json'
+        saved_key = None
+        if osp.exists(optimized_model_path) and osp.exists(key_file):
+            with open(key_file) as f:
+                saved_key = json.load(f)
+        if saved_key == key:
+            # the graph is already optimized
+            options = self._copy_options(self.sess_options)
+            options.graph_optimization_level = \
+                GRAPH_OPTIMIZATION_LEVELS['disable']
+            return self._create_session(optimized_model_path, options)
+
+        options = self._copy_options(self.sess_options)
+        options.optimized_model_filepath = optimized_model_path
+        session = self._create_session(self.model.SerializeToString(),
+                                       options)
+        with open(key_file, 'w') as f:
+            json.dump(key, f)
+        return session
+
+    @staticmethod
+    def _copy_options(sess_options):
+        options = onnxruntime.SessionOptions()
+        for name in ('intra_op_num_threads', 'inter_op_num_threads',
+                     'execution_mode', 'graph_optimization_level',
+                     'enable_profiling', 'profile_file_prefix'):
+            setattr(options, name, getattr(sess_options, name))
+        return options
+
+    def _create_session(self, model, sess_options):
+        if self.providers is None:
+            return onnxruntime.InferenceSession(model, sess_options)
+        return onnxruntime.InferenceSession(
+            model, sess_options, providers=self.providers)
+
+    def end_profiling(self):
+        """Stop profiling and return the path of the dumped profile."""
+        return self.session.end_profiling()
+
     def show(self, data, result, score_thr=0.3, wait_time=0):
         if self.pt_model is not None:
             self.pt_model.show_result(
@@ -73,8 +210,9 @@ class ModelONNXRuntime:
 
         self.model.graph.output.extend(extra_outputs)
         self.output_names.extend(output_ids)
-        self.session = onnxruntime.InferenceSession(
-            self.model.SerializeToString(), self.sess_options)
+        self.output_buffers = {}
+        self.session = self._create_session(self.model.SerializeToString(),
+                                            self.sess_options)
 
     def unify_inputs(self, inputs):
         if not isinstance(inputs, dict):
@@ -83,8 +221,43 @@ class ModelONNXRuntime:
             inputs = dict(zip(self.input_names, inputs))
         return inputs
 
+    def get_output_buffer(self, output):
+        """Get the preallocated buffer of an output of static shape, or None
+        if the shape is not known before the inference."""
+        if output.name not in self.output_buffers:
+            buffer = None
+            dtype = ONNX_TO_NUMPY_TYPES.get(output.type)
+            if dtype is not None and all(
+                    isinstance(dim, int) for dim in output.shape):
+                buffer = np.empty(output.shape, dtype=dtype)
+            self.output_buffers[output.name] = buffer
+        return self.output_buffers[output.name]
+
+    def run_with_io_binding(self, inputs):
+        binding = self.session.io_binding()
+        for name, data in inputs.items():
+            binding.bind_cpu_input(name, np.ascontiguousarray(data))
+        buffers = []
+        for output in self.session.get_outputs():
+            buffer = self.get_output_buffer(output)
+            if buffer is None:
+                binding.bind_output(output.name)
+            else:
+                binding.bind_output(output.name, 'cpu', 0, buffer.dtype,
+                                    buffer.shape, buffer.ctypes.data)
+            buffers.append(buffer)
+        self.session.run_with_iobinding(binding)
+        # outputs of dynamic shapes are allocated by ONNX Runtime
+        return [
+            buffer if buffer is not None else value.numpy()
+            for buffer, value in zip(buffers, binding.get_outputs())
+        ]
+
     def __call__(self, inputs, *args, **kwargs):
         inputs = self.unify_inputs(inputs)
-        outputs = self.session.run(None, inputs, *args, **kwargs)
+        if self.io_binding and not args and not kwargs:
+            outputs = self.run_with_io_binding(inputs)
+        else:
+            outputs = self.session.run(None, inputs, *args, **kwargs)
         outputs = dict(zip(self.output_names, outputs))
         return outputs
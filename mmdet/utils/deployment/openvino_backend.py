@@ -12,8 +12,13 @@
 # See the License for the specific language governing permissions
 # and limitations under the License.
 
+import math
 import os.path as osp
+import queue
 import string
+import threading
+import time
+from collections import OrderedDict
 
 import numpy as np
 from openvino.inference_engine import IECore
@@ -25,13 +30,57 @@ from ...models import build_detector
 
 
 class Model:
-    def __init__(self, model_path, ie=None, device='CPU', cfg=None, classes=None):
+    """OpenVINO model.
+
+    Besides the synchronous ``__call__``, the model can run several
+    inferences concurrently with :meth:`infer_async`. It keeps a pool of
+    ``num_requests`` infer requests and calls back with the outputs of each
+    of them once it is done.
+
+    Networks compiled for different input shapes are kept in an LRU cache,
+    so that going back to a shape seen before does not recompile the
+    network. With ``shape_buckets``, the spatial dims of 4D inputs are
+    zero-padded at the bottom and right to a few bucket shapes to keep the
+    number of compiled networks small.
+
+    Args:
+        model_path (str): Path to the xml file of the IR.
+        ie (IECore, optional): Inference engine core to use.
+        device (str): Device to run the model on. Default: 'CPU'.
+        cfg (Config, optional): Config of the model, used to show results.
+        classes (Sequence[str], optional): Class names.
+        num_requests (int): Number of infer requests that may be in flight
+            at the same time. Default: 1.
+        cache_size (int): Maximum number of compiled networks kept for
+            different input shapes. Default: 4.
+        shape_buckets (int | list[tuple[int]], optional): Either a step the
+            height and width of 4D inputs are rounded up to, or a list of
+            (height, width) buckets, the smallest one fitting the input is
+            used. Inputs larger than every bucket are not padded.
+    """
+
+    def __init__(self, model_path, ie=None, device='CPU', cfg=None, classes=None, num_requests=1,
+                 cache_size=4, shape_buckets=None):
         self.logger = get_root_logger()
         self.logger.info('Reading network from IR...')
 
         self.ie = IECore() if ie is None else ie
         bin_path = osp.splitext(model_path)[0] + '.bin'
         self.net = self.ie.read_network(model_path, bin_path)
+        self.input_shapes = {name: tuple(info.input_data.shape) for name, info in self.net.input_info.items()}
+
+        assert cache_size >= 1
+        self.cache_size = cache_size
+        self.exec_nets = OrderedDict()
+        self.cache_stats = dict(hits=0, misses=0, compile_time=0.0)
+        if isinstance(shape_buckets, (list, tuple)):
+            shape_buckets = sorted((tuple(bucket) for bucket in shape_buckets), key=lambda b: b[0] * b[1])
+        self.shape_buckets = shape_buckets
+
+        self.num_requests = num_requests
+        self.idle_requests = queue.Queue()
+        self.num_pending = 0
+        self.requests_done = threading.Condition()
 
         self.device = None
         self.exec_net = None
@@ -43,10 +92,35 @@ class Model:
             if classes is not None:
                 self.pt_model.CLASSES = classes
 
+    def load(self):
+        """Load the network for the current input shapes to the device with a
+        fresh pool of requests, or take it from the cache."""
+        self._wait_requests()
+        key = tuple(sorted(self.input_shapes.items()))
+        exec_net = self.exec_nets.pop(key, None)
+        if exec_net is None:
+            self.cache_stats['misses'] += 1
+            start = time.perf_counter()
+            exec_net = self.ie.load_network(network=self.net, device_name=self.device,
+                                            num_requests=self.num_requests)
+            self.cache_stats['compile_time'] += time.perf_counter() - start
+        else:
+            self.cache_stats['hits'] += 1
+        self.exec_nets[key] = exec_net
+        while len(self.exec_nets) > self.cache_size:
+            self.exec_nets.popitem(last=False)
+
+        self.exec_net = exec_net
+        self.idle_requests = queue.Queue()
+        for request_id in range(len(self.exec_net.requests)):
+            self.idle_requests.put(request_id)
+
     def to(self, device):
         if self.device != device:
+            self._wait_requests()
             self.device = device
-            self.exec_net = self.ie.load_network(network=self.net, device_name=self.device, num_requests=1)
+            self.exec_nets.clear()
+            self.load()
         return self
 
     def unify_inputs(self, inputs):
@@ -60,16 +134,38 @@ class Model:
         assert (inputs is None) != (input_shapes is None)
         if input_shapes is None:
             input_shapes = {name: data.shape for name, data in inputs.items()}
-        reshape_needed = False
-        for input_name, input_shape in input_shapes.items():
-            blob_shape = self.net.input_info[input_name].input_data.shape
-            if not np.array_equal(input_shape, blob_shape):
-                reshape_needed = True
-                break
-        if reshape_needed:
-            self.logger.info(f'reshape net to {input_shapes}')
-            self.net.reshape(input_shapes)
-            self.exec_net = self.ie.load_network(network=self.net, device_name=self.device, num_requests=1)
+        input_shapes = {name: tuple(shape) for name, shape in input_shapes.items()}
+        new_shapes = {**self.input_shapes, **input_shapes}
+        if new_shapes != self.input_shapes:
+            self._wait_requests()
+            self.input_shapes = new_shapes
+            if tuple(sorted(new_shapes.items())) not in self.exec_nets:
+                self.logger.info(f'reshape net to {new_shapes}')
+                self.net.reshape(new_shapes)
+            self.load()
+
+    def get_bucket_shape(self, height, width):
+        if isinstance(self.shape_buckets, int):
+            step = self.shape_buckets
+            return math.ceil(height / step) * step, math.ceil(width / step) * step
+        for bucket_h, bucket_w in self.shape_buckets:
+            if height <= bucket_h and width <= bucket_w:
+                return bucket_h, bucket_w
+        return height, width
+
+    def pad_to_buckets(self, inputs):
+        """Zero-pad the spatial dims of 4D inputs to their bucket shape."""
+        if self.shape_buckets is None:
+            return inputs
+        padded_inputs = {}
+        for name, data in inputs.items():
+            if data.ndim == 4:
+                height, width = data.shape[2:]
+                bucket_h, bucket_w = self.get_bucket_shape(height, width)
+                if (bucket_h, bucket_w) != (height, width):
+                    data = np.pad(data, ((0, 0), (0, 0), (0, bucket_h - height), (0, bucket_w - width)))
+            padded_inputs[name] = data
+        return padded_inputs
 
     def get(self, outputs, name):
         try:
@@ -87,13 +183,82 @@ class Model:
     def postprocess(self, outputs):
         return outputs
 
+    def decode(self, inputs, outputs):
+        """Convert the postprocessed outputs of the network to the results of
+        the model. It is shared by the synchronous and asynchronous modes."""
+        return outputs
+
     def __call__(self, inputs):
         inputs = self.unify_inputs(inputs)
         inputs = self.preprocess(inputs)
+        inputs = self.pad_to_buckets(inputs)
         self.reshape(inputs=inputs)
         outputs = self.exec_net.infer(inputs)
         outputs = self.postprocess(outputs)
-        return outputs
+        return self.decode(inputs, outputs)
+
+    def infer_async(self, inputs, callback, userdata=None):
+        """Start an asynchronous inference.
+
+        Blocks until one of the infer requests is idle. If the input shapes
+        differ from the current ones, the requests in flight are awaited and
+        the network is reshaped first.
+
+        Args:
+            inputs (ndarray | dict[str, ndarray]): Inputs of the network.
+            callback (callable): Called as ``callback(outputs, userdata,
+                exception)`` from an inference engine thread once the request
+                is done. ``outputs`` is None if ``exception`` is raised while
+                processing the outputs.
+            userdata (object): Passed to ``callback`` as is.
+        """
+        inputs = self.unify_inputs(inputs)
+        inputs = self.preprocess(inputs)
+        inputs = self.pad_to_buckets(inputs)
+        self.reshape(inputs=inputs)
+        request_id = self.idle_requests.get()
+        with self.requests_done:
+            self.num_pending += 1
+        try:
+            request = self.exec_net.requests[request_id]
+            request.set_completion_callback(
+                self._on_request_done, (request_id, inputs, callback, userdata))
+            request.async_infer(inputs)
+        except Exception:
+            # the request was not started, and is never called back
+            self.idle_requests.put(request_id)
+            with self.requests_done:
+                self.num_pending -= 1
+                self.requests_done.notify_all()
+            raise
+
+    def _on_request_done(self, status, py_data):
+        request_id, inputs, callback, userdata = py_data
+        request = self.exec_net.requests[request_id]
+        outputs, exception = None, None
+        try:
+            if status != 0:
+                raise RuntimeError(f'Infer request failed with status {status}')
+            outputs = {name: blob.buffer.copy() for name, blob in request.output_blobs.items()}
+            outputs = self.decode(inputs, self.postprocess(outputs))
+        except Exception as ex:
+            exception = ex
+        # the request is reusable as soon as its outputs are copied
+        self.idle_requests.put(request_id)
+        try:
+            callback(outputs, userdata, exception)
+        finally:
+            with self.requests_done:
+                self.num_pending -= 1
+                self.requests_done.notify_all()
+
+    def wait_all(self):
+        """Wait until all the inferences started so far are done."""
+        self._wait_requests()
+
+    def _wait_requests(self):
+        with self.requests_done:
+            self.requests_done.wait_for(lambda: self.num_pending == 0)
 
     def show(self, data, result, dataset=None, score_thr=0.3, wait_time=0):
         if self.pt_model is not None:
@@ -102,21 +267,44 @@ class Model:
 
 
 class Detector(Model):
-    def __init__(self, *args, **kwargs):
+    """OpenVINO detector.
+
+    Args:
+        max_batch_size (int): If greater than 1, :meth:`infer_async` stacks
+            up to ``max_batch_size`` consecutive images of the same shape,
+            after padding to their shape bucket, into one batch, padded with
+            zero images if needed. Only networks with the DetectionOutput
+            layer, whose detections carry the index of their image, can be
+            batched. Default: 1.
+    """
+
+    def __init__(self, *args, max_batch_size=1, **kwargs):
         super().__init__(*args, **kwargs)
         batch_size = self.net.input_info['image'].input_data.shape[0]
         assert batch_size == 1, 'Only batch 1 is supported.'
+        if max_batch_size > 1:
+            assert 'detection_out' in self.net.outputs, \
+                'Only networks with DetectionOutput support batching.'
+        self.max_batch_size = max_batch_size
+        self.batch = []
+        self.batch_lock = threading.Lock()
+
+    @staticmethod
+    def decode_detection_out(detection_out, image_shape):
+        output = {}
+        output['labels'] = detection_out[:, 1].astype(np.int32)
+        output['boxes'] = detection_out[:, 3:] * np.tile(image_shape[:1:-1], 2)
+        output['boxes'] = np.concatenate((output['boxes'], detection_out[:, 2:3]), axis=1)
+        return output
 
-    def __call__(self, inputs):
-        inputs = self.unify_inputs(inputs)
-        output = super().__call__(inputs)
+    def decode(self, inputs, output):
+        if inputs['image'].shape[0] > 1:
+            # batched outputs are split by image in _on_batch_done
+            return output
 
         if 'detection_out' in output:
-            detection_out = output['detection_out']
-            output['labels'] = detection_out[0, 0, :, 1].astype(np.int32)
-            output['boxes'] = detection_out[0, 0, :, 3:] * np.tile(inputs['image'].shape[:1:-1], 2)
-            output['boxes'] = np.concatenate((output['boxes'], detection_out[0, 0, :, 2:3]), axis=1)
-            del output['detection_out']
+            detection_out = output.pop('detection_out')
+            output.update(self.decode_detection_out(detection_out[0, 0], inputs['image'].shape))
             return output
 
         outs = output
@@ -136,9 +324,72 @@ class Detector(Model):
 
         return output
 
+    def infer_async(self, inputs, callback, userdata=None):
+        if self.max_batch_size <= 1:
+            return super().infer_async(inputs, callback, userdata)
+        # images of the same bucket are batched together once padded
+        inputs = self.pad_to_buckets(self.unify_inputs(inputs))
+        with self.batch_lock:
+            if self.batch and self.batch[0][0]['image'].shape != inputs['image'].shape:
+                self._flush()
+            self.batch.append((inputs, callback, userdata))
+            if len(self.batch) == self.max_batch_size:
+                self._flush()
+
+    def flush(self):
+        """Start the inference of the images waiting for a full batch."""
+        with self.batch_lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        image = batch[0][0]['image']
+        batch_image = np.zeros((self.max_batch_size, ) + image.shape[1:], dtype=image.dtype)
+        for i, (inputs, _, _) in enumerate(batch):
+            batch_image[i] = inputs['image'][0]
+        super().infer_async({'image': batch_image}, self._on_batch_done, (batch, batch_image.shape))
+
+    def _on_batch_done(self, outputs, userdata, exception):
+        batch, image_shape = userdata
+        results = [None] * len(batch)
+        if exception is None:
+            try:
+                detection_out = outputs['detection_out'][0, 0]
+                image_ids = detection_out[:, 0]
+                results = [
+                    self.decode_detection_out(detection_out[image_ids == i], image_shape)
+                    for i in range(len(batch))
+                ]
+            except Exception as ex:
+                exception = ex
+        for result, (_, callback, userdata) in zip(results, batch):
+            callback(result, userdata, exception)
+
+    def wait_all(self):
+        self.flush()
+        super().wait_all()
+
 
 class MaskTextSpotterOpenVINO(Model):
-    def __init__(self, xml_file_path, *args, text_recognition_thr=0.5, **kwargs):
+    """OpenVINO MaskTextSpotter.
+
+    The texts of the detected boxes are recognized in batches: the encoder
+    runs once per batch of text features and the decoder advances all the
+    sequences of the batch together, each one stopping at its EOS.
+
+    Args:
+        text_recognition_thr (float): Texts recognized with a lower
+            confidence are replaced with empty strings. Default: 0.5.
+        text_batch_size (int): Maximum number of boxes whose texts are
+            recognized together. Batches are padded to the smallest power of
+            two fitting them, capped at ``text_batch_size``, so that a few
+            words do not cost the compute of a full batch. The text networks
+            keep one compiled network per batch size. Default: 16.
+    """
+
+    def __init__(self, xml_file_path, *args, text_recognition_thr=0.5, text_batch_size=16, **kwargs):
         super().__init__(xml_file_path, *args, **kwargs)
 
         batch_size = self.net.input_info['image'].input_data.shape[0]
@@ -147,15 +398,82 @@ class MaskTextSpotterOpenVINO(Model):
         self.n, self.c, self.h, self.w = self.net.input_info['image'].input_data.shape
         assert self.n == 1, 'Only batch 1 is supported.'
 
+        self.text_batch_size = text_batch_size
+        # one compiled network per padded batch size
+        num_batch_sizes = len(self.text_batch_sizes())
         xml_path = xml_file_path.replace('.xml', '_text_recognition_head_encoder.xml')
-        self.text_encoder = Model(xml_path)
+        self.text_encoder = Model(xml_path, cache_size=num_batch_sizes)
 
         xml_path = xml_file_path.replace('.xml', '_text_recognition_head_decoder.xml')
-        self.text_decoder = Model(xml_path)
+        self.text_decoder = Model(xml_path, cache_size=num_batch_sizes)
         self.hidden_shape = [v.shape for k, v in self.text_decoder.net.inputs.items() if k == 'prev_hidden'][0]
         self.alphabet = '  ' + string.ascii_lowercase + string.digits
         self.text_recognition_thr = text_recognition_thr
 
+    def text_batch_sizes(self):
+        """Get the sizes the batches of text features are padded to."""
+        sizes = [1]
+        while sizes[-1] < self.text_batch_size:
+            sizes.append(min(sizes[-1] * 2, self.text_batch_size))
+        return sizes
+
+    def recognize_texts(self, text_features):
+        """Decode the texts of a batch of text features.
+
+        Args:
+            text_features (ndarray): Features of shape (N, C, H, W), N is at
+                most ``text_batch_size``.
+
+        Returns:
+            tuple[list]: Decoded texts, their confidences and the per-step
+                distributions over the alphabet.
+        """
+        eos = 1
+        max_seq_len = 28
+
+        num_texts = len(text_features)
+        batch_size = next(size for size in self.text_batch_sizes() if size >= num_texts)
+        batch = np.zeros((batch_size, ) + text_features.shape[1:], dtype=text_features.dtype)
+        batch[:num_texts] = text_features
+        feature = self.text_encoder({'input': batch})
+        feature = self.text_encoder.get(feature, 'output')
+        feature = np.reshape(feature, (feature.shape[0], feature.shape[1], -1))
+        feature = np.transpose(feature, (0, 2, 1))
+
+        # the hidden state is (num_layers, batch, hidden_size)
+        hidden = np.zeros((self.hidden_shape[0], batch_size, *self.hidden_shape[2:]))
+        prev_symbol = np.zeros((batch_size, ))
+
+        decoded = [''] * num_texts
+        confidences = [1] * num_texts
+        distributions = [[] for _ in range(num_texts)]
+        active = np.zeros(batch_size, dtype=bool)
+        active[:num_texts] = True
+
+        for _ in range(max_seq_len):
+            out = self.text_decoder({
+                'prev_symbol': prev_symbol,
+                'prev_hidden': hidden,
+                'encoder_outputs': feature
+            })
+            softmaxed = softmax(self.text_decoder.get(out, 'output'), axis=1)
+            softmaxed_max = np.max(softmaxed, axis=1)
+            prev_symbol = np.argmax(softmaxed, axis=1)
+            for i in np.nonzero(active)[0]:
+                distributions[i].append(softmaxed[i, 2:])
+                confidences[i] *= softmaxed_max[i]
+                if prev_symbol[i] == eos:
+                    active[i] = False
+                else:
+                    decoded[i] = decoded[i] + self.alphabet[prev_symbol[i]]
+            if not active.any():
+                break
+            hidden = self.text_decoder.get(out, 'hidden')
+
+        distributions = [np.transpose(np.array(distribution)) for distribution in distributions]
+        decoded = [text if confidence >= self.text_recognition_thr else ''
+                   for text, confidence in zip(decoded, confidences)]
+        return decoded, confidences, distributions
 
     def __call__(self, inputs, **kwargs):
         inputs = self.unify_inputs(inputs)
@@ -171,47 +489,15 @@ class MaskTextSpotterOpenVINO(Model):
         if 'masks' in output:
             output['masks'] = output['masks'][valid_detections_mask]
 
-        eos = 1
-        max_seq_len = 28
-
         confidences = []
         decoded_texts = []
         distributions = []
-        for feature in output['text_features']:
-            feature = np.expand_dims(feature, 0)
-            feature = self.text_encoder({'input': feature})
-            feature = self.text_encoder.get(feature, 'output')
-            feature = np.reshape(feature, (feature.shape[0], feature.shape[1], -1))
-            feature = np.transpose(feature, (0, 2, 1))
-
-            hidden = np.zeros(self.hidden_shape)
-            prev_symbol = np.zeros((1,))
-
-            decoded = ''
-            confidence = 1
-
-            distribution = []
-
-            for _ in range(max_seq_len):
-                out = self.text_decoder({
-                    'prev_symbol': prev_symbol,
-                    'prev_hidden': hidden,
-                    'encoder_outputs': feature
-                })
-                softmaxed = softmax(self.text_decoder.get(out, 'output'), axis=1)
-                distribution.append(softmaxed[0, 2:])
-                softmaxed_max = np.max(softmaxed, axis=1)
-                confidence *= softmaxed_max[0]
-                prev_symbol = np.argmax(softmaxed, axis=1)
-
-                if prev_symbol == eos:
-                    break
-                hidden = self.text_decoder.get(out, 'hidden')
-                decoded = decoded + self.alphabet[prev_symbol[0]]
-            distribution = np.transpose(np.array(distribution))
-            distributions.append(distribution)
-            confidences.append(confidence)
-            decoded_texts.append(decoded if confidence >= self.text_recognition_thr else '')
+        text_features = output['text_features']
+        for start in range(0, len(text_features), self.text_batch_size):
+            texts = self.recognize_texts(text_features[start:start + self.text_batch_size])
+            decoded_texts.extend(texts[0])
+            confidences.extend(texts[1])
+            distributions.extend(texts[2])
 
         output['texts'] = decoded_texts, confidences, distributions
 
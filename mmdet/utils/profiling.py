@@ -1,7 +1,9 @@
 import contextlib
 import sys
 import time
+import tracemalloc
 
+import numpy as np
 import torch
 
 if sys.version_info >= (3, 7):
@@ -37,3 +39,47 @@ if sys.version_info >= (3, 7):
             msg = f'{trace_name} {name} cpu_time {cpu_time:.2f} ms '
             msg += f'gpu_time {gpu_time:.2f} ms stream {stream}'
             print(msg, end_stream)
+
+
+def get_nbytes(obj):
+    """Get the bytes of the arrays and tensors held by an object, looking
+    into dicts, sequences and data containers."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, torch.Tensor):
+        return obj.element_size() * obj.nelement()
+    if isinstance(obj, dict):
+        return sum(get_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(get_nbytes(v) for v in obj)
+    if hasattr(obj, 'data') and hasattr(obj, 'cpu_only'):
+        # mmcv DataContainer
+        return get_nbytes(obj.data)
+    return 0
+
+
+@contextlib.contextmanager
+def trace_memory():
+    """Trace the memory allocated by Python and NumPy in a block.
+
+    Yields a dict filled on exit with ``peak_bytes``, the peak of the memory
+    allocated in the block over the memory traced on entry, and
+    ``net_bytes``, the memory still allocated on exit. Tracing is started for
+    the block if it is not on. Nested blocks need Python 3.9 to reset the
+    peak, otherwise their peak includes the one of the enclosing block.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    stats = {}
+    try:
+        yield stats
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        stats['peak_bytes'] = max(peak - start, 0)
+        stats['net_bytes'] = current - start
+        if started:
+            tracemalloc.stop()
@@ -672,3 +672,66 @@ def test_guided_anchor():
     anchors = ga_retina_head.square_anchor_generator.grid_anchors(
         featmap_sizes, device)
     assert len(anchors) == 5
+
+
+def test_prior_cache():
+    from mmdet.core.anchor import (AnchorGenerator, MlvlPointGenerator,
+                                   YOLOAnchorGenerator)
+
+    anchor_generator = AnchorGenerator(
+        strides=[8, 16], ratios=[0.5, 1.0], scales=[4], cache_size=2)
+    featmap_sizes = [(6, 5), (3, 3)]
+    anchors = anchor_generator.grid_priors(featmap_sizes, device='cpu')
+    cached_anchors = anchor_generator.grid_priors(
+        [torch.Size(size) for size in featmap_sizes], device='cpu')
+    assert all(a is b for a, b in zip(anchors, cached_anchors))
+    stats = anchor_generator.cache_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+    # the flags of a batch are the ones of every image
+    pad_shapes = [(40, 33, 3), (48, 40, 3), (40, 33, 3), (17, 9, 3)]
+    batch_flags = anchor_generator.batch_valid_flags(
+        featmap_sizes, pad_shapes, device='cpu')
+    anchor_generator.cache_size = 0
+    anchor_generator.clear_cache()
+    for flags, pad_shape in zip(batch_flags, pad_shapes):
+        expected = anchor_generator.valid_flags(
+            featmap_sizes, pad_shape, device='cpu')
+        assert all(torch.equal(a, b) for a, b in zip(flags, expected))
+    assert anchor_generator.cache_stats()['size'] == 0
+
+    # the least recently used results are evicted
+    anchor_generator.cache_size = 2
+    for pad_shape in pad_shapes:
+        anchor_generator.valid_flags(featmap_sizes, pad_shape, device='cpu')
+    stats = anchor_generator.cache_stats()
+    assert stats['size'] == 2 and stats['hits'] == 1
+    assert stats['misses'] == 3
+
+    point_generator = MlvlPointGenerator(strides=[8, 16])
+    points = point_generator.grid_priors(featmap_sizes, device='cpu')
+    points_with_stride = point_generator.grid_priors(
+        featmap_sizes, device='cpu', with_stride=True)
+    assert points[0].size(1) == 2 and points_with_stride[0].size(1) == 4
+    batch_flags = point_generator.batch_valid_flags(
+        featmap_sizes, pad_shapes, device='cpu')
+    for flags, pad_shape in zip(batch_flags, pad_shapes):
+        expected = point_generator.valid_flags(
+            featmap_sizes, pad_shape, device='cpu')
+        assert all(torch.equal(a, b) for a, b in zip(flags, expected))
+
+    yolo_generator = YOLOAnchorGenerator(
+        strides=[32, 16],
+        base_sizes=[[(116, 90), (156, 198)], [(30, 61), (62, 45)]])
+    gt_bboxes = [
+        torch.Tensor([[10, 20, 60, 50], [90, 30, 120, 100]]),
+        torch.zeros((0, 4)),
+        torch.Tensor([[0, 0, 31, 31]])
+    ]
+    featmap_sizes = [(4, 4), (8, 8)]
+    batch_flags = yolo_generator.batch_responsible_flags(
+        featmap_sizes, gt_bboxes, device='cpu')
+    for flags, bboxes in zip(batch_flags, gt_bboxes):
+        expected = yolo_generator.responsible_flags(
+            featmap_sizes, bboxes, device='cpu')
+        assert all(torch.equal(a, b) for a, b in zip(flags, expected))
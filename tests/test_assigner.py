@@ -8,7 +8,8 @@ import torch
 
 from mmdet.core.bbox.assigners import (ApproxMaxIoUAssigner,
                                        CenterRegionAssigner, HungarianAssigner,
-                                       MaxIoUAssigner, PointAssigner)
+                                       MaxIoUAssigner, PointAssigner,
+                                       SimOTAAssigner)
 
 
 def test_max_iou_assigner():
@@ -151,6 +152,64 @@ def test_max_iou_assigner_with_empty_boxes_and_gt():
     assert len(assign_result.gt_inds) == 0
 
 
+def test_max_iou_assigner_batch_assign():
+    from mmdet.core.bbox.demodata import random_boxes
+    torch.manual_seed(0)
+    bboxes = random_boxes(200, 64).view(2, 100, 4)
+    bbox_flags = torch.rand(2, 100) > 0.2
+    gt_bboxes_list = [random_boxes(5, 64), random_boxes(0, 64)]
+    gt_bboxes_ignore_list = [random_boxes(2, 64), None]
+    for gt_max_assign_all in [True, False]:
+        self = MaxIoUAssigner(
+            pos_iou_thr=0.5,
+            neg_iou_thr=(0.1, 0.4),
+            min_pos_iou=0.,
+            gt_max_assign_all=gt_max_assign_all,
+            ignore_iof_thr=0.5)
+        gt_inds, max_overlaps = self.batch_assign(bboxes, gt_bboxes_list,
+                                                  gt_bboxes_ignore_list,
+                                                  bbox_flags)
+        assert (gt_inds[~bbox_flags] == -1).all()
+        for i in range(2):
+            assign_result = self.assign(bboxes[i][bbox_flags[i]],
+                                        gt_bboxes_list[i],
+                                        gt_bboxes_ignore_list[i])
+            assert torch.equal(gt_inds[i][bbox_flags[i]],
+                               assign_result.gt_inds)
+            assert torch.equal(max_overlaps[i][bbox_flags[i]],
+                               assign_result.max_overlaps)
+        assert (gt_inds[1][bbox_flags[1]] == 0).all()
+
+
+def test_max_iou_assigner_by_tiles():
+    from mmdet.core.bbox.demodata import random_boxes
+    bboxes = random_boxes(300, 64, rng=0)
+    gt_bboxes = random_boxes(7, 64, rng=1)
+    gt_bboxes_ignore = random_boxes(2, 64, rng=2)
+    gt_labels = torch.arange(7)
+    # the max overlaps of the gts are ties, in several tiles
+    bboxes[250] = bboxes[10] = gt_bboxes[3]
+    for gt_max_assign_all in [True, False]:
+        kwargs = dict(
+            pos_iou_thr=0.5,
+            neg_iou_thr=0.4,
+            min_pos_iou=0.,
+            gt_max_assign_all=gt_max_assign_all,
+            ignore_iof_thr=0.5)
+        expected = MaxIoUAssigner(**kwargs).assign(bboxes, gt_bboxes,
+                                                   gt_bboxes_ignore,
+                                                   gt_labels)
+        assigner = MaxIoUAssigner(tile_elements=7 * 32, **kwargs)
+        assign_result = assigner.assign(bboxes, gt_bboxes, gt_bboxes_ignore,
+                                        gt_labels)
+        assert torch.equal(assign_result.gt_inds, expected.gt_inds)
+        assert torch.equal(assign_result.max_overlaps, expected.max_overlaps)
+        assert torch.equal(assign_result.labels, expected.labels)
+
+        assign_result = assigner.assign_by_tiles(bboxes, gt_bboxes[:0])
+        assert (assign_result.gt_inds == 0).all()
+
+
 def test_point_assigner():
     self = PointAssigner()
     points = torch.FloatTensor([  # [x, y, stride]
@@ -422,3 +481,18 @@ def test_hungarian_match_assigner():
     assert torch.all(assign_result.gt_inds > -1)
     assert (assign_result.gt_inds > 0).sum() == gt_bboxes.size(0)
     assert (assign_result.labels > -1).sum() == gt_bboxes.size(0)
+
+
+def test_sim_ota_dynamic_k_matching():
+    self = SimOTAAssigner(candidate_topk=2)
+    # the dynamic k of the gts are 1 and 2
+    pairwise_ious = torch.Tensor([[0.9, 1.0], [0.6, 1.0], [0.1, 0.2],
+                                  [0., 0.]])
+    cost = torch.Tensor([[1., 0.5], [2., 1.5], [3., 2.], [5., 5.]])
+    valid_mask = torch.BoolTensor([True, True, False, True, True])
+    matched_pred_ious, matched_gt_inds = self.dynamic_k_matching(
+        cost, pairwise_ious, 2, valid_mask)
+    # the first prior is matched with both gts, and keeps the second one
+    assert valid_mask.tolist() == [True, True, False, False, False]
+    assert matched_gt_inds.tolist() == [1, 1]
+    assert matched_pred_ious.tolist() == [1., 1.]
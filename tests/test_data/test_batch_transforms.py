@@ -0,0 +1,133 @@
+import mmcv
+import numpy as np
+import torch
+
+from mmdet.core.mask import BitmapMasks
+from mmdet.datasets.pipelines import (BatchAugment, BatchContrastTransform,
+                                      BatchPhotoMetricDistortion,
+                                      BatchRandomFlip, ContrastTransform,
+                                      PhotoMetricDistortion)
+
+
+def _batch(img_shapes, pad_shape=(32, 32)):
+    rng = np.random.RandomState(0)
+    img = torch.zeros((len(img_shapes), 3) + pad_shape)
+    metas, bboxes, labels, masks = [], [], [], []
+    for i, (h, w) in enumerate(img_shapes):
+        img[i, :, :h, :w] = torch.from_numpy(
+            rng.uniform(0, 255, (3, h, w)).astype(np.float32))
+        metas.append(dict(img_shape=(h, w, 3), pad_shape=pad_shape + (3, )))
+        bboxes.append(torch.tensor([[1., 2., w / 2, h / 2]]))
+        labels.append(torch.tensor([i]))
+        mask = np.zeros((1, ) + pad_shape, dtype=np.uint8)
+        mask[0, 2:h // 2, 1:w // 2] = 1
+        masks.append(BitmapMasks(mask, *pad_shape))
+    return dict(
+        img=img,
+        img_metas=metas,
+        gt_bboxes=bboxes,
+        gt_labels=labels,
+        gt_masks=masks)
+
+
+def test_batch_photo_metric_distortion():
+    data = _batch([(20, 30), (32, 32), (10, 5)])
+    imgs = []
+    for img, meta in zip(data['img'], data['img_metas']):
+        h, w = meta['img_shape'][:2]
+        imgs.append(img[:, :h, :w].permute(1, 2, 0).numpy().copy())
+    transform = PhotoMetricDistortion()
+    batch_transform = BatchPhotoMetricDistortion()
+    for seed in range(5):
+        np.random.seed(seed)
+        expected = [transform(dict(img=img.copy()))['img'] for img in imgs]
+        np.random.seed(seed)
+        results = batch_transform(dict(data))
+        for img, expected_img in zip(results['img'], expected):
+            h, w = expected_img.shape[:2]
+            np.testing.assert_allclose(
+                img[:, :h, :w].permute(1, 2, 0).numpy(),
+                expected_img,
+                rtol=1e-4,
+                atol=0.1)
+
+
+def test_batch_contrast_transform():
+    data = _batch([(20, 30), (32, 32)])
+    data['img'] = data['img'].round()
+    results = BatchContrastTransform(level=6, prob=1.)(dict(data))
+    transform = ContrastTransform(level=6, prob=1.)
+    for img, result, meta in zip(data['img'], results['img'],
+                                 data['img_metas']):
+        h, w = meta['img_shape'][:2]
+        img = img[:, :h, :w].permute(1, 2, 0).numpy().astype(np.uint8)
+        expected = transform(dict(img=img))['img']
+        np.testing.assert_allclose(
+            result[:, :h, :w].permute(1, 2, 0).numpy(), expected, atol=1.5)
+
+
+def test_batch_random_flip():
+    data = _batch([(20, 30), (32, 32), (10, 5)])
+    img = data['img'].clone()
+    results = BatchRandomFlip(flip_ratio=1., direction='diagonal')(dict(data))
+    for i, meta in enumerate(results['img_metas']):
+        h, w = meta['img_shape'][:2]
+        assert meta['flip'] and meta['flip_direction'] == 'diagonal'
+        assert torch.equal(results['img'][i, :, :h, :w],
+                           img[i, :, :h, :w].flip(1, 2))
+        # the padding is untouched
+        assert torch.equal(results['img'][i, :, h:], img[i, :, h:])
+        assert torch.equal(results['gt_bboxes'][i],
+                           torch.tensor([[w / 2, h / 2, w - 1., h - 2.]]))
+        mask = results['gt_masks'][i].masks[0]
+        assert mask.shape == (h, w)
+        assert mask[h - 3, w - 2] == 1 and mask[1, 0] == 0
+
+    # the flips are composed with the ones of the data pipeline
+    for done, direction, expected in [('horizontal', 'vertical', 'diagonal'),
+                                      ('diagonal', 'diagonal', None),
+                                      (None, 'horizontal', 'horizontal')]:
+        data = _batch([(20, 30)])
+        data['img_metas'][0].update(flip=done is not None, flip_direction=done)
+        results = BatchRandomFlip(flip_ratio=1., direction=direction)(data)
+        meta = results['img_metas'][0]
+        assert meta['flip'] == (expected is not None)
+        assert meta['flip_direction'] == expected
+
+
+def test_batch_augment():
+    img_norm_cfg = dict(
+        mean=np.array([123.675, 116.28, 103.53], dtype=np.float32),
+        std=np.array([58.395, 57.12, 57.375], dtype=np.float32),
+        to_rgb=True)
+    data = _batch([(20, 30), (32, 32)])
+    for i, meta in enumerate(data['img_metas']):
+        h, w = meta['img_shape'][:2]
+        meta['img_norm_cfg'] = img_norm_cfg
+        img = data['img'][i, :, :h, :w].permute(1, 2, 0).numpy()
+        data['img'][i, :, :h, :w] = torch.from_numpy(
+            mmcv.imnormalize(img, **img_norm_cfg)).permute(2, 0, 1)
+
+    # the images are denormalized and normalized back
+    results = BatchAugment([])(dict(data))
+    assert torch.allclose(results['img'], data['img'], atol=1e-4)
+
+    batch_augment = BatchAugment([
+        dict(type='BatchExpand', mean=img_norm_cfg['mean'], prob=1.),
+        dict(type='BatchMinIoURandomCrop'),
+        dict(type='BatchResize', img_scale=(40, 24)),
+        dict(type='BatchPhotoMetricDistortion'),
+    ])
+    results = batch_augment(dict(data))
+    assert results['img'].shape == (2, 3, 32, 64)
+    for i, meta in enumerate(results['img_metas']):
+        assert meta['img_shape'] == (24, 40, 3)
+        assert meta['pad_shape'] == (32, 64, 3)
+        assert results['gt_masks'][i].masks.shape[1:] == (32, 64)
+        assert (results['img'][i, :, 24:] == 0).all()
+        bboxes = results['gt_bboxes'][i]
+        assert len(bboxes) == len(results['gt_labels'][i])
+        assert (bboxes[:, 0::2] <= 40).all() and (bboxes[:, 1::2] <= 24).all()
+    # the batch is not modified
+    assert data['img_metas'][0]['img_shape'] == (20, 30, 3)
+    assert data['gt_bboxes'][0].tolist() == [[1., 2., 15., 10.]]
@@ -247,6 +247,68 @@ def test_dataset_evaluation():
     tmp_dir.cleanup()
 
 
+@pytest.mark.parametrize('iou_type', ['bbox', 'segm'])
+def test_parallel_coco_eval(iou_type):
+    from pycocotools.coco import COCO
+    from pycocotools.cocoeval import COCOeval
+    from pycocotools.mask import frPyObjects
+
+    from mmdet.core import ParallelCOCOeval
+
+    rng = np.random.RandomState(0)
+    images, annotations, detections = [], [], []
+    for img_id in range(7):
+        images.append(dict(id=img_id, width=320, height=240))
+        for _ in range(rng.randint(0, 6)):
+            x1, y1 = rng.randint(0, 200), rng.randint(0, 150)
+            w, h = rng.randint(10, 100), rng.randint(10, 80)
+            polygon = [x1, y1, x1 + w, y1, x1 + w, y1 + h, x1, y1 + h]
+            annotations.append(
+                dict(
+                    id=len(annotations) + 1,
+                    image_id=img_id,
+                    category_id=int(rng.randint(1, 3)),
+                    bbox=[x1, y1, w, h],
+                    area=w * h,
+                    segmentation=[polygon],
+                    iscrowd=int(rng.rand() < 0.1)))
+            dx, dy = rng.randint(-5, 6, size=2)
+            polygon = [
+                p + (dy if i % 2 else dx) for i, p in enumerate(polygon)
+            ]
+            rle = frPyObjects([polygon], 240, 320)[0]
+            rle['counts'] = rle['counts'].decode()
+            detections.append(
+                dict(
+                    image_id=img_id,
+                    category_id=int(rng.randint(1, 3)),
+                    bbox=[float(x1 + dx), float(y1 + dy), w, h],
+                    segmentation=rle,
+                    score=float(rng.rand())))
+    coco = COCO()
+    coco.dataset = dict(
+        images=images,
+        annotations=annotations,
+        categories=[dict(id=1, name='a'), dict(id=2, name='b')])
+    coco.createIndex()
+    gt_anns = copy.deepcopy(coco.anns)
+
+    stats = []
+    for eval_cls, kwargs in [(COCOeval, {}), (ParallelCOCOeval, {}),
+                             (ParallelCOCOeval, dict(nproc=2))]:
+        coco_gt = copy.deepcopy(coco) if eval_cls is COCOeval else coco
+        coco_dt = coco_gt.loadRes(copy.deepcopy(detections))
+        coco_eval = eval_cls(coco_gt, coco_dt, iou_type, **kwargs)
+        coco_eval.evaluate()
+        coco_eval.accumulate()
+        coco_eval.summarize()
+        stats.append(coco_eval.stats)
+    assert np.allclose(stats[0], stats[1])
+    assert np.allclose(stats[0], stats[2])
+    # the shared ground truth index is left untouched
+    assert coco.anns == gt_anns
+
+
 @patch('mmdet.datasets.CocoDataset.load_annotations', MagicMock)
 @patch('mmdet.datasets.CustomDataset.load_annotations', MagicMock)
 @patch('mmdet.datasets.XMLDataset.load_annotations', MagicMock)
@@ -534,3 +596,117 @@ def test_allow_empty_images(classes, expected_length):
     assert len(full_dataset.img_ids) == 3
     assert filtered_dataset.CLASSES == classes
     assert full_dataset.CLASSES == classes
+
+
+def test_lexicon_index():
+    import editdistance
+    from mmdet.datasets.coco_with_text import LexiconIndex, find_in_lexicon
+
+    rng = np.random.RandomState(0)
+    letters = np.array(list('abcde'))
+    words = [
+        ''.join(rng.choice(letters, rng.randint(2, 9))) for _ in range(500)
+    ]
+    lexicon = LexiconIndex(words)
+    for _ in range(100):
+        query = ''.join(rng.choice(letters, rng.randint(1, 10)))
+        distances = [
+            editdistance.eval(query.upper(), word.upper()) for word in words
+        ]
+        argmin = int(np.argmin(distances))
+        assert find_in_lexicon(query, lexicon, {}, None) == \
+            (words[argmin], distances[argmin])
+        assert find_in_lexicon(query, words, {}, None) == \
+            (words[argmin], distances[argmin])
+        best, candidates = lexicon.search(query.upper())
+        assert best == distances[argmin]
+        assert candidates == [(i, d) for i, d in enumerate(distances)
+                              if d <= best + 2]
+
+
+@pytest.mark.parametrize('classes', [None, ['bus'], ['car']])
+def test_coco_annotation_store(classes):
+    from mmdet.datasets.annotation_store import PackedAnnotations
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    dataset_class = DATASETS.get('CocoDataset')
+    kwargs = dict(
+        ann_file='tests/data/coco_sample.json',
+        img_prefix='tests/data',
+        pipeline=[],
+        classes=classes)
+    dataset = dataset_class(**kwargs)
+    packed_dataset = dataset_class(
+        ann_store=dict(cache_dir=tmp_dir.name), **kwargs)
+    # the store is built once and loaded by the next datasets
+    assert len(os.listdir(tmp_dir.name)) == 1
+    dataset_class(ann_store=dict(cache_dir=tmp_dir.name), **kwargs)
+    assert len(os.listdir(tmp_dir.name)) == 1
+
+    assert packed_dataset.img_ids == dataset.img_ids
+    assert packed_dataset.cat_ids == dataset.cat_ids
+    assert packed_dataset.data_infos == dataset.data_infos
+    assert packed_dataset._coco is None
+    for i in range(len(dataset)):
+        assert isinstance(packed_dataset._get_ann_info(i), PackedAnnotations)
+        assert packed_dataset.get_cat_ids(i) == dataset.get_cat_ids(i)
+        ann = dataset.get_ann_info(i)
+        packed_ann = packed_dataset.get_ann_info(i)
+        assert ann.keys() == packed_ann.keys()
+        for key in ('bboxes', 'labels', 'bboxes_ignore'):
+            assert packed_ann[key].dtype == ann[key].dtype
+            np.testing.assert_array_equal(packed_ann[key], ann[key])
+        assert packed_ann['masks'] == ann['masks']
+        assert packed_ann['seg_map'] == ann['seg_map']
+        # the dict based parsers of the subclasses get the same annotations
+        anns = dataset._get_ann_info(i)
+        packed_anns = list(packed_dataset._get_ann_info(i))
+        assert len(packed_anns) == len(anns)
+        for ann, packed_ann in zip(anns, packed_anns):
+            for key, value in ann.items():
+                assert packed_ann[key] == value
+    # evaluation still gets the COCO index
+    assert packed_dataset.coco.get_img_ids() == dataset.coco.get_img_ids()
+    tmp_dir.cleanup()
+
+
+def test_dataset_cache():
+    tmp_dir = tempfile.TemporaryDirectory()
+    kwargs = dict(
+        ann_file='tests/data/coco_sample.json',
+        img_prefix='tests/data',
+        pipeline=[],
+        classes=['bus'],
+        dataset_cache=dict(cache_dir=tmp_dir.name))
+    dataset = CocoDataset(**kwargs)
+    assert len(os.listdir(tmp_dir.name)) == 1
+
+    # the next datasets do not parse the annotation file
+    with patch.object(
+            CocoDataset, 'load_annotations',
+            side_effect=AssertionError), patch.object(
+                CocoDataset, '_filter_imgs', side_effect=AssertionError):
+        cached_dataset = CocoDataset(**kwargs)
+    assert cached_dataset.data_infos == dataset.data_infos
+    assert cached_dataset.img_ids == dataset.img_ids
+    assert cached_dataset.cat_ids == dataset.cat_ids
+    assert cached_dataset.cat2label == dataset.cat2label
+    np.testing.assert_array_equal(cached_dataset.flag, dataset.flag)
+    # the raw annotations are cached, the annotation file is not parsed
+    for i in range(len(dataset)):
+        assert cached_dataset.get_cat_ids(i) == dataset.get_cat_ids(i)
+        ann_info = cached_dataset.get_ann_info(i)
+        expected_ann_info = dataset.get_ann_info(i)
+        np.testing.assert_array_equal(ann_info['bboxes'],
+                                      expected_ann_info['bboxes'])
+        np.testing.assert_array_equal(ann_info['labels'],
+                                      expected_ann_info['labels'])
+    # the COCO api is built on demand for evaluation
+    assert cached_dataset._coco is None
+    assert cached_dataset.coco.get_img_ids() == dataset.coco.get_img_ids()
+
+    # other filtering parameters get their own cache
+    unfiltered_dataset = CocoDataset(filter_empty_gt=False, **kwargs)
+    assert len(unfiltered_dataset) == 3
+    assert len(os.listdir(tmp_dir.name)) == 2
+    tmp_dir.cleanup()
@@ -0,0 +1,84 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from mmdet.datasets import RepeatDataset
+from mmdet.datasets.samplers import (AspectRatioGroupSampler,
+                                     DistributedAspectRatioGroupSampler)
+from mmdet.datasets.samplers.bucket_sampler import (get_bucket_flags,
+                                                    get_img_shapes,
+                                                    padding_overhead)
+
+
+def _dataset(shapes):
+    dataset = MagicMock()
+    dataset.data_infos = [dict(height=h, width=w) for h, w in shapes]
+    dataset.flag = np.array([w / h > 1 for h, w in shapes], dtype=np.uint8)
+    dataset.__len__.return_value = len(shapes)
+    del dataset.datasets
+    del dataset.dataset
+    return dataset
+
+
+def test_get_bucket_flags():
+    shapes = np.array([[100, 100], [300, 400], [100, 210], [400, 300],
+                       [90, 200], [300, 410]])
+    flags = get_bucket_flags(shapes)
+    # 1:1, 4:3, 21:9, 3:4, 20:9 and 41:30
+    assert flags.tolist() == [1, 2, 3, 0, 3, 2]
+    # the 3:4 and 1:1 images do not make a group of two
+    flags = get_bucket_flags(shapes, min_bucket_size=2)
+    assert flags.tolist() == [0, 1, 2, 0, 2, 1]
+    flags = get_bucket_flags(
+        shapes, ratio_bins=(1, ), size_bins=(200, ), min_bucket_size=1)
+    assert flags.tolist() == [1, 2, 1, 0, 1, 2]
+
+    dataset = RepeatDataset(_dataset(shapes), 2)
+    assert get_img_shapes(dataset).tolist() == np.tile(shapes, (2, 1)).tolist()
+
+
+def test_aspect_ratio_group_sampler():
+    rng = np.random.RandomState(0)
+    ratios = rng.choice([4 / 3, 21 / 9, 16 / 9, 3 / 4], 200)
+    shapes = np.stack([np.full(200, 480), np.round(480 * ratios)], 1)
+    dataset = _dataset(shapes)
+
+    sampler = AspectRatioGroupSampler(
+        dataset, samples_per_gpu=4, min_bucket_size=4)
+    indices = list(iter(sampler))
+    assert len(indices) == len(sampler)
+    assert set(indices) == set(range(200))
+    for i in range(0, len(indices), 4):
+        assert len(set(sampler.flag[indices[i:i + 4]])) == 1
+
+    report = sampler.report(range(200))
+    assert report['num_buckets'] == 4
+    assert report['padding_overhead'] < report['baseline_padding_overhead']
+    assert np.isclose(
+        report['padding_overhead'],
+        padding_overhead(sampler.shapes, indices, 4),
+        atol=0.05)
+
+    # batched inference
+    sampler = AspectRatioGroupSampler(
+        dataset, samples_per_gpu=4, shuffle=False)
+    indices = list(iter(sampler))
+    assert sorted(indices) == list(range(200))
+    restored = sampler.restore_order(indices)
+    assert list(restored) == list(range(200))
+    assert restored[-1] == 199 and restored[10:12] == [10, 11]
+
+    samplers = [
+        DistributedAspectRatioGroupSampler(
+            dataset, samples_per_gpu=2, num_replicas=2, rank=rank)
+        for rank in range(2)
+    ]
+    for sampler in samplers:
+        sampler.set_epoch(1)
+    indices = [list(iter(sampler)) for sampler in samplers]
+    assert len(indices[0]) == len(indices[1]) == len(samplers[0])
+    assert set(indices[0] + indices[1]) == set(range(200))
+    for rank in range(2):
+        flag = samplers[rank].flag
+        for i in range(0, len(indices[rank]), 2):
+            assert len(set(flag[indices[rank][i:i + 2]])) == 1
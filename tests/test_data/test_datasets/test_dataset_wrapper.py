@@ -139,3 +139,49 @@ def test_dataset_wrapper():
     for idx in range(len_a):
         results_ = multi_image_mix_dataset[idx]
         assert results_['img'].shape == (img_scale[0], img_scale[1], 3)
+
+
+def test_multi_image_mix_dataset_copies():
+    img_scale = (60, 60)
+    pipeline = [
+        dict(type='Mosaic', img_scale=img_scale, pad_val=114.0),
+        dict(type='MixUp', img_scale=img_scale, pad_val=114.0),
+    ]
+
+    CustomDataset.load_annotations = MagicMock()
+    results = []
+    for _ in range(4):
+        img = np.random.randint(0, 255, (20, 30, 3)).astype(np.uint8)
+        gt_bbox = np.array([[1, 2, 11, 12], [3, 4, 13, 14]], dtype=np.float32)
+        gt_labels = np.array([1, 2])
+        results.append(dict(gt_bboxes=gt_bbox, gt_labels=gt_labels, img=img))
+    originals = [{k: v.copy() for k, v in r.items()} for r in results]
+
+    CustomDataset.__getitem__ = MagicMock(side_effect=lambda idx: results[idx])
+    dataset = CustomDataset(
+        ann_file=MagicMock(), pipeline=[], test_mode=True, img_prefix='')
+    dataset.data_infos = MagicMock()
+    dataset.data_infos.__len__.return_value = len(results)
+    dataset.get_ann_info = MagicMock(
+        side_effect=lambda idx: dict(bboxes=results[idx]['gt_bboxes']))
+
+    mix_dataset = MultiImageMixDataset(dataset, pipeline, track_allocs=True)
+    for idx in range(len(results)):
+        results_ = mix_dataset[idx]
+        assert results_['img'].shape == (img_scale[0] * 2, img_scale[1] * 2,
+                                          3)
+        assert 'mix_results' not in results[idx]
+    # the samples of the dataset are neither copied nor modified
+    for result, original in zip(results, originals):
+        assert result.keys() == original.keys()
+        for key in original:
+            np.testing.assert_array_equal(result[key], original[key])
+    stats = mix_dataset.get_alloc_stats()
+    assert stats['copies_per_sample'] == 0
+    assert stats['peak_bytes_per_sample'] > 0
+
+    mix_dataset = MultiImageMixDataset(
+        dataset, pipeline, copy_samples=True, track_allocs=True)
+    mix_dataset[0]
+    # the main sample, 3 for the mosaic and 1 for the mixup
+    assert mix_dataset.get_alloc_stats()['copies_per_sample'] == 5
@@ -1,8 +1,12 @@
+import copy
 import os.path as osp
 
+import numpy as np
+import pytest
 from mmcv.utils import build_from_cfg
 
 from mmdet.datasets.builder import PIPELINES
+from mmdet.datasets.pipelines import Compose
 
 
 def test_default_format_bundle():
@@ -21,3 +25,50 @@ def test_default_format_bundle():
     assert 'pad_shape' in results
     assert 'scale_factor' in results
     assert 'img_norm_cfg' in results
+
+
+@pytest.mark.parametrize('pad',
+                         [dict(size_divisor=32),
+                          dict(size=(1344, 1344))])
+@pytest.mark.parametrize('to_rgb', [True, False])
+def test_resize_normalize_pad(pad, to_rgb):
+    img_norm_cfg = dict(
+        mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375],
+        to_rgb=to_rgb)
+    resize = dict(img_scale=(1333, 800), keep_ratio=True)
+    flip = dict(flip_ratio=1.)
+    pipeline = Compose([
+        dict(type='LoadImageFromFile'),
+        dict(type='Resize', **resize),
+        dict(type='RandomFlip', **flip),
+        dict(type='Normalize', **img_norm_cfg),
+        dict(type='Pad', **pad),
+        dict(type='DefaultFormatBundle'),
+    ])
+    fused_pipeline = Compose([
+        dict(type='LoadImageFromFile'),
+        dict(
+            type='ResizeNormalizePad',
+            resize=resize,
+            flip=flip,
+            normalize=img_norm_cfg,
+            pad=pad),
+        dict(type='DefaultFormatBundle'),
+    ])
+    results = dict(
+        img_prefix=osp.join(osp.dirname(__file__), '../data'),
+        img_info=dict(filename='color.jpg'))
+    expected = pipeline(copy.deepcopy(results))
+    fused = fused_pipeline(copy.deepcopy(results))
+
+    assert fused['img'].data.is_contiguous()
+    assert fused['img'].data.dtype == expected['img'].data.dtype
+    assert fused['img'].data.equal(expected['img'].data)
+    for key in ('img_shape', 'pad_shape', 'pad_fixed_size',
+                'pad_size_divisor', 'flip', 'flip_direction', 'keep_ratio'):
+        assert fused[key] == expected[key]
+    np.testing.assert_array_equal(fused['scale_factor'],
+                                  expected['scale_factor'])
+    for key in ('mean', 'std', 'to_rgb'):
+        np.testing.assert_array_equal(fused['img_norm_cfg'][key],
+                                      expected['img_norm_cfg'][key])
@@ -1,11 +1,14 @@
 import copy
+import os
 import os.path as osp
+import shutil
 
 import mmcv
 import numpy as np
 
 from mmdet.datasets.pipelines import (LoadImageFromFile, LoadImageFromWebcam,
                                       LoadMultiChannelImageFromFiles)
+from mmdet.datasets.pipelines.image_cache import SharedImageCache
 
 
 class TestLoading(object):
@@ -56,6 +59,66 @@ class TestLoading(object):
         assert results['img'].shape == (288, 512)
         assert results['img'].dtype == np.uint8
 
+    def test_load_img_with_cache(self, tmp_path):
+        results = dict(
+            img_prefix=self.data_prefix, img_info=dict(filename='color.jpg'))
+        transform = LoadImageFromFile(
+            cache=dict(cache_dir=str(tmp_path), max_images=4, log_interval=0))
+        expected = LoadImageFromFile()(copy.deepcopy(results))['img']
+        for _ in range(3):
+            img = transform(copy.deepcopy(results))['img']
+            assert np.array_equal(img, expected)
+        stats = transform.cache.stats()
+        assert stats['hits'] == 2 and stats['misses'] == 1
+        assert stats['resident_bytes'] == expected.nbytes
+
+        # the least recently used images are evicted beyond the budget
+        gray = dict(
+            img_prefix=self.data_prefix, img_info=dict(filename='gray.jpg'))
+        transform.cache.max_bytes = expected.nbytes
+        transform(copy.deepcopy(gray))
+        stats = transform.cache.stats()
+        assert stats['num_images'] == 1
+        color = osp.join(self.data_prefix, 'color.jpg')
+        stat = os.stat(color)
+        assert transform.cache.get(
+            f'{color}:color:{stat.st_mtime_ns}:{stat.st_size}') is None
+
+    def test_image_cache_drifted_header(self, tmp_path):
+        cache = SharedImageCache(
+            cache_dir=str(tmp_path), max_bytes=100, max_images=4)
+        img = np.arange(60, dtype=np.uint8).reshape(6, 10)
+        cache.put('a', img)
+        # the resident bytes of the header are beyond the cached images
+        cache._header[cache._field('resident_bytes')] = 1000
+        cache.put('b', img)
+        stats = cache.stats()
+        assert stats['resident_bytes'] == img.nbytes
+        assert stats['num_images'] == 1
+        assert cache.get('a') is None
+        assert np.array_equal(cache.get('b'), img)
+
+    def test_load_img_with_cache_replaced_file(self, tmp_path):
+        img_dir = tmp_path / 'images'
+        img_dir.mkdir()
+        filename = str(img_dir / 'img.jpg')
+        shutil.copyfile(osp.join(self.data_prefix, 'color.jpg'), filename)
+        results = dict(img_prefix=None, img_info=dict(filename=filename))
+        transform = LoadImageFromFile(
+            color_type='unchanged',
+            cache=dict(
+                cache_dir=str(tmp_path / 'cache'), max_images=4,
+                log_interval=0))
+        assert transform(copy.deepcopy(results))['img'].ndim == 3
+
+        # the decoded pixels of the old file are not served anymore
+        shutil.copyfile(osp.join(self.data_prefix, 'gray.jpg'), filename)
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        img = transform(copy.deepcopy(results))['img']
+        assert img.shape == (288, 512)
+        assert transform.cache.stats()['misses'] == 2
+
     def test_load_multi_channel_img(self):
         results = dict(
             img_prefix=self.data_prefix,
@@ -0,0 +1,73 @@
+import multiprocessing
+import shutil
+
+import numpy as np
+
+from mmdet.datasets.pipelines import Compose
+
+
+def test_pipeline_profiler(tmp_path, monkeypatch):
+    from mmdet.datasets.pipelines import profiler as profiler_module
+    from mmdet.datasets.pipelines import (PipelineProfiler,
+                                          enable_pipeline_profiling,
+                                          format_pipeline_summary)
+
+    def add_img(results):
+        results['img'] = np.zeros((4, 5, 3), dtype=np.uint8)
+        return results
+
+    def drop(results):
+        return None if results['drop'] else results
+
+    # no profiler
+    monkeypatch.setattr(profiler_module, '_profiler', None)
+    assert Compose([add_img]).profiler is None
+
+    profiler = enable_pipeline_profiling(stats_dir=str(tmp_path))
+    pipeline = Compose([add_img, drop])
+    assert pipeline.slots == [0, 1]
+    for i in range(3):
+        results = pipeline(dict(drop=i == 2))
+    assert results is None
+
+    summary = {stats['name']: stats for stats in profiler.summary(tmp_path)}
+    assert set(summary) == {'add_img', 'drop'}
+    assert summary['add_img']['calls'] == 3
+    assert summary['add_img']['output_bytes'] == 4 * 5 * 3
+    assert summary['drop']['calls'] == 3
+    assert summary['drop']['output_bytes'] == 4 * 5 * 3 * 2 / 3
+    assert abs(sum(s['time_ratio'] for s in summary.values()) - 1) < 1e-6
+    assert 'add_img' in format_pipeline_summary(list(summary.values()))
+
+    # the statistics of another job using the same directory are left out
+    for filename in tmp_path.glob(f'{profiler.main_pid}.*'):
+        other = tmp_path / filename.name.replace(str(profiler.main_pid),
+                                                 'other', 1)
+        shutil.copyfile(filename, other)
+    summary = {
+        stats['name']: stats
+        for stats in profiler.summary(tmp_path, profiler.main_pid)
+    }
+    assert summary['add_img']['calls'] == 3
+    summary = {stats['name']: stats for stats in profiler.summary(tmp_path)}
+    assert summary['add_img']['calls'] == 6
+    for filename in tmp_path.glob('other.*'):
+        filename.unlink()
+
+    # every worker process writes its own statistics file
+    workers = [
+        multiprocessing.get_context('fork').Process(
+            target=pipeline, args=(dict(drop=False), )) for _ in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(list(tmp_path.glob('*.stats'))) == 3
+    summary = {stats['name']: stats for stats in profiler.summary(tmp_path)}
+    assert summary['add_img']['calls'] == 5
+
+    # the files of the exited workers are removed
+    profiler.reset()
+    assert len(list(tmp_path.glob('*.stats'))) == 1
+    assert PipelineProfiler.summary(str(tmp_path)) == []
@@ -1,6 +1,6 @@
 import pytest
 
-from mmdet.datasets import replace_ImageToTensor
+from mmdet.datasets import fuse_resize_normalize_pad, replace_ImageToTensor
 
 
 def test_replace_ImageToTensor():
@@ -59,3 +59,51 @@ def test_replace_ImageToTensor():
     ]
     with pytest.warns(UserWarning):
         assert expected_pipelines == replace_ImageToTensor(pipelines)
+
+
+def test_fuse_resize_normalize_pad():
+    img_norm_cfg = dict(mean=[0, 0, 0], std=[1, 1, 1])
+    pipelines = [
+        dict(type='LoadImageFromFile'),
+        dict(
+            type='MultiScaleFlipAug',
+            img_scale=(1333, 800),
+            flip=False,
+            transforms=[
+                dict(type='Resize', keep_ratio=True),
+                dict(type='RandomFlip'),
+                dict(type='Normalize', **img_norm_cfg),
+                dict(type='Pad', size_divisor=32),
+                dict(type='ImageToTensor', keys=['img']),
+                dict(type='Collect', keys=['img']),
+            ])
+    ]
+    expected_pipelines = [
+        dict(type='LoadImageFromFile'),
+        dict(
+            type='MultiScaleFlipAug',
+            img_scale=(1333, 800),
+            flip=False,
+            transforms=[
+                dict(
+                    type='ResizeNormalizePad',
+                    resize=dict(keep_ratio=True),
+                    flip=dict(),
+                    normalize=img_norm_cfg,
+                    pad=dict(size_divisor=32),
+                    dtype='float16'),
+                dict(type='ImageToTensor', keys=['img']),
+                dict(type='Collect', keys=['img']),
+            ])
+    ]
+    assert expected_pipelines == fuse_resize_normalize_pad(
+        pipelines, dtype='float16')
+
+    # only when the image is formatted right after padding
+    pipelines = [
+        dict(type='Resize', keep_ratio=True),
+        dict(type='Normalize', **img_norm_cfg),
+        dict(type='Pad', size_divisor=32),
+        dict(type='Collect', keys=['img']),
+    ]
+    assert pipelines == fuse_resize_normalize_pad(pipelines)
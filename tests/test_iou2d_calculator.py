@@ -103,3 +103,37 @@ def test_bbox_overlaps_2d(eps=1e-7):
     ious = bbox_overlaps(bboxes1, bboxes2, 'iof', eps=eps)
     assert torch.all(ious >= -1) and torch.all(ious <= 1)
     assert ious.size() == (bboxes1.size(0), bboxes2.size(0))
+
+
+@pytest.mark.parametrize('mode', ['iou', 'iof'])
+@pytest.mark.parametrize('max_elements', [1, 7, 2**22])
+def test_eval_bbox_overlaps(mode, max_elements):
+    from mmdet.core.evaluation.bbox_overlaps import \
+        bbox_overlaps as eval_bbox_overlaps
+
+    def _reference(bboxes1, bboxes2):
+        area1 = (bboxes1[:, 2] - bboxes1[:, 0]) * (
+            bboxes1[:, 3] - bboxes1[:, 1])
+        area2 = (bboxes2[:, 2] - bboxes2[:, 0]) * (
+            bboxes2[:, 3] - bboxes2[:, 1])
+        ious = np.zeros((len(bboxes1), len(bboxes2)), dtype=np.float32)
+        for i in range(len(bboxes1)):
+            w = np.minimum(bboxes1[i, 2], bboxes2[:, 2]) - np.maximum(
+                bboxes1[i, 0], bboxes2[:, 0])
+            h = np.minimum(bboxes1[i, 3], bboxes2[:, 3]) - np.maximum(
+                bboxes1[i, 1], bboxes2[:, 1])
+            overlap = np.maximum(w, 0) * np.maximum(h, 0)
+            union = area1[i] + area2 - overlap if mode == 'iou' else area1[i]
+            ious[i] = overlap / np.maximum(union, 1e-6)
+        return ious
+
+    rng = np.random.RandomState(0)
+    for num1, num2 in [(13, 5), (5, 13), (0, 4), (4, 0)]:
+        xy = rng.rand(num1 + num2, 2).astype(np.float32) * 50
+        wh = rng.rand(num1 + num2, 2).astype(np.float32) * 30
+        bboxes = np.concatenate([xy, xy + wh], axis=1)
+        bboxes1, bboxes2 = bboxes[:num1], bboxes[num1:]
+        ious = eval_bbox_overlaps(
+            bboxes1, bboxes2, mode, max_elements=max_elements)
+        assert ious.shape == (num1, num2)
+        assert np.allclose(ious, _reference(bboxes1, bboxes2), atol=1e-6)
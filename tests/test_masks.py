@@ -653,3 +653,95 @@ def test_polygon_mask_iter():
     polygon_masks = PolygonMasks(raw_masks, 28, 28)
     for i, polygon_mask in enumerate(polygon_masks):
         assert np.equal(polygon_mask, raw_masks[i]).all()
+
+
+@pytest.mark.parametrize('mem_limit', [1, 1024**3])
+@pytest.mark.parametrize('mask_thr_binary', [0.5, 0.3])
+def test_mask2result(mem_limit, mask_thr_binary):
+    import pycocotools.mask as mask_util
+    import torch.nn.functional as F
+
+    from mmdet.core.mask import encode_mask_results
+    from mmdet.core.mask.transforms import mask2result
+
+    def _paste_full_image(bbox, mask, img_h, img_w):
+        img_y = torch.arange(img_h, dtype=torch.float32) + 0.5
+        img_x = torch.arange(img_w, dtype=torch.float32) + 0.5
+        x0, y0, x1, y1 = bbox
+        img_y = (img_y - y0) / (y1 - y0) * 2 - 1
+        img_x = (img_x - x0) / (x1 - x0) * 2 - 1
+        img_x[torch.isinf(img_x)] = 0
+        img_y[torch.isinf(img_y)] = 0
+        gx = img_x[None, :].expand(img_h, img_w)
+        gy = img_y[:, None].expand(img_h, img_w)
+        grid = torch.stack([gx, gy], dim=2)
+        img_mask = F.grid_sample(
+            mask[None, None], grid[None], align_corners=False)[0, 0]
+        return (img_mask >= mask_thr_binary).numpy()
+
+    img_h, img_w = 60, 80
+    num_classes = 3
+    rng = np.random.RandomState(0)
+    bboxes = dummy_bboxes(12, img_h, img_w).astype(np.float32)
+    # out of image, degenerate and huge boxes
+    bboxes = np.concatenate([
+        bboxes,
+        np.array([[85, 10, 95, 20], [10, 10, 10, 30], [-20, -20, 200, 200]],
+                 dtype=np.float32)
+    ])
+    bboxes = np.concatenate([bboxes, rng.rand(len(bboxes), 1)], axis=1)
+    labels = rng.randint(0, num_classes, size=len(bboxes))
+    masks = rng.rand(len(bboxes), 28, 28).astype(np.float32)
+    masks[:, :2] = 1
+
+    results = mask2result(
+        bboxes,
+        labels,
+        masks,
+        num_classes,
+        mask_thr_binary=mask_thr_binary,
+        img_size=(img_h, img_w),
+        mem_limit=mem_limit)
+    rle_results = mask2result(
+        torch.from_numpy(bboxes),
+        torch.from_numpy(labels),
+        torch.from_numpy(masks),
+        num_classes,
+        mask_thr_binary=mask_thr_binary,
+        img_size=(img_h, img_w),
+        encode=True,
+        mem_limit=mem_limit)
+    threaded_results = mask2result(
+        bboxes,
+        labels,
+        masks,
+        num_classes,
+        mask_thr_binary=mask_thr_binary,
+        img_size=(img_h, img_w),
+        mem_limit=mem_limit,
+        num_workers=2)
+    expected = [[] for _ in range(num_classes)]
+    for bbox, label, mask in zip(bboxes, labels, masks):
+        expected[label].append(
+            _paste_full_image(
+                torch.from_numpy(bbox[:4]), torch.from_numpy(mask), img_h,
+                img_w))
+    for cls_masks, cls_rles, cls_threaded, cls_expected in zip(
+            results, rle_results, threaded_results, expected):
+        assert len(cls_masks) == len(cls_rles) == len(cls_threaded) == len(
+            cls_expected)
+        for mask, rle, threaded_mask, expected_mask in zip(
+                cls_masks, cls_rles, cls_threaded, cls_expected):
+            assert mask.dtype == bool
+            assert np.array_equal(mask, expected_mask)
+            assert np.array_equal(mask_util.decode(rle), expected_mask)
+            assert np.array_equal(threaded_mask, expected_mask)
+    # the masks encoded by mask2result are not encoded again
+    assert encode_mask_results(rle_results) is rle_results
+
+    assert mask2result(
+        np.zeros((0, 5)),
+        np.zeros(0, dtype=np.int64),
+        np.zeros((0, 28, 28)),
+        num_classes,
+        img_size=(img_h, img_w)) == [[], [], []]
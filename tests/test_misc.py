@@ -1,3 +1,6 @@
+import pickle
+from multiprocessing import Pool
+
 import numpy as np
 import pytest
 import torch
@@ -45,3 +48,142 @@ def test_mask2ndarray():
     raw_masks = []
     with pytest.raises(TypeError):
         output_mask = mask2ndarray(raw_masks)
+
+
+def test_sharded_result_sink(tmp_path):
+    from mmdet.apis import ShardedResults, ShardedResultSink, dump_results
+
+    def _result(i):
+        return [np.full((i % 3, 5), i, dtype=np.float32)]
+
+    sink = ShardedResultSink(str(tmp_path), shard_size=3, rank=0)
+    sink.extend([_result(i) for i in range(8)])
+    results = sink.get_results()
+    assert len(sink.shard_files) == 3
+    assert len(results) == 8
+    for i in range(8):
+        assert np.array_equal(results[i][0], _result(i)[0])
+    assert np.array_equal(results[-1][0], _result(7)[0])
+    assert len(results[2:5]) == 3
+    with pytest.raises(IndexError):
+        results[8]
+
+    # results of two ranks are interleaved and the padding is dropped
+    sink = ShardedResultSink(str(tmp_path), shard_size=3, rank=1)
+    sink.extend([_result(i) for i in range(100, 108)])
+    sink.close()
+    index_files = [
+        ShardedResultSink.get_index_file(str(tmp_path), rank)
+        for rank in range(2)
+    ]
+    results = ShardedResults(index_files, size=15)
+    assert len(results) == 15
+    assert np.array_equal(results[0][0], _result(0)[0])
+    assert np.array_equal(results[1][0], _result(100)[0])
+    assert np.array_equal(results[14][0], _result(7)[0])
+
+    # the shard files are kept open, up to max_open_files of them
+    results = ShardedResults(index_files, size=15, max_open_files=2)
+    for i, result in enumerate(results):
+        expected = _result(i // 2 + (i % 2) * 100)
+        assert np.array_equal(result[0], expected[0])
+        assert len(results._files) <= 2
+    results = pickle.loads(pickle.dumps(results))
+    assert len(results._files) == 0
+    assert np.array_equal(results[14][0], _result(7)[0])
+    results.close()
+
+    # the sharded results are dumped as a list
+    out_file = str(tmp_path / 'results.pkl')
+    dump_results(results, out_file)
+    with open(out_file, 'rb') as f:
+        dumped = pickle.load(f)
+    assert isinstance(dumped, list) and len(dumped) == 15
+    assert np.array_equal(dumped[14][0], _result(7)[0])
+
+
+@pytest.mark.parametrize('num_workers', [0, 2])
+def test_mask_encode_stage(num_workers):
+    import pycocotools.mask as mask_util
+
+    from mmdet.apis import ListResultSink, MaskEncodeStage
+
+    def _result(i):
+        rng = np.random.RandomState(i)
+        bboxes = [np.zeros((i % 3, 5)), np.zeros((1, 5))]
+        masks = [[rng.rand(20, 30) > 0.5 for _ in range(i % 3)],
+                 [rng.rand(20, 30) > 0.5]]
+        return bboxes, masks
+
+    sink = ListResultSink()
+    encode_stage = MaskEncodeStage(sink, num_workers, max_pending=1)
+    for i in range(0, 12, 3):
+        encode_stage.put([_result(i + j) for j in range(3)])
+    encode_stage.close()
+    results = sink.get_results()
+    assert len(results) == 12
+    for i, (bboxes, rles) in enumerate(results):
+        _, masks = _result(i)
+        assert [len(cls_rles) for cls_rles in rles] == [i % 3, 1]
+        for cls_rles, cls_masks in zip(rles, masks):
+            for rle, mask in zip(cls_rles, cls_masks):
+                assert np.array_equal(mask_util.decode(rle), mask)
+
+
+def random_text_objects(rng, num, with_score=False):
+    objects = []
+    for _ in range(num):
+        x, y = rng.uniform(0, 200, 2)
+        w, h = rng.uniform(5, 60, 2)
+        segmentation = np.array([x, y, x + w, y, x + w, y + h, x, y + h])
+        segmentation += rng.uniform(-3, 3, 8)
+        obj = dict(segmentation=segmentation.tolist(), bbox=[x, y, w, h])
+        if with_score:
+            obj['score'] = float(rng.uniform())
+        else:
+            transcription = '###' if rng.rand() < 0.1 else 'word'
+            obj['text'] = dict(transcription=transcription)
+        objects.append(obj)
+    return objects
+
+
+def test_text_eval():
+    from mmdet.core.evaluation.text_evaluation import (get_iou_matrix,
+                                                       polygon_from_points,
+                                                       text_eval)
+
+    def _iou(polygon1, polygon2):
+        intersection = (polygon1 & polygon2).area
+        union = polygon1.area + polygon2.area - intersection
+        return intersection / union if union else 0.0
+
+    rng = np.random.RandomState(0)
+    gt_polygons = [
+        polygon_from_points(obj['segmentation'])
+        for obj in random_text_objects(rng, 30)
+    ]
+    pr_polygons = [
+        polygon_from_points(obj['segmentation'])
+        for obj in random_text_objects(rng, 40, with_score=True)
+    ]
+    iou_mat = get_iou_matrix(gt_polygons, pr_polygons)
+    expected = np.array([[
+        _iou(gt_polygon, pr_polygon) for pr_polygon in pr_polygons
+    ] for gt_polygon in gt_polygons])
+    assert np.array_equal(iou_mat, expected)
+
+    gt_annotations = {
+        i: random_text_objects(rng, rng.randint(0, 20))
+        for i in range(8)
+    }
+    pr_annotations = [
+        random_text_objects(rng, rng.randint(0, 20), with_score=True)
+        for _ in range(8)
+    ]
+    serial = text_eval(pr_annotations, gt_annotations, 0.3)
+    parallel = text_eval(pr_annotations, gt_annotations, 0.3, nproc=2)
+    assert serial == parallel
+    # a pool reused by several calls
+    with Pool(2) as pool:
+        assert text_eval(
+            pr_annotations, gt_annotations, 0.3, nproc=2, pool=pool) == serial
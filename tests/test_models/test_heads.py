@@ -9,7 +9,8 @@ import numpy as np
 import torch
 import pytest
 
-from mmdet.core import bbox2roi, build_assigner, build_sampler
+from mmdet.core import (bbox2roi, build_assigner, build_bbox_coder,
+                        build_sampler)
 from mmdet.core.evaluation.bbox_overlaps import bbox_overlaps
 from mmdet.models.dense_heads import (AnchorHead, CornerHead, FCOSHead,
                                       FSAFHead, GuidedAnchorHead, PAAHead,
@@ -324,6 +325,138 @@ def test_anchor_head_loss():
     assert onegt_box_loss.item() > 0, 'box loss should be non-zero'
 
 
+def test_anchor_head_batched_targets():
+    """Tests the batched targets are the ones of the images."""
+    s = 128
+    img_metas = [{
+        'img_shape': (s, s - 20, 3),
+        'pad_shape': (s, s, 3)
+    }, {
+        'img_shape': (s - 30, s, 3),
+        'pad_shape': (s, s, 3)
+    }]
+    gt_bboxes = [
+        torch.Tensor([[23.6, 23.8, 98.6, 101.8], [5., 60., 40., 90.]]),
+        torch.empty((0, 4))
+    ]
+    gt_labels = [torch.LongTensor([2, 0]), torch.LongTensor([])]
+    for loss_cls in [
+            dict(type='CrossEntropyLoss', use_sigmoid=True),
+            dict(type='FocalLoss', use_sigmoid=True)
+    ]:
+        cfg = mmcv.Config(
+            dict(
+                assigner=dict(
+                    type='MaxIoUAssigner',
+                    pos_iou_thr=0.5,
+                    neg_iou_thr=0.4,
+                    min_pos_iou=0,
+                    ignore_iof_thr=-1),
+                sampler=dict(
+                    type='RandomSampler',
+                    num=64,
+                    pos_fraction=0.5,
+                    neg_pos_ub=-1,
+                    add_gt_as_proposals=False),
+                allowed_border=0,
+                pos_weight=-1,
+                debug=False))
+        self = AnchorHead(
+            num_classes=4, in_channels=1, train_cfg=cfg, loss_cls=loss_cls)
+        featmap_sizes = [(s // stride, s // stride)
+                         for stride in [4, 8, 16, 32, 64]]
+        anchor_list, valid_flag_list = self.get_anchors(
+            featmap_sizes, img_metas, device='cpu')
+
+        for return_sampling_results in [False, True]:
+            targets = []
+            for batched in [False, True]:
+                self.train_cfg.batched_targets = batched
+                assert self._can_batch_targets() == batched
+                torch.manual_seed(0)
+                targets.append(
+                    self.get_targets(
+                        anchor_list,
+                        valid_flag_list,
+                        gt_bboxes,
+                        img_metas,
+                        gt_labels_list=gt_labels,
+                        return_sampling_results=return_sampling_results))
+            for expected, result in zip(*targets):
+                if not isinstance(expected, list):
+                    assert expected == result
+                    continue
+                for expected_item, item in zip(expected, result):
+                    if isinstance(expected_item, torch.Tensor):
+                        assert torch.equal(expected_item, item)
+                    else:
+                        assert torch.equal(expected_item.pos_inds,
+                                           item.pos_inds)
+                        assert torch.equal(expected_item.neg_inds,
+                                           item.neg_inds)
+
+    # only the elementwise coder is batched, unless the boxes are decoded
+    self.bbox_coder = build_bbox_coder(
+        dict(type='TBLRBBoxCoder', normalizer=4.0))
+    assert not self._can_batch_targets()
+    self.reg_decoded_bbox = True
+    assert self._can_batch_targets()
+
+
+def test_anchor_head_batched_targets_with_tiles():
+    """Tests the tiled assigner is not bypassed by the batched targets."""
+    s = 128
+    img_metas = [{
+        'img_shape': (s, s, 3),
+        'pad_shape': (s, s, 3)
+    }, {
+        'img_shape': (s - 30, s, 3),
+        'pad_shape': (s, s, 3)
+    }]
+    gt_bboxes = [
+        torch.Tensor([[23.6, 23.8, 98.6, 101.8], [5., 60., 40., 90.],
+                      [50., 10., 120., 70.]]),
+        torch.Tensor([[10., 10., 60., 60.]])
+    ]
+    gt_labels = [torch.LongTensor([2, 0, 1]), torch.LongTensor([3])]
+    targets = []
+    for tile_elements in [-1, 3 * 64]:
+        cfg = mmcv.Config(
+            dict(
+                assigner=dict(
+                    type='MaxIoUAssigner',
+                    pos_iou_thr=0.5,
+                    neg_iou_thr=0.4,
+                    min_pos_iou=0,
+                    ignore_iof_thr=-1,
+                    tile_elements=tile_elements),
+                sampler=dict(type='PseudoSampler'),
+                allowed_border=0,
+                pos_weight=-1,
+                batched_targets=True,
+                debug=False))
+        self = AnchorHead(num_classes=4, in_channels=1, train_cfg=cfg)
+        # the tiled assigner assigns the images one by one
+        assert self._can_batch_targets() == (tile_elements <= 0)
+        featmap_sizes = [(s // stride, s // stride)
+                         for stride in [4, 8, 16, 32, 64]]
+        anchor_list, valid_flag_list = self.get_anchors(
+            featmap_sizes, img_metas, device='cpu')
+        targets.append(
+            self.get_targets(
+                anchor_list,
+                valid_flag_list,
+                gt_bboxes,
+                img_metas,
+                gt_labels_list=gt_labels))
+    for expected, result in zip(*targets):
+        if not isinstance(expected, list):
+            assert expected == result
+            continue
+        for expected_item, item in zip(expected, result):
+            assert torch.equal(expected_item, item)
+
+
 def test_fsaf_head_loss():
     """Tests anchor head loss when truth is empty and non-empty."""
     s = 256
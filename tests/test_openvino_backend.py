@@ -0,0 +1,45 @@
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip('openvino')
+
+from mmdet.utils.deployment.openvino_backend import Model  # noqa: E402
+
+
+class FailingRequest:
+
+    def set_completion_callback(self, callback, py_data):
+        self.callback = callback
+
+    def async_infer(self, inputs):
+        raise RuntimeError('failed to start the request')
+
+
+class FakeExecNet:
+
+    def __init__(self, num_requests):
+        self.requests = [FailingRequest() for _ in range(num_requests)]
+
+
+def test_infer_async_failure():
+    """Tests a request that fails to start is released."""
+    model = Model.__new__(Model)
+    model.input_shapes = {'image': (1, 3, 4, 4)}
+    model.shape_buckets = None
+    model.exec_net = FakeExecNet(num_requests=1)
+    model.idle_requests = queue.Queue()
+    model.idle_requests.put(0)
+    model.num_pending = 0
+    model.requests_done = threading.Condition()
+
+    inputs = {'image': np.zeros((1, 3, 4, 4), dtype=np.float32)}
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            model.infer_async(inputs, lambda *args: None)
+        assert model.num_pending == 0
+        assert model.idle_requests.qsize() == 1
+    # returns at once instead of waiting for the failed requests
+    model.wait_all()
@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy as np
+
+from mmdet.core.evaluation.bbox_overlaps import bbox_overlaps
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the NumPy bbox_overlaps used in evaluation')
+    parser.add_argument(
+        '--sizes',
+        type=str,
+        nargs='+',
+        default=['20x100', '100x1000', '50x2000', '300x5000'],
+        help='pairs of box counts "NxK" to benchmark, e.g. number of GTs x '
+        'number of detections or proposals')
+    parser.add_argument(
+        '--repeat', type=int, default=20, help='number of timed runs')
+    parser.add_argument(
+        '--max-elements',
+        type=int,
+        default=2**22,
+        help='memory cap of the vectorized implementation')
+    args = parser.parse_args()
+    return args
+
+
+def bbox_overlaps_loop(bboxes1, bboxes2, mode='iou', eps=1e-6):
+    """Original row-by-row implementation, kept as a reference."""
+    bboxes1 = bboxes1.astype(np.float32)
+    bboxes2 = bboxes2.astype(np.float32)
+    rows = bboxes1.shape[0]
+    cols = bboxes2.shape[0]
+    ious = np.zeros((rows, cols), dtype=np.float32)
+    if rows * cols == 0:
+        return ious
+    exchange = False
+    if bboxes1.shape[0] > bboxes2.shape[0]:
+        bboxes1, bboxes2 = bboxes2, bboxes1
+        ious = np.zeros((cols, rows), dtype=np.float32)
+        exchange = True
+    area1 = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
+    area2 = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
+    for i in range(bboxes1.shape[0]):
+        x_start = np.maximum(bboxes1[i, 0], bboxes2[:, 0])
+        y_start = np.maximum(bboxes1[i, 1], bboxes2[:, 1])
+        x_end = np.minimum(bboxes1[i, 2], bboxes2[:, 2])
+        y_end = np.minimum(bboxes1[i, 3], bboxes2[:, 3])
+        overlap = np.maximum(x_end - x_start, 0) * np.maximum(
+            y_end - y_start, 0)
+        if mode == 'iou':
+            union = area1[i] + area2 - overlap
+        else:
+            union = area1[i] if not exchange else area2
+        union = np.maximum(union, eps)
+        ious[i, :] = overlap / union
+    if exchange:
+        ious = ious.T
+    return ious
+
+
+def random_bboxes(num, rng, img_size=1000):
+    xy = rng.rand(num, 2).astype(np.float32) * img_size
+    wh = rng.rand(num, 2).astype(np.float32) * img_size / 4
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+def timeit(func, repeat):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    args = parse_args()
+    rng = np.random.RandomState(0)
+
+    print(f'{"size":>12} {"loop (ms)":>12} {"vectorized (ms)":>16} '
+          f'{"speedup":>8}')
+    for size in args.sizes:
+        num1, num2 = (int(x) for x in size.split('x'))
+        bboxes1 = random_bboxes(num1, rng)
+        bboxes2 = random_bboxes(num2, rng)
+        assert np.allclose(
+            bbox_overlaps_loop(bboxes1, bboxes2),
+            bbox_overlaps(
+                bboxes1, bboxes2, max_elements=args.max_elements),
+            atol=1e-6)
+        loop_time = timeit(lambda: bbox_overlaps_loop(bboxes1, bboxes2),
+                           args.repeat)
+        vec_time = timeit(
+            lambda: bbox_overlaps(
+                bboxes1, bboxes2, max_elements=args.max_elements),
+            args.repeat)
+        print(f'{size:>12} {loop_time:>12.3f} {vec_time:>16.3f} '
+              f'{loop_time / vec_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
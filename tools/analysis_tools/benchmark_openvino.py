@@ -0,0 +1,106 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from mmdet.utils.deployment.openvino_backend import Detector
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the throughput of a detector exported to '
+        'OpenVINO with several requests in flight')
+    parser.add_argument('model', help='path to the xml file of the IR')
+    parser.add_argument('--device', default='CPU', help='inference device')
+    parser.add_argument(
+        '--num-requests',
+        type=int,
+        default=4,
+        help='number of infer requests kept in flight')
+    parser.add_argument(
+        '--max-batch-size',
+        type=int,
+        default=1,
+        help='number of images batched together, only for networks with '
+        'DetectionOutput')
+    parser.add_argument(
+        '--shape',
+        type=int,
+        nargs=2,
+        default=None,
+        help='input height and width, the ones of the IR by default')
+    parser.add_argument(
+        '--num-images', type=int, default=500, help='number of timed images')
+    parser.add_argument(
+        '--num-warmup', type=int, default=20, help='number of warmup images')
+    args = parser.parse_args()
+    return args
+
+
+def run(model, image, num_images):
+    """Infer ``num_images`` times and return the wall time and latencies."""
+    latencies = np.zeros(num_images, dtype=np.float64)
+    lock = threading.Lock()
+    failures = []
+
+    def on_done(outputs, userdata, exception):
+        i, start = userdata
+        latencies[i] = time.perf_counter() - start
+        if exception is not None:
+            with lock:
+                failures.append(exception)
+
+    start = time.perf_counter()
+    for i in range(num_images):
+        model.infer_async(image, on_done, (i, time.perf_counter()))
+    model.wait_all()
+    total_time = time.perf_counter() - start
+    if failures:
+        raise failures[0]
+    return total_time, latencies
+
+
+def main():
+    args = parse_args()
+    model = Detector(
+        args.model,
+        device=args.device,
+        num_requests=args.num_requests,
+        max_batch_size=args.max_batch_size)
+    _, c, h, w = model.net.input_info['image'].input_data.shape
+    if args.shape is not None:
+        h, w = args.shape
+    rng = np.random.RandomState(0)
+    image = (rng.rand(1, c, h, w) * 255).astype(np.float32)
+
+    run(model, image, args.num_warmup)
+    total_time, latencies = run(model, image, args.num_images)
+
+    latencies *= 1000
+    print(f'requests in flight: {args.num_requests}, '
+          f'batch size: {args.max_batch_size}')
+    print(f'throughput: {args.num_images / total_time:.2f} FPS')
+    print(f'latency (ms): mean {latencies.mean():.2f}, '
+          f'p50 {np.percentile(latencies, 50):.2f}, '
+          f'p90 {np.percentile(latencies, 90):.2f}, '
+          f'p99 {np.percentile(latencies, 99):.2f}, '
+          f'max {latencies.max():.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core.bbox.assigners import SimOTAAssigner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the dynamic-k matching of SimOTAAssigner')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[10, 50, 100, 200, 400],
+        help='numbers of GTs per image to benchmark')
+    parser.add_argument(
+        '--num-priors',
+        type=int,
+        default=8400,
+        help='number of priors in the GTs or their centers, 8400 being all '
+        'the priors of a 640x640 YOLOX input')
+    parser.add_argument(
+        '--device', default='cpu', help='device used for the benchmark')
+    parser.add_argument(
+        '--repeat', type=int, default=20, help='number of timed runs')
+    args = parser.parse_args()
+    return args
+
+
+def dynamic_k_matching_loop(assigner, cost, pairwise_ious, num_gt,
+                            valid_mask):
+    """Original per-GT implementation, kept as a reference."""
+    matching_matrix = torch.zeros_like(cost)
+    topk_ious, _ = torch.topk(pairwise_ious, assigner.candidate_topk, dim=0)
+    dynamic_ks = torch.clamp(topk_ious.sum(0).int(), min=1)
+    for gt_idx in range(num_gt):
+        _, pos_idx = torch.topk(
+            cost[:, gt_idx], k=dynamic_ks[gt_idx].item(), largest=False)
+        matching_matrix[:, gt_idx][pos_idx] = 1.0
+
+    prior_match_gt_mask = matching_matrix.sum(1) > 1
+    if prior_match_gt_mask.sum() > 0:
+        cost_min, cost_argmin = torch.min(
+            cost[prior_match_gt_mask, :], dim=1)
+        matching_matrix[prior_match_gt_mask, :] *= 0.0
+        matching_matrix[prior_match_gt_mask, cost_argmin] = 1.0
+    fg_mask_inboxes = matching_matrix.sum(1) > 0.0
+    valid_mask[valid_mask.clone()] = fg_mask_inboxes
+
+    matched_gt_inds = matching_matrix[fg_mask_inboxes, :].argmax(1)
+    matched_pred_ious = (matching_matrix *
+                         pairwise_ious).sum(1)[fg_mask_inboxes]
+    return matched_pred_ious, matched_gt_inds
+
+
+def random_costs(num_priors, num_gt, device, generator):
+    """Costs and IoUs of priors overlapping a few GTs each, like the ones of
+    crowded scenes."""
+    ious = torch.rand(num_priors, num_gt, generator=generator)
+    ious *= torch.rand(num_priors, num_gt, generator=generator) < 0.05
+    cls_cost = torch.rand(num_priors, num_gt, generator=generator)
+    cost = cls_cost - 3.0 * torch.log(ious + 1e-7) + (ious == 0) * 1e8
+    return cost.to(device), ious.to(device)
+
+
+def timeit(func, repeat, device):
+    func()
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    args = parse_args()
+    assigner = SimOTAAssigner()
+    generator = torch.Generator().manual_seed(0)
+
+    print(f'{"num_gts":>8} {"loop (ms)":>12} {"vectorized (ms)":>16} '
+          f'{"speedup":>8}')
+    for num_gt in args.num_gts:
+        cost, ious = random_costs(args.num_priors, num_gt, args.device,
+                                  generator)
+        valid_mask = torch.ones(
+            args.num_priors, dtype=torch.bool, device=args.device)
+
+        expected_mask, mask = valid_mask.clone(), valid_mask.clone()
+        expected = dynamic_k_matching_loop(assigner, cost, ious, num_gt,
+                                           expected_mask)
+        result = assigner.dynamic_k_matching(cost, ious, num_gt, mask)
+        assert torch.equal(expected_mask, mask)
+        assert torch.equal(expected[1], result[1])
+        assert torch.allclose(expected[0], result[0])
+
+        loop_time = timeit(
+            lambda: dynamic_k_matching_loop(assigner, cost, ious, num_gt,
+                                            valid_mask.clone()), args.repeat,
+            args.device)
+        vec_time = timeit(
+            lambda: assigner.dynamic_k_matching(cost, ious, num_gt,
+                                                valid_mask.clone()),
+            args.repeat, args.device)
+        print(f'{num_gt:>8} {loop_time:>12.3f} {vec_time:>16.3f} '
+              f'{loop_time / vec_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import time
+
+from mmcv import Config, DictAction
+
+from mmdet.datasets import build_dataloader, build_dataset
+from mmdet.datasets.pipelines import (PipelineProfiler,
+                                      enable_pipeline_profiling,
+                                      format_pipeline_summary)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Profile the transforms of the data pipeline')
+    parser.add_argument('config', nargs='?', help='config file path')
+    parser.add_argument(
+        '--split',
+        default='train',
+        choices=['train', 'val', 'test'],
+        help='dataset split to profile')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        default=500,
+        help='number of samples to load')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='number of dataloader workers, defaults to the one of the config')
+    parser.add_argument(
+        '--no-trace-alloc',
+        action='store_true',
+        help='do not trace the memory allocated by the transforms')
+    parser.add_argument(
+        '--stats-dir',
+        default='/dev/shm/mmdet_pipeline_stats',
+        help='directory of the statistics, only summarize it if no config '
+        'is given, e.g. to inspect a training profiled with '
+        '`pipeline_profile` in its config')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file.')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.config is None:
+        print(format_pipeline_summary(PipelineProfiler.summary(
+            args.stats_dir)))
+        return
+
+    cfg = Config.fromfile(args.config)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    workers = cfg.data.workers_per_gpu if args.workers is None \
+        else args.workers
+
+    profiler = enable_pipeline_profiling(
+        stats_dir=args.stats_dir,
+        trace_alloc=not args.no_trace_alloc)
+    dataset_cfg = cfg.data[args.split]
+    if args.split != 'train':
+        dataset_cfg.test_mode = True
+    dataset = build_dataset(dataset_cfg)
+    data_loader = build_dataloader(
+        dataset,
+        samples_per_gpu=1,
+        workers_per_gpu=workers,
+        dist=False,
+        shuffle=True)
+
+    num_samples = min(args.num_samples, len(dataset))
+    start = time.perf_counter()
+    for i, _ in enumerate(data_loader):
+        if i + 1 >= num_samples:
+            break
+    elapsed = time.perf_counter() - start
+    print(f'Loaded {num_samples} samples with {workers} workers in '
+          f'{elapsed:.1f} s, {num_samples / elapsed:.1f} samples / s')
+    print(
+        format_pipeline_summary(
+            profiler.summary(args.stats_dir, profiler.main_pid)))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,13 @@ import argparse
 import os
 import warnings
 
-import mmcv
 import torch
 from mmcv import Config, DictAction
 from mmcv.cnn import fuse_conv_bn
 from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 
-from mmdet.apis import get_fake_input, multi_gpu_test, single_gpu_test
+from mmdet.apis import (ShardedResultSink, dump_results, get_fake_input,
+                        multi_gpu_test, single_gpu_test)
 from mmcv.runner import wrap_fp16_model
 from mmdet.integration.nncf import (check_nncf_is_enabled,
                                     get_nncf_config_from_meta,
@@ -68,6 +68,27 @@ def parse_args():
         '--tmpdir',
         help='tmp directory used for collecting results from multiple '
              'workers, available when gpu-collect is not specified')
+    parser.add_argument(
+        '--result-shards-dir',
+        help='directory to stream the results to in pickle shards as they '
+             'are produced instead of keeping them in memory')
+    parser.add_argument(
+        '--shard-size',
+        type=int,
+        default=1000,
+        help='number of results per shard file, used with '
+             '--result-shards-dir')
+    parser.add_argument(
+        '--encode-workers',
+        type=int,
+        default=0,
+        help='number of background workers encoding the masks to RLE while '
+             'the inference goes on, 0 encodes them synchronously')
+    parser.add_argument(
+        '--encode-pool',
+        choices=['thread', 'process'],
+        default='thread',
+        help='kind of pool used by --encode-workers')
     parser.add_argument(
         '--cfg-options',
         nargs='+',
@@ -179,12 +200,18 @@ def main():
 
     # build the dataloader
     dataset = build_dataset(cfg.data.test)
+    # batches of images of similar aspect ratio are padded less, the results
+    # are put back in the order of the dataset after the test
+    bucket_cfg = cfg.data.get('bucket_sampler')
+    if distributed or samples_per_gpu == 1:
+        bucket_cfg = None
     data_loader = build_dataloader(
         dataset,
         samples_per_gpu=samples_per_gpu,
         workers_per_gpu=cfg.data.workers_per_gpu,
         dist=distributed,
-        shuffle=False)
+        shuffle=False,
+        bucket_cfg=bucket_cfg)
 
     # build the model and load checkpoint
     model = build_detector(cfg.model, train_cfg=None, test_cfg=cfg.get('test_cfg'))
@@ -228,28 +255,41 @@ def main():
     else:
         model.CLASSES = dataset.CLASSES
 
+    result_sink = None
+    if args.result_shards_dir:
+        result_sink = ShardedResultSink(args.result_shards_dir, args.shard_size)
+
     if torch.cuda.is_available():
         if not distributed:
             model = MMDataParallel(model, device_ids=[0])
             outputs = single_gpu_test(model, data_loader, args.show, args.show_dir,
-                                      args.show_score_thr)
+                                      args.show_score_thr, result_sink=result_sink,
+                                      encode_workers=args.encode_workers,
+                                      encode_pool=args.encode_pool)
         else:
             model = MMDistributedDataParallel(
                 model.cuda(),
                 device_ids=[torch.cuda.current_device()],
                 broadcast_buffers=False)
             outputs = multi_gpu_test(model, data_loader, args.tmpdir,
-                                     args.gpu_collect)
+                                     args.gpu_collect, result_sink=result_sink,
+                                     encode_workers=args.encode_workers,
+                                     encode_pool=args.encode_pool)
     else:
         model = MMDataCPU(model)
         outputs = single_gpu_test(model, data_loader, args.show, args.show_dir,
-                                  args.show_score_thr)
+                                  args.show_score_thr, result_sink=result_sink,
+                                  encode_workers=args.encode_workers,
+                                  encode_pool=args.encode_pool)
+
+    if bucket_cfg is not None:
+        outputs = data_loader.sampler.restore_order(outputs)
 
     rank, _ = get_dist_info()
     if rank == 0:
         if args.out:
             print(f'\nwriting results to {args.out}')
-            mmcv.dump(outputs, args.out)
+            dump_results(outputs, args.out)
         kwargs = cfg.get('evaluation', {})
         kwargs.pop('interval', None)
         kwargs.pop('gpu_collect', None)
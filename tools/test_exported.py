@@ -16,11 +16,13 @@ import argparse
 import cv2
 import mmcv
 import numpy as np
+import queue
 import sys
+import threading
+import time
 from mmcv.parallel import collate
 
 from mmdet.apis.inference import LoadImage
-from mmdet.core import encode_mask_results
 from mmdet.core.bbox.transforms import bbox2result
 from mmdet.core.mask.transforms import mask2result
 from mmdet.datasets import build_dataloader, build_dataset
@@ -52,8 +54,8 @@ def postprocess(result, img_meta, num_classes=80, rescale=True):
             det_masks,
             num_classes,
             mask_thr_binary=0.5,
-            img_size=(img_h, img_w))
-        segm_results = encode_mask_results(segm_results)
+            img_size=(img_h, img_w),
+            encode=True)
         if det_texts is not None:
             return bbox_results, segm_results, det_texts
         else:
@@ -100,6 +102,222 @@ class VideoDataset:
         return sys.maxsize
 
 
+def get_image_data(data):
+    im_data = data['img'][0].data[0].cpu().numpy()
+    if len(im_data.shape) == 3:
+        im_data = np.expand_dims(im_data, axis=0)
+    elif len(im_data.shape) != 4:
+        raise ValueError(f'Image of unsupported shape: {im_data.shape}')
+    return im_data
+
+
+class PipelineStage(threading.Thread):
+    """Stage of the test pipeline running in a background thread.
+
+    It applies ``func`` to the items of ``inputs`` and puts the outputs to a
+    bounded queue, which is iterated by the next stage. The time spent
+    getting the inputs, in ``func`` and waiting for room in the queue is
+    accumulated for the timing summary.
+
+    Args:
+        name (str): Name of the stage.
+        func (callable): Function applied to every item.
+        inputs (Iterable): Items to process, e.g. a data loader or the
+            previous stage.
+        maxsize (int): Size of the output queue.
+    """
+
+    _end = object()
+
+    def __init__(self, name, func, inputs, maxsize):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inputs = inputs
+        self.outputs = queue.Queue(maxsize)
+        self.exception = None
+        self.num_items = 0
+        self.times = dict(input=0.0, busy=0.0, output=0.0)
+
+    def run(self):
+        try:
+            inputs = iter(self.inputs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(inputs)
+                except StopIteration:
+                    break
+                fetched = time.perf_counter()
+                output = self.func(item)
+                processed = time.perf_counter()
+                self.outputs.put(output)
+                self.times['input'] += fetched - start
+                self.times['busy'] += processed - fetched
+                self.times['output'] += time.perf_counter() - processed
+                self.num_items += 1
+        except Exception as ex:
+            self.exception = ex
+        finally:
+            self.outputs.put(self._end)
+
+    def __iter__(self):
+        while True:
+            output = self.outputs.get()
+            if output is self._end:
+                break
+            yield output
+        if self.exception is not None:
+            raise self.exception
+
+
+def print_timings(stages, total_time, num_items):
+    print(f'\n{"stage":>12} {"input (ms)":>12} {"busy (ms)":>12} {"output (ms)":>12}')
+    for name, times in stages.items():
+        print(f'{name:>12} ' + ' '.join(
+            f'{times[key] / max(num_items, 1) * 1000:>12.2f}' for key in ('input', 'busy', 'output')))
+    print(f'total: {num_items} images in {total_time:.2f} s, {num_items / total_time:.2f} FPS')
+
+
+def prefetch(data_loader, maxsize):
+    """Start the stage loading the data and converting the images to numpy."""
+
+    def load(item):
+        i, data = item
+        return i, data, get_image_data(data)
+
+    return PipelineStage('load', load, enumerate(data_loader), maxsize)
+
+
+def test_pipelined(model, data_loader, num_images, num_classes, args, wait_key):
+    """Run the model in a three-stage pipeline.
+
+    Loading, inference and postprocessing run concurrently, joined by
+    bounded queues of ``args.prefetch`` items. Postprocessing and showing
+    the results happen in the main thread. The time per image of every
+    stage is printed at the end.
+    """
+    # with IO binding, the outputs of static shapes are buffers overwritten
+    # by the next inference, which runs before the queued ones are read
+    copy_outputs = getattr(model, 'io_binding', False)
+
+    def infer(item):
+        i, data, im_data = item
+        try:
+            outputs = model(im_data)
+            if copy_outputs:
+                outputs = {name: output.copy() for name, output in outputs.items()}
+            return i, data, im_data, outputs, None
+        except Exception as ex:
+            return i, data, im_data, None, ex
+
+    load_stage = prefetch(data_loader, args.prefetch)
+    infer_stage = PipelineStage('inference', infer, load_stage, args.prefetch)
+    post_times = dict(input=0.0, busy=0.0, output=0.0)
+
+    results = []
+    prog_bar = mmcv.ProgressBar(num_images)
+    start = time.perf_counter()
+    load_stage.start()
+    infer_stage.start()
+    fetch_start = time.perf_counter()
+    for i, data, im_data, result, exception in infer_stage:
+        fetched = time.perf_counter()
+        post_times['input'] += fetched - fetch_start
+        try:
+            if exception is not None:
+                raise exception
+            result = postprocess(
+                result,
+                data['img_metas'][0].data[0],
+                num_classes=num_classes,
+                rescale=not args.show)
+        except Exception as ex:
+            print(f'\nException raised while processing item {i}:')
+            print(ex)
+            with_mask = hasattr(model.pt_model, 'with_mask') and model.pt_model.with_mask
+            result = empty_result(
+                num_classes=num_classes,
+                with_mask=with_mask)
+        results.append(result)
+
+        if args.show:
+            img_meta = data['img_metas'][0].data[0][0]
+
+            norm_cfg = img_meta['img_norm_cfg']
+            mean = np.array(norm_cfg['mean'], dtype=np.float32)
+            std = np.array(norm_cfg['std'], dtype=np.float32)
+            display_image = im_data[0].transpose(1, 2, 0)
+            display_image = mmcv.imdenormalize(display_image, mean, std, to_bgr=norm_cfg['to_rgb']).astype(np.uint8)
+            display_image = np.ascontiguousarray(display_image)
+
+            h, w, _ = img_meta['img_shape']
+            display_image = display_image[:h, :w, :]
+
+            model.show(display_image, result, score_thr=args.score_thr, wait_time=wait_key)
+
+        prog_bar.update()
+        fetch_start = time.perf_counter()
+        post_times['busy'] += fetch_start - fetched
+    total_time = time.perf_counter() - start
+
+    print_timings(
+        dict(load=load_stage.times, inference=infer_stage.times, postprocess=post_times),
+        total_time, len(results))
+    return results
+
+
+def test_async(model, data_loader, num_images, num_classes, prefetch_size):
+    """Run the OpenVINO model with several requests in flight.
+
+    The data is loaded in a background stage and the results are
+    postprocessed in the callbacks of the requests, then put back in the
+    order of the data loader. Throughput and latency
+    percentiles are printed at the end.
+    """
+    results = {}
+    latencies = {}
+    lock = threading.Lock()
+    prog_bar = mmcv.ProgressBar(num_images)
+    with_mask = hasattr(model.pt_model, 'with_mask') and model.pt_model.with_mask
+
+    def on_done(result, userdata, exception):
+        i, img_meta, start = userdata
+        latency = time.perf_counter() - start
+        try:
+            if exception is not None:
+                raise exception
+            result = postprocess(result, img_meta, num_classes=num_classes)
+        except Exception as ex:
+            with lock:
+                print(f'\nException raised while processing item {i}:')
+                print(ex)
+            result = empty_result(num_classes=num_classes, with_mask=with_mask)
+        with lock:
+            results[i] = result
+            latencies[i] = latency
+            prog_bar.update()
+
+    load_stage = prefetch(data_loader, prefetch_size)
+    start = time.perf_counter()
+    load_stage.start()
+    for i, data, im_data in load_stage:
+        userdata = (i, data['img_metas'][0].data[0], time.perf_counter())
+        try:
+            model.infer_async(im_data, on_done, userdata)
+        except Exception as ex:
+            on_done(None, userdata, ex)
+    model.wait_all()
+    total_time = time.perf_counter() - start
+
+    latencies = np.array(list(latencies.values())) * 1000
+    print(f'\nthroughput: {len(results) / total_time:.2f} FPS')
+    if len(latencies):
+        print(f'latency (ms): p50 {np.percentile(latencies, 50):.2f}, '
+              f'p90 {np.percentile(latencies, 90):.2f}, '
+              f'p99 {np.percentile(latencies, 99):.2f}')
+    return [results[i] for i in range(len(results))]
+
+
 def main(args):
     if args.model.endswith('.onnx'):
         backend = 'onnx'
@@ -151,55 +369,40 @@ def main(args):
             from mmdet.utils.deployment.openvino_backend import \
                 Detector as Model
 
+        if args.num_requests > 1 or args.max_batch_size > 1:
+            assert cfg.model.type != 'MaskTextSpotter', \
+                'Asynchronous inference is not supported for MaskTextSpotter.'
+            assert not args.show, 'Asynchronous inference does not support --show.'
+            extra_args['num_requests'] = args.num_requests
+            extra_args['max_batch_size'] = args.max_batch_size
+        extra_args['cache_size'] = args.net_cache_size
+        extra_args['shape_buckets'] = args.shape_bucket
+
         model = Model(args.model,
                       cfg=cfg,
                       classes=dataset.CLASSES,
                       **extra_args)
     else:
         from mmdet.utils.deployment.onnxruntime_backend import ModelONNXRuntime
-        model = ModelONNXRuntime(args.model, cfg=cfg, classes=dataset.CLASSES)
-
-    results = []
-    prog_bar = mmcv.ProgressBar(len(dataset))
-    for i, data in enumerate(data_loader):
-        im_data = data['img'][0].data[0].cpu().numpy()
-        if len(im_data.shape) == 3:
-            im_data = np.expand_dims(im_data, axis=0)
-        elif len(im_data.shape) != 4:
-            raise ValueError(f'Image of unsupported shape: {im_data.shape}')
-
-        try:
-            result = model(im_data)
-            result = postprocess(
-                result,
-                data['img_metas'][0].data[0],
-                num_classes=classes_num,
-                rescale=not args.show)
-        except Exception as ex:
-            print(f'\nException raised while processing item {i}:')
-            print(ex)
-            with_mask = hasattr(model.pt_model, 'with_mask') and model.pt_model.with_mask
-            result = empty_result(
-                num_classes=classes_num,
-                with_mask=with_mask)
-        results.append(result)
-
-        if args.show:
-            img_meta = data['img_metas'][0].data[0][0]
-
-            norm_cfg = img_meta['img_norm_cfg']
-            mean = np.array(norm_cfg['mean'], dtype=np.float32)
-            std = np.array(norm_cfg['std'], dtype=np.float32)
-            display_image = im_data[0].transpose(1, 2, 0)
-            display_image = mmcv.imdenormalize(display_image, mean, std, to_bgr=norm_cfg['to_rgb']).astype(np.uint8)
-            display_image = np.ascontiguousarray(display_image)
-
-            h, w, _ = img_meta['img_shape']
-            display_image = display_image[:h, :w, :]
-
-            model.show(display_image, result, score_thr=args.score_thr, wait_time=wait_key)
-
-        prog_bar.update()
+        model = ModelONNXRuntime(args.model, cfg=cfg, classes=dataset.CLASSES,
+                                 providers=args.ort_providers,
+                                 intra_op_num_threads=args.ort_intra_threads,
+                                 inter_op_num_threads=args.ort_inter_threads,
+                                 graph_optimization_level=args.ort_opt_level,
+                                 optimized_model_path=args.ort_optimized_model,
+                                 io_binding=args.ort_io_binding,
+                                 profile_prefix=args.ort_profile)
+
+    if backend == 'openvino' and (args.num_requests > 1 or args.max_batch_size > 1):
+        results = test_async(model, data_loader, len(dataset), classes_num, args.prefetch)
+    else:
+        results = test_pipelined(model, data_loader, len(dataset), classes_num, args, wait_key)
+    if backend == 'onnx' and args.ort_profile is not None:
+        print(f'\nprofile is written to {model.end_profiling()}')
+    if backend == 'openvino':
+        stats = model.cache_stats
+        print(f'\ncompiled networks cache: {stats["hits"]} hits, {stats["misses"]} misses, '
+              f'{stats["compile_time"]:.1f} s compiling')
 
     if args.out:
         print(f'\nwriting results to {args.out}')
@@ -225,6 +428,35 @@ def parse_args():
     parser.add_argument('--show', action='store_true', help='visualize results')
     parser.add_argument('--score_thr', type=float, default=0.3,
                         help='show only detections with confidence larger than the threshold')
+    parser.add_argument('--prefetch', type=int, default=4,
+                        help='number of items queued between the loading, inference and postprocessing stages')
+    parser.add_argument('--num-requests', type=int, default=1,
+                        help='number of OpenVINO infer requests kept in flight, '
+                             'values greater than 1 enable asynchronous inference')
+    parser.add_argument('--max-batch-size', type=int, default=1,
+                        help='number of images of the same shape batched together in '
+                             'asynchronous OpenVINO inference')
+    parser.add_argument('--net-cache-size', type=int, default=4,
+                        help='number of OpenVINO networks compiled for different input shapes to keep')
+    parser.add_argument('--shape-bucket', type=int, default=None,
+                        help='pad OpenVINO inputs so that their height and width are multiples '
+                             'of this value, to reuse the compiled networks more often')
+    parser.add_argument('--ort-providers', nargs='+', default=None,
+                        help='ONNX Runtime execution providers in the order of preference, '
+                             'e.g. CUDAExecutionProvider CPUExecutionProvider, '
+                             'all the available ones by default')
+    parser.add_argument('--ort-intra-threads', type=int, default=0,
+                        help='number of ONNX Runtime threads running an operator, 0 for default')
+    parser.add_argument('--ort-inter-threads', type=int, default=0,
+                        help='number of ONNX Runtime threads running operators in parallel, 0 for default')
+    parser.add_argument('--ort-opt-level', default='all', choices=['disable', 'basic', 'extended', 'all'],
+                        help='ONNX Runtime graph optimization level')
+    parser.add_argument('--ort-optimized-model', default=None,
+                        help='path to cache the ONNX Runtime optimized model at')
+    parser.add_argument('--ort-io-binding', action='store_true',
+                        help='bind ONNX Runtime inputs and outputs to reuse the output buffers')
+    parser.add_argument('--ort-profile', default=None,
+                        help='prefix of the file to dump the ONNX Runtime per-node profile to')
     parser.add_argument(
         '--cfg-options',
         nargs='+',
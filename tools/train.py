@@ -29,7 +29,7 @@ from mmdet.apis import set_random_seed, train_detector
 from mmdet.apis.inference import LoadImage
 from mmdet.core import BitmapMasks
 from mmdet.datasets import build_dataset
-from mmdet.datasets.pipelines import Compose
+from mmdet.datasets.pipelines import Compose, enable_pipeline_profiling
 from mmdet.integration.nncf import check_nncf_is_enabled, get_nncf_metadata
 from mmdet.models import TwoStageDetector, build_detector
 from mmdet.utils import ExtendedDictAction, collect_env, get_root_logger
@@ -285,6 +285,16 @@ def main():
         train_cfg=cfg.get('train_cfg'),
         test_cfg=cfg.get('test_cfg'))
 
+    if cfg.get('pipeline_profile'):
+        # the pipelines must be built after the profiling is enabled
+        profile_cfg = copy.deepcopy(cfg.pipeline_profile)
+        interval = profile_cfg.pop('interval', cfg.log_config.interval)
+        profiler = enable_pipeline_profiling(**profile_cfg)
+        logger.info(f'Profiling the data pipelines to {profiler.stats_dir}')
+        cfg.custom_hooks = cfg.get('custom_hooks', []) + [
+            dict(type='PipelineProfilerHook', interval=interval)
+        ]
+
     datasets = [build_dataset(cfg.data.train)]
 
     dataset_len_per_gpu = sum(len(dataset) for dataset in datasets)